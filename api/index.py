@@ -2,36 +2,123 @@ from http.server import BaseHTTPRequestHandler
 import os
 import sys
 import json
+import threading
 from urllib.parse import urlparse, parse_qs
 from datetime import datetime, timedelta
 
 # Добавляем родительскую директорию в путь для импорта модулей
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
-from dotenv import load_dotenv
-from currency_parser import CurrencyParser
-import plotly.graph_objects as go
-import plotly.utils
+# Тяжёлые модули (plotly, requests, dotenv) импортируются лениво в обработчиках,
+# которым они нужны: на Vercel время импорта добавляется к каждому холодному старту.
+# Проверка бюджета времени запуска: python startup_budget.py
+from currency_api import (HISTORY_FORMATS, MAX_BATCH_CURRENCIES, chart_layout_hint, cross_rates_caching,
+                          current_rates_caching, empty_history_error, get_current_rates, history_caching,
+                          load_history_batch, load_snapshots, parse_dates, resolve_period, snapshots_caching,
+                          validate_currency_period)
+from http_caching import NO_STORE, caching_headers, is_not_modified
+from page_assets import get_page
+from static_assets import BACKGROUND_EXTENSIONS, LISTING_CACHE_CONTROL, StaticAssetServer, iter_file
+from response_compression import apply_encoding_headers, compress_body, compression_stats, select_encoding
+from rate_events import RateBroadcaster, parse_event_id
+
+ROOT_DIR = os.path.join(os.path.dirname(__file__), '..')
+
+# Индекс метаданных статических файлов (static/)
+static_files = StaticAssetServer(os.path.join(ROOT_DIR, 'static'))
+
+
+def _load_env():
+    """Загружает .env, если он есть (на Vercel переменные задаются в настройках проекта)"""
+    env_path = os.path.join(ROOT_DIR, '.env')
+    if os.path.exists(env_path):
+        from dotenv import load_dotenv
+        load_dotenv(env_path)
+
 
 # Загружаем переменные окружения
-load_dotenv()
+_load_env()
+
+# Парсер, прогрев, кросс-курсы и аналитика создаются при первом запросе к API курсов
+_parser = None
+_prewarmer = None
+_cross_rates = None
+_analytics = None
+_correlations = None
+_init_lock = threading.Lock()
+
+# События с курсами для /api/currency/stream (в пределах одного экземпляра функции)
+rate_events = RateBroadcaster()
+
+
+def get_parser():
+    """Общий экземпляр CurrencyParser (создаётся при первом обращении)"""
+    global _parser
+    if _parser is None:
+        with _init_lock:
+            if _parser is None:
+                from currency_parser import CurrencyParser
+                _parser = CurrencyParser()
+    return _parser
+
+
+def get_prewarmer():
+    """Общий экземпляр RatePrewarmer (создаётся при первом обращении)"""
+    global _prewarmer
+    if _prewarmer is None:
+        parser = get_parser()
+        with _init_lock:
+            if _prewarmer is None:
+                from rate_scheduler import RatePrewarmer
+                _prewarmer = RatePrewarmer(parser)
+                _prewarmer.add_listener(rate_events.publish)
+    return _prewarmer
+
+
+def get_cross_rates():
+    """Общий экземпляр CrossRateEngine (создаётся при первом обращении)"""
+    global _cross_rates
+    if _cross_rates is None:
+        parser = get_parser()
+        with _init_lock:
+            if _cross_rates is None:
+                from cross_rates import CrossRateEngine
+                _cross_rates = CrossRateEngine(parser)
+    return _cross_rates
+
+
+def get_analytics():
+    """Общий экземпляр RateAnalytics (создаётся при первом обращении)"""
+    global _analytics
+    if _analytics is None:
+        parser = get_parser()
+        with _init_lock:
+            if _analytics is None:
+                from rate_analytics import RateAnalytics
+                _analytics = RateAnalytics(parser)
+    return _analytics
+
+
+def get_correlations():
+    """Общий экземпляр CorrelationEngine (создаётся при первом обращении)"""
+    global _correlations
+    if _correlations is None:
+        parser = get_parser()
+        with _init_lock:
+            if _correlations is None:
+                from rate_correlation import CorrelationEngine
+                _correlations = CorrelationEngine(parser)
+    return _correlations
 
-# Инициализируем парсер
-parser = CurrencyParser()
 
 def is_vercel():
     """Определяет, запущено ли приложение на Vercel"""
     return os.getenv('VERCEL') == '1' or 'vercel' in os.getenv('HOST', '').lower()
 
-# Загружаем HTML шаблоны из app.py
-# Для упрощения, копируем основные шаблоны
-CURRENCY_HTML_TEMPLATE = open(os.path.join(os.path.dirname(__file__), '..', 'app.py'), 'r', encoding='utf-8').read()
-# Извлекаем CURRENCY_HTML_TEMPLATE из app.py
-currency_template_start = CURRENCY_HTML_TEMPLATE.find('CURRENCY_HTML_TEMPLATE = """')
-currency_template_end = CURRENCY_HTML_TEMPLATE.find('"""', currency_template_start + len('CURRENCY_HTML_TEMPLATE = """')) + 3
-CURRENCY_HTML = CURRENCY_HTML_TEMPLATE[currency_template_start + len('CURRENCY_HTML_TEMPLATE = """'):currency_template_end-3]
-
 class handler(BaseHTTPRequestHandler):
+    # HTTP/1.1: keep-alive и chunked-выгрузки; у всех ответов с телом есть Content-Length
+    protocol_version = 'HTTP/1.1'
+    
     def do_GET(self):
         parsed_path = urlparse(self.path)
         path = parsed_path.path
@@ -49,31 +136,111 @@ class handler(BaseHTTPRequestHandler):
         # API: текущие курсы
         elif path == '/api/currency/current':
             self._serve_currency_current(query_params)
+        # API: история нескольких валют
+        elif path == '/api/currency/history/batch':
+            self._serve_currency_history_batch(query_params)
         # API: история курсов
         elif path == '/api/currency/history':
             self._serve_currency_history(query_params)
+        # API: кросс-курсы пар валют
+        elif path == '/api/currency/cross':
+            self._serve_currency_cross(query_params)
+        # API: история кросс-курса пары
+        elif path == '/api/currency/cross/history':
+            self._serve_currency_cross_history(query_params)
+        # API: аналитика курса
+        elif path == '/api/currency/analytics':
+            self._serve_currency_analytics(query_params)
+        # API: корреляции валют
+        elif path == '/api/currency/correlation':
+            self._serve_currency_correlation(query_params)
+        # API: потоковая выгрузка истории (CSV, NDJSON)
+        elif path == '/api/currency/export':
+            self._serve_currency_export(query_params)
+        # API: курсы на даты
+        elif path == '/api/currency/snapshot':
+            self._serve_currency_snapshot(query_params)
+        # API: прогрев текущих курсов (cron)
+        elif path == '/api/currency/prewarm':
+            self._serve_currency_prewarm()
+        # API: поток обновлений текущих курсов (SSE)
+        elif path == '/api/currency/stream':
+            self._serve_currency_stream()
+        # API: метрики кэша и запросов к источникам
+        elif path == '/api/currency/metrics':
+            self._serve_currency_metrics()
         # Статические файлы фонов
         elif path.startswith('/static/backgrounds/'):
-            self._serve_static_file(path)
+            self._serve_static_file(path[len('/static/'):])
         # Favicon
         elif path == '/favicon.ico':
-            self._serve_favicon()
+            self._serve_static_file('favicon.ico')
         else:
             self._serve_404()
     
-    def _send_json(self, data, status=200):
+    def _send_json(self, data, status=200, cache_control=None, last_modified=None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        headers = {}
+        if cache_control:
+            headers = caching_headers(body, cache_control, last_modified)
+        self._send_body(body, 'application/json; charset=utf-8', status, headers)
+    
+    def _send_html(self, html, status=200):
+        self._send_body(html.encode('utf-8'), 'text/html; charset=utf-8', status)
+    
+    def _send_body(self, body, content_type, status=200, headers=None):
+        """Отправляет ответ: 304 на условный запрос, сжатие по Accept-Encoding"""
+        headers = dict(headers or {})
+        etag = headers.get('ETag')
+        encoding = None
+        if status == 200:
+            encoding = select_encoding(self.headers.get('Accept-Encoding'), content_type, len(body))
+            apply_encoding_headers(headers, content_type, len(body), encoding)
+            if etag and is_not_modified(self.headers, headers):
+                status = 304
+        
         self.send_response(status)
-        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Type', content_type)
         self.send_header('Access-Control-Allow-Origin', '*')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status == 304:
+            self.end_headers()
+            return
+        
+        if encoding:
+            body = compress_body(body, encoding, etag)
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
-        self.wfile.write(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+        self.wfile.write(body)
     
-    def _send_html(self, html, status=200):
-        self.send_response(status)
-        self.send_header('Content-Type', 'text/html; charset=utf-8')
+    def _send_stream(self, chunks, content_type, headers=None):
+        """Отправляет тело по частям: chunked для HTTP/1.1, иначе до закрытия соединения"""
+        chunked = self.request_version == 'HTTP/1.1'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
         self.send_header('Access-Control-Allow-Origin', '*')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
         self.end_headers()
-        self.wfile.write(html.encode('utf-8'))
+        
+        try:
+            for chunk in chunks:
+                if chunked:
+                    self.wfile.write(f'{len(chunk):X}\r\n'.encode('ascii') + chunk + b'\r\n')
+                else:
+                    self.wfile.write(chunk)
+            if chunked:
+                self.wfile.write(b'0\r\n\r\n')
+        except Exception as e:
+            # Заголовки уже отправлены: обрываем соединение, клиент увидит незавершённую передачу
+            print(f"Ошибка потоковой передачи: {e}")
+            self.close_connection = True
     
     def _serve_home_page(self):
         """Главная страница"""
@@ -150,212 +317,88 @@ class handler(BaseHTTPRequestHandler):
         self._send_html(html)
     
     def _serve_currency_page(self):
-        """Страница с курсами валют"""
-        # Читаем полный шаблон из app.py
-        try:
-            app_path = os.path.join(os.path.dirname(__file__), '..', 'app.py')
-            with open(app_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                # Извлекаем CURRENCY_HTML_TEMPLATE
-                import re
-                match = re.search(r'CURRENCY_HTML_TEMPLATE = """(.*?)"""', content, re.DOTALL)
-                if match:
-                    html = match.group(1)
-                    self._send_html(html)
-                    return
-        except Exception as e:
-            print(f"Error loading template: {e}")
-        
-        # Fallback - используем упрощенную версию
-        html = """<!DOCTYPE html>
-<html lang="ru">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Курсы валют</title>
-    <script src="https://cdn.plot.ly/plotly-2.27.0.min.js"></script>
-    <style>
-        * { margin: 0; padding: 0; box-sizing: border-box; }
-        body {
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            background-size: cover; background-position: center; background-attachment: fixed;
-            min-height: 100vh; padding: 20px; transition: background-image 0.5s ease;
-        }
-        .container { background: white; border-radius: 20px; box-shadow: 0 20px 60px rgba(0,0,0,0.3); padding: 40px; max-width: 1400px; margin: 0 auto; }
-        h1 { color: #667eea; font-size: 2.5em; text-align: center; margin-bottom: 30px; font-weight: 700; }
-        .nav-links { text-align: center; margin-bottom: 30px; }
-        .nav-links a { color: #667eea; text-decoration: none; margin: 0 15px; font-weight: 500; }
-        .controls { display: flex; gap: 15px; margin-bottom: 30px; flex-wrap: wrap; align-items: center; }
-        .control-group { display: flex; flex-direction: column; gap: 5px; }
-        .control-group label { font-size: 0.9em; color: #666; font-weight: 500; }
-        select, input[type="date"], button { padding: 10px 15px; border: 2px solid #e0e0e0; border-radius: 8px; font-size: 1em; font-family: inherit; }
-        button { background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; border: none; cursor: pointer; font-weight: 600; }
-        .custom-period { display: none; gap: 10px; }
-        .custom-period.active { display: flex; }
-        .chart-container { margin-top: 30px; background: #f8f9fa; border-radius: 10px; padding: 20px; }
-        .stats { display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 15px; margin-top: 20px; }
-        .stat-card { background: white; padding: 20px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }
-        .error { background: #fee; color: #c33; padding: 15px; border-radius: 8px; margin-top: 20px; }
-        .loading { text-align: center; padding: 40px; color: #666; font-size: 1.1em; }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>💱 Курсы валют к рублю</h1>
-        <div class="nav-links">
-            <a href="/">🏠 Главная</a>
-            <a href="/currency">💱 Курсы валют</a>
-        </div>
-        <div class="controls">
-            <div class="control-group">
-                <label>Тип валюты</label>
-                <select id="currencyType"><option value="fiat">Фиатные валюты</option><option value="crypto">Криптовалюты</option></select>
-            </div>
-            <div class="control-group">
-                <label>Валюта</label>
-                <select id="currencySelect"></select>
-            </div>
-            <div class="control-group">
-                <label>Период</label>
-                <select id="periodSelect">
-                    <option value="7d">7 дней</option>
-                    <option value="30d">30 дней</option>
-                    <option value="90d">90 дней</option>
-                    <option value="1y">1 год</option>
-                    <option value="custom">Кастомный период</option>
-                </select>
-            </div>
-            <div class="custom-period" id="customPeriod">
-                <div class="control-group"><label>Начальная дата</label><input type="date" id="startDate"></div>
-                <div class="control-group"><label>Конечная дата</label><input type="date" id="endDate"></div>
-            </div>
-            <div class="control-group">
-                <label>&nbsp;</label>
-                <button onclick="loadChart()">Показать график</button>
-            </div>
-        </div>
-        <div id="chartContainer" class="chart-container">
-            <div class="loading">Выберите валюту и период для отображения графика</div>
-        </div>
-    </div>
-    <script>
-        const fiatCurrencies = ['USD', 'EUR', 'GBP', 'JPY', 'CNY', 'CHF', 'AUD', 'CAD', 'NOK', 'SEK'];
-        const cryptoCurrencies = ['BTC', 'ETH', 'BNB', 'XRP', 'ADA', 'SOL', 'DOGE', 'DOT', 'MATIC', 'LTC'];
-        
-        function updateCurrencySelect(type) {
-            const select = document.getElementById('currencySelect');
-            select.innerHTML = '';
-            const currencies = type === 'fiat' ? fiatCurrencies : cryptoCurrencies;
-            currencies.forEach(code => {
-                const option = document.createElement('option');
-                option.value = code;
-                option.textContent = code;
-                select.appendChild(option);
-            });
-        }
-        
-        async function loadChart() {
-            const currency = document.getElementById('currencySelect').value;
-            const period = document.getElementById('periodSelect').value;
-            const container = document.getElementById('chartContainer');
-            if (!currency) {
-                container.innerHTML = '<div class="error">Пожалуйста, выберите валюту</div>';
-                return;
-            }
-            container.innerHTML = '<div class="loading">Загрузка данных...</div>';
-            let url = `/api/currency/history?currency=${encodeURIComponent(currency)}&period=${encodeURIComponent(period)}`;
-            if (period === 'custom') {
-                const startDate = document.getElementById('startDate').value;
-                const endDate = document.getElementById('endDate').value;
-                if (!startDate || !endDate) {
-                    container.innerHTML = '<div class="error">Пожалуйста, выберите начальную и конечную даты</div>';
-                    return;
-                }
-                url += `&start_date=${encodeURIComponent(startDate)}&end_date=${encodeURIComponent(endDate)}`;
-            }
-            try {
-                const response = await fetch(url);
-                const data = await response.json();
-                if (data.success) {
-                    const graphData = JSON.parse(data.graph);
-                    const statsHtml = `<div class="stats">
-                        <div class="stat-card"><div class="stat-label">Текущий курс</div><div class="stat-value">${data.data.current.toLocaleString('ru-RU', {minimumFractionDigits: 2})} ₽</div></div>
-                        <div class="stat-card"><div class="stat-label">Минимальный</div><div class="stat-value">${data.data.min.toLocaleString('ru-RU', {minimumFractionDigits: 2})} ₽</div></div>
-                        <div class="stat-card"><div class="stat-label">Максимальный</div><div class="stat-value">${data.data.max.toLocaleString('ru-RU', {minimumFractionDigits: 2})} ₽</div></div>
-                    </div>`;
-                    container.innerHTML = '<div id="chart"></div>' + statsHtml;
-                    Plotly.newPlot('chart', graphData.data, graphData.layout, {responsive: true});
-                } else {
-                    container.innerHTML = `<div class="error">Ошибка: ${data.error || 'Не удалось загрузить данные'}</div>`;
-                }
-            } catch (error) {
-                container.innerHTML = `<div class="error">Ошибка подключения: ${error.message}</div>`;
-            }
-        }
-        
-        document.getElementById('currencyType').addEventListener('change', () => {
-            updateCurrencySelect(document.getElementById('currencyType').value);
-        });
-        document.getElementById('periodSelect').addEventListener('change', function() {
-            const customPeriod = document.getElementById('customPeriod');
-            if (this.value === 'custom') {
-                customPeriod.classList.add('active');
-            } else {
-                customPeriod.classList.remove('active');
-            }
-        });
-        
-        updateCurrencySelect('fiat');
-        const today = new Date();
-        const weekAgo = new Date(today);
-        weekAgo.setDate(today.getDate() - 7);
-        document.getElementById('endDate').value = today.toISOString().split('T')[0];
-        document.getElementById('startDate').value = weekAgo.toISOString().split('T')[0];
-    </script>
-</body>
-</html>"""
-        self._send_html(html)
+        """Страница с курсами валют (templates/currency.html из памяти)"""
+        status, headers, body = get_page('currency.html').respond(self.headers)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
     
     def _serve_backgrounds_list(self):
         """API: список фонов"""
-        backgrounds_dir = os.path.join(os.path.dirname(__file__), '..', 'static', 'backgrounds')
-        backgrounds = []
-        
         env = 'vercel' if is_vercel() else 'localhost'
         prefix = 'vercel_bg' if is_vercel() else 'localhost_bg'
         
-        if os.path.exists(backgrounds_dir):
-            for file in os.listdir(backgrounds_dir):
-                if file.startswith(prefix) and file.lower().endswith(('.jpg', '.jpeg', '.png', '.webp', '.gif', '.svg')):
-                    backgrounds.append({
-                        'filename': file,
-                        'url': f'/static/backgrounds/{file}'
-                    })
+        backgrounds = [
+            {'filename': file, 'url': f'/static/backgrounds/{file}'}
+            for file in static_files.list_files('backgrounds', prefix, BACKGROUND_EXTENSIONS)
+        ]
         
         self._send_json({
             'success': True,
             'environment': env,
             'backgrounds': backgrounds
-        })
+        }, cache_control=LISTING_CACHE_CONTROL)
     
     def _serve_currency_current(self, params):
         """API: текущие курсы"""
         currency_type = params.get('type', ['fiat'])[0]
+        parser = get_parser()
         
-        if currency_type == 'fiat':
-            rates = parser.get_all_fiat_rates()
-        else:
-            rates = parser.get_all_crypto_rates()
+        rates = get_current_rates(parser, currency_type)
         
+        cache_control, last_modified = current_rates_caching(parser, currency_type, rates)
         self._send_json({
             'success': True,
             'rates': rates,
             'type': currency_type
+        }, cache_control=cache_control, last_modified=last_modified)
+    
+    def _serve_currency_prewarm(self):
+        """API: обновление текущих курсов в памяти (cron)"""
+        from rate_scheduler import is_authorized_cron_request
+        if not is_authorized_cron_request(self.headers.get('Authorization')):
+            self._send_json({'success': False, 'error': 'Unauthorized'}, 401)
+            return
+        
+        self._send_json({
+            'success': True,
+            'rates': get_prewarmer().refresh_once()
+        })
+    
+    def _serve_currency_stream(self):
+        """
+        API: текущие курсы в формате SSE
+        
+        Функция Vercel не держит соединение: отдаются новые для клиента события
+        и интервал переподключения, EventSource переподключается сам с Last-Event-ID.
+        Курсы берутся из кэша парсера, поэтому все клиенты делят одну загрузку.
+        """
+        parser = get_parser()
+        rate_events.publish({'fiat': parser.get_all_fiat_rates(), 'crypto': parser.get_all_crypto_rates()})
+        body = rate_events.snapshot(parse_event_id(self.headers.get('Last-Event-ID'))).encode('utf-8')
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', NO_STORE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _serve_currency_metrics(self):
+        """API: метрики кэша и запросов к источникам"""
+        self._send_json({
+            'success': True,
+            'metrics': dict(get_parser().get_stats(), compression=compression_stats(), events=rate_events.stats())
         })
     
     def _serve_currency_history(self, params):
         """API: история курсов"""
+        from rate_aggregation import (AGGREGATIONS, DATE_FORMATS, aggregate_history, downsample, parse_max_points,
+                                      resolve_resolution)
+        parser = get_parser()
         currency_code = params.get('currency', [''])[0].strip()
         period = params.get('period', ['7d'])[0]
         start_date_str = params.get('start_date', [None])[0]
@@ -405,6 +448,27 @@ class handler(BaseHTTPRequestHandler):
                 self._send_json({'success': False, 'error': f'Для криптовалют максимальный период составляет {max_crypto_days} дней'}, 400)
                 return
         
+        response_format = params.get('format', ['plotly'])[0]
+        if response_format not in HISTORY_FORMATS:
+            self._send_json({'success': False, 'error': f'Неизвестный формат {response_format}, допустимо: {", ".join(HISTORY_FORMATS)}'}, 400)
+            return
+        
+        aggregation = params.get('aggregation', ['close'])[0]
+        if aggregation not in AGGREGATIONS:
+            self._send_json({'success': False, 'error': f'Неизвестный тип агрегации {aggregation}, допустимо: {", ".join(AGGREGATIONS)}'}, 400)
+            return
+        try:
+            resolution = resolve_resolution(
+                params.get('resolution', ['raw'])[0],
+                start_date,
+                end_date,
+                finest='raw' if is_crypto else 'daily'
+            )
+            max_points = parse_max_points(params.get('max_points', [None])[0])
+        except ValueError as e:
+            self._send_json({'success': False, 'error': str(e)}, 400)
+            return
+        
         try:
             if is_crypto:
                 history = parser.get_crypto_rates_history(currency_code, start_date, end_date)
@@ -418,18 +482,63 @@ class handler(BaseHTTPRequestHandler):
             self._send_json({'success': False, 'error': f'Не удалось получить данные за указанный период для валюты {currency_code}'}, 400)
             return
         
-        dates = [item['date'].strftime('%Y-%m-%d') for item in history]
-        rates = [item['rate'] for item in history]
+        is_ohlc = aggregation == 'ohlc'
+        history = aggregate_history(history, resolution, ohlc=is_ohlc)
+        points = downsample(history, max_points) if max_points else history
+        
+        date_format = DATE_FORMATS[resolution]
+        dates = points.format_dates(date_format)
+        rates = points.to_list()
+        
+        data = {
+            'dates': dates,
+            'rates': rates,
+            'min': history.min('low' if is_ohlc else None),
+            'max': history.max('high' if is_ohlc else None),
+            'current': history.last(),
+            'resolution': resolution,
+            'total_points': len(history)
+        }
+        if is_ohlc:
+            data['open'] = points.to_list('open')
+            data['high'] = points.to_list('high')
+            data['low'] = points.to_list('low')
+            data['close'] = rates
+        
+        cache_control, last_modified = history_caching(parser, [currency_code], start_date, end_date,
+                                                       [history.last_date()])
+        
+        if response_format == 'compact':
+            self._send_json({
+                'success': True,
+                'format': 'compact',
+                'data': data,
+                'layout': chart_layout_hint(currency_code, is_ohlc)
+            }, cache_control=cache_control, last_modified=last_modified)
+            return
+        
+        import plotly.graph_objects as go
+        import plotly.utils
         
         fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=dates,
-            y=rates,
-            mode='lines+markers',
-            name=currency_code,
-            line=dict(color='#667eea', width=2),
-            marker=dict(size=4)
-        ))
+        if is_ohlc:
+            fig.add_trace(go.Candlestick(
+                x=dates,
+                open=data['open'],
+                high=data['high'],
+                low=data['low'],
+                close=rates,
+                name=currency_code
+            ))
+        else:
+            fig.add_trace(go.Scatter(
+                x=dates,
+                y=rates,
+                mode='lines+markers',
+                name=currency_code,
+                line=dict(color='#667eea', width=2),
+                marker=dict(size=4)
+            ))
         
         fig.update_layout(
             title=f'Курс {currency_code} к рублю',
@@ -438,7 +547,8 @@ class handler(BaseHTTPRequestHandler):
             hovermode='x unified',
             template='plotly_white',
             height=500,
-            showlegend=False
+            showlegend=False,
+            xaxis_rangeslider_visible=False
         )
         
         graph_json = json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
@@ -446,48 +556,317 @@ class handler(BaseHTTPRequestHandler):
         self._send_json({
             'success': True,
             'graph': graph_json,
+            'data': data
+        }, cache_control=cache_control, last_modified=last_modified)
+    
+    def _serve_currency_history_batch(self, params):
+        """API: история нескольких валют на общей оси дат"""
+        from rate_aggregation import resolve_resolution
+        currency_codes = [code.strip() for code in params.get('currencies', [''])[0].split(',') if code.strip()]
+        
+        if not currency_codes:
+            self._send_json({'success': False, 'error': 'Не указаны валюты'}, 400)
+            return
+        if len(currency_codes) > MAX_BATCH_CURRENCIES:
+            self._send_json({'success': False, 'error': f'Можно запросить не более {MAX_BATCH_CURRENCIES} валют'}, 400)
+            return
+        
+        try:
+            start_date, end_date = resolve_period(
+                params.get('period', ['7d'])[0],
+                params.get('start_date', [None])[0],
+                params.get('end_date', [None])[0]
+            )
+            resolution = resolve_resolution(params.get('resolution', ['auto'])[0], start_date, end_date, finest='daily')
+        except ValueError as e:
+            self._send_json({'success': False, 'error': str(e)}, 400)
+            return
+        
+        parser = get_parser()
+        batch = load_history_batch(parser, currency_codes, start_date, end_date, resolution)
+        
+        cache_control, _ = history_caching(
+            parser, currency_codes, start_date, end_date, [],
+            failed=any(not item['success'] for item in batch['series'].values())
+        )
+        self._send_json({
+            'success': any(item['success'] for item in batch['series'].values()),
+            'data': batch
+        }, cache_control=cache_control)
+    
+    def _serve_currency_cross(self, params):
+        """API: кросс-курсы произвольных пар (EUR/USD, BTC/USD, ETH/BTC) через рубль"""
+        from cross_rates import parse_pairs
+        parser = get_parser()
+        cross_rates = get_cross_rates()
+        pairs_str = params.get('pairs', [''])[0]
+        with_matrix = params.get('matrix', ['false'])[0].lower() == 'true'
+        
+        pairs = []
+        if pairs_str or not with_matrix:
+            try:
+                pairs = parse_pairs(pairs_str)
+            except ValueError as e:
+                self._send_json({'success': False, 'error': str(e)}, 400)
+                return
+        
+        codes = {code for pair in pairs for code in pair}
+        unsupported = sorted(code for code in codes if not cross_rates.is_supported(code))
+        if unsupported:
+            self._send_json({'success': False, 'error': f"Валюта {', '.join(unsupported)} не поддерживается"}, 400)
+            return
+        
+        # Курсы пар, матрица и заголовки кэширования - по одному снимку курсов
+        matrix = cross_rates.get_matrix()
+        payload = {
+            'success': True,
+            'rates': cross_rates.get_rates(pairs, matrix)
+        }
+        if with_matrix:
+            payload['matrix'] = matrix.to_dict()
+        
+        only_fiat = not with_matrix and not any(code in parser.CRYPTO_CURRENCIES for code in codes)
+        rates_type = 'fiat' if only_fiat else 'all'
+        cache_control, last_modified = cross_rates_caching(parser, rates_type, matrix, payload['rates'])
+        self._send_json(payload, cache_control=cache_control, last_modified=last_modified)
+    
+    def _serve_currency_cross_history(self, params):
+        """API: история кросс-курса пары"""
+        from cross_rates import parse_pairs
+        from rate_aggregation import DATE_FORMATS, resolve_resolution
+        parser = get_parser()
+        cross_rates = get_cross_rates()
+        try:
+            pairs = parse_pairs(params.get('pair', [''])[0])
+            if len(pairs) != 1:
+                raise ValueError('Укажите одну пару, например EUR/USD')
+            start_date, end_date = resolve_period(
+                params.get('period', ['7d'])[0],
+                params.get('start_date', [None])[0],
+                params.get('end_date', [None])[0]
+            )
+            base, quote = pairs[0]
+            has_fiat = any(code in parser.FIAT_CURRENCIES for code in (base, quote))
+            resolution = resolve_resolution(params.get('resolution', ['auto'])[0], start_date, end_date,
+                                            finest='daily' if has_fiat else 'raw')
+        except ValueError as e:
+            self._send_json({'success': False, 'error': str(e)}, 400)
+            return
+        
+        if not cross_rates.is_supported(base) or not cross_rates.is_supported(quote):
+            self._send_json({'success': False, 'error': f'Пара {base}/{quote} не поддерживается'}, 400)
+            return
+        error = cross_rates.validate_history(base, quote, start_date, end_date)
+        if error:
+            self._send_json({'success': False, 'error': error}, 400)
+            return
+        
+        try:
+            history = cross_rates.get_history(base, quote, start_date, end_date, resolution)
+        except Exception as e:
+            self._send_json({'success': False, 'error': f'Ошибка при получении данных: {str(e)}'}, 500)
+            return
+        
+        if not history:
+            self._send_json({
+                'success': False,
+                'error': f'Не удалось получить данные за указанный период для пары {base}/{quote}'
+            }, 400)
+            return
+        
+        rates = history.to_list()
+        date_format = DATE_FORMATS[resolution]
+        cache_control, last_modified = history_caching(parser, [base, quote], start_date, end_date,
+                                                       [history.last_date(), history.last_date()])
+        self._send_json({
+            'success': True,
             'data': {
-                'dates': dates,
+                'pair': f'{base}/{quote}',
+                'resolution': resolution,
+                'dates': history.format_dates(date_format),
                 'rates': rates,
-                'min': min(rates),
-                'max': max(rates),
-                'current': rates[-1] if rates else None
+                'min': history.min(),
+                'max': history.max(),
+                'current': history.last()
             }
-        })
+        }, cache_control=cache_control, last_modified=last_modified)
     
-    def _serve_static_file(self, path):
-        """Отдача статических файлов"""
-        filename = path.replace('/static/backgrounds/', '')
-        file_path = os.path.join(os.path.dirname(__file__), '..', 'static', 'backgrounds', filename)
-        
-        if os.path.exists(file_path) and os.path.isfile(file_path):
-            with open(file_path, 'rb') as f:
-                content = f.read()
-            self.send_response(200)
-            if filename.endswith('.svg'):
-                self.send_header('Content-Type', 'image/svg+xml')
-            elif filename.endswith('.png'):
-                self.send_header('Content-Type', 'image/png')
-            elif filename.endswith('.jpg') or filename.endswith('.jpeg'):
-                self.send_header('Content-Type', 'image/jpeg')
-            else:
-                self.send_header('Content-Type', 'application/octet-stream')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.end_headers()
-            self.wfile.write(content)
-        else:
-            self._serve_404()
+    def _serve_currency_analytics(self, params):
+        """API: аналитика курса (доходности, скользящее среднее, волатильность, просадка)"""
+        from rate_aggregation import resolve_resolution
+        from rate_analytics import parse_window
+        parser = get_parser()
+        currency_code = params.get('currency', [''])[0].strip()
+        if not currency_code:
+            self._send_json({'success': False, 'error': 'Не указана валюта'}, 400)
+            return
+        
+        try:
+            start_date, end_date = resolve_period(
+                params.get('period', ['7d'])[0],
+                params.get('start_date', [None])[0],
+                params.get('end_date', [None])[0]
+            )
+            window = parse_window(params.get('window', [None])[0])
+            is_crypto = currency_code in parser.CRYPTO_CURRENCIES
+            resolution = resolve_resolution(params.get('resolution', ['auto'])[0], start_date, end_date,
+                                            finest='raw' if is_crypto else 'daily')
+        except ValueError as e:
+            self._send_json({'success': False, 'error': str(e)}, 400)
+            return
+        
+        error = validate_currency_period(parser, currency_code, start_date, end_date)
+        if error:
+            self._send_json({'success': False, 'error': error}, 400)
+            return
+        
+        try:
+            analytics = get_analytics().get(currency_code, start_date, end_date, resolution, window)
+        except Exception as e:
+            self._send_json({'success': False, 'error': f'Ошибка при получении данных: {str(e)}'}, 500)
+            return
+        
+        if not analytics:
+            self._send_json({'success': False, 'error': empty_history_error(parser, currency_code)}, 400)
+            return
+        
+        data = dict(analytics)
+        last_date = data.pop('last_date')
+        cache_control, last_modified = history_caching(parser, [currency_code], start_date, end_date, [last_date])
+        self._send_json({'success': True, 'data': data}, cache_control=cache_control, last_modified=last_modified)
     
-    def _serve_favicon(self):
-        """Favicon"""
-        self.send_response(200)
-        self.send_header('Content-Type', 'image/vnd.microsoft.icon')
+    def _serve_currency_correlation(self, params):
+        """API: матрица корреляций и ковариаций дневных доходностей валют"""
+        from rate_correlation import MIN_COMMON_DAYS
+        parser = get_parser()
+        correlations = get_correlations()
+        currency_codes = [code.strip() for code in params.get('currencies', [''])[0].split(',') if code.strip()]
+        if not currency_codes:
+            currency_codes = correlations.all_currencies()
+        
+        if len(currency_codes) > MAX_BATCH_CURRENCIES:
+            self._send_json({'success': False, 'error': f'Можно запросить не более {MAX_BATCH_CURRENCIES} валют'}, 400)
+            return
+        
+        try:
+            start_date, end_date = resolve_period(
+                params.get('period', ['90d'])[0],
+                params.get('start_date', [None])[0],
+                params.get('end_date', [None])[0]
+            )
+        except ValueError as e:
+            self._send_json({'success': False, 'error': str(e)}, 400)
+            return
+        
+        matrix = correlations.get_matrix(currency_codes, start_date, end_date)
+        if not matrix['currencies']:
+            self._send_json({
+                'success': False,
+                'error': f'Недостаточно данных: нужно не меньше {MIN_COMMON_DAYS} общих дней с курсами всех валют',
+                'errors': matrix['errors']
+            }, 400)
+            return
+        
+        cache_control, _ = history_caching(parser, matrix['currencies'], start_date, end_date, [],
+                                           failed=bool(matrix['errors']))
+        self._send_json({'success': True, 'data': matrix}, cache_control=cache_control)
+    
+    def _serve_currency_export(self, params):
+        """API: потоковая выгрузка истории курсов в CSV или NDJSON"""
+        from rate_export import EXPORT_FORMATS, export_chunks, export_headers
+        parser = get_parser()
+        currencies_str = params.get('currencies', [''])[0]
+        currency_codes = list(dict.fromkeys(code.strip() for code in currencies_str.split(',') if code.strip()))
+        if not currency_codes:
+            self._send_json({'success': False, 'error': 'Не указаны валюты'}, 400)
+            return
+        if len(currency_codes) > MAX_BATCH_CURRENCIES:
+            self._send_json({'success': False, 'error': f'Можно запросить не более {MAX_BATCH_CURRENCIES} валют'}, 400)
+            return
+        
+        export_format = params.get('format', ['csv'])[0]
+        if export_format not in EXPORT_FORMATS:
+            self._send_json({'success': False, 'error': f'Неизвестный формат {export_format}, допустимо: {", ".join(EXPORT_FORMATS)}'}, 400)
+            return
+        
+        try:
+            start_date, end_date = resolve_period(
+                params.get('period', ['1y'])[0],
+                params.get('start_date', [None])[0],
+                params.get('end_date', [None])[0]
+            )
+        except ValueError as e:
+            self._send_json({'success': False, 'error': str(e)}, 400)
+            return
+        
+        for code in currency_codes:
+            error = validate_currency_period(parser, code, start_date, end_date)
+            if error:
+                self._send_json({'success': False, 'error': error}, 400)
+                return
+        
+        headers = export_headers(currency_codes, start_date, end_date, export_format)
+        headers['Cache-Control'], _ = history_caching(parser, currency_codes, start_date, end_date, [])
+        self._send_stream(
+            export_chunks(parser, currency_codes, start_date, end_date, export_format),
+            EXPORT_FORMATS[export_format],
+            headers
+        )
+    
+    def _serve_currency_snapshot(self, params):
+        """API: курсы всех фиатных валют ЦБ РФ на одну или несколько дат"""
+        parser = get_parser()
+        try:
+            dates = parse_dates(params.get('dates', [''])[0])
+        except ValueError as e:
+            self._send_json({'success': False, 'error': str(e)}, 400)
+            return
+        
+        currencies_str = params.get('currencies', [''])[0]
+        currency_codes = [code.strip() for code in currencies_str.split(',') if code.strip()] or list(parser.FIAT_CURRENCIES)
+        unsupported = [code for code in currency_codes if code not in parser.FIAT_CURRENCIES]
+        if unsupported:
+            self._send_json({
+                'success': False,
+                'error': f"Валюта {', '.join(unsupported)} не поддерживается (снимки ЦБ РФ - только фиатные валюты)"
+            }, 400)
+            return
+        
+        snapshots = load_snapshots(parser, dates, currency_codes)
+        cache_control, last_modified = snapshots_caching(parser, dates, snapshots)
+        self._send_json({
+            'success': any(item['success'] for item in snapshots.values()),
+            'snapshots': snapshots
+        }, cache_control=cache_control, last_modified=last_modified)
+    
+    def _serve_static_file(self, name):
+        """Отдача файлов из static/ с ETag, Range и долгим кэшированием"""
+        asset = static_files.respond(name, self.headers)
+        if asset is None:
+            self._serve_404()
+            return
+        
+        self.send_response(asset.status)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        for header, value in asset.headers.items():
+            self.send_header(header, value)
         self.end_headers()
-        self.wfile.write(b'')
+        if not asset.length:
+            return
+        
+        if is_vercel():
+            for chunk in iter_file(asset.path, asset.offset, asset.length):
+                self.wfile.write(chunk)
+        else:
+            # Локально файл отдаётся ядром через sendfile
+            with open(asset.path, 'rb') as f:
+                self.connection.sendfile(f, asset.offset, asset.length)
     
     def _serve_404(self):
         """404 ошибка"""
+        body = b'<html><body><h1>404 Not Found</h1></body></html>'
         self.send_response(404)
         self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
-        self.wfile.write(b'<html><body><h1>404 Not Found</h1></body></html>')
+        self.wfile.write(body)
@@ -2,10 +2,28 @@
 # -*- coding: utf-8 -*-
 
 import os
-from flask import Flask, render_template_string, request, jsonify, send_from_directory
+from flask import Flask, abort, render_template_string, request, jsonify
+from werkzeug.wsgi import wrap_file
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 from currency_parser import CurrencyParser
+from currency_api import (HISTORY_FORMATS, MAX_BATCH_CURRENCIES, chart_layout_hint, cross_rates_caching,
+                          current_rates_caching, empty_history_error, get_current_rates, history_caching,
+                          load_history_batch, load_snapshots, parse_dates, resolve_period, snapshots_caching,
+                          validate_currency_period)
+from cross_rates import CrossRateEngine, parse_pairs
+from rate_analytics import RateAnalytics, parse_window
+from rate_correlation import MIN_COMMON_DAYS, CorrelationEngine
+from rate_export import EXPORT_FORMATS, export_chunks, export_headers
+from http_caching import NO_STORE, caching_headers, is_not_modified
+from page_assets import get_page
+from static_assets import (BACKGROUND_EXTENSIONS, LISTING_CACHE_CONTROL, STREAM_CHUNK_SIZE, StaticAssetServer,
+                           iter_file)
+from response_compression import apply_encoding_headers, compress_body, compression_stats, select_encoding
+from rate_events import RateBroadcaster, parse_event_id
+from rate_scheduler import RatePrewarmer, is_authorized_cron_request, is_prewarm_enabled
+from rate_aggregation import (AGGREGATIONS, DATE_FORMATS, aggregate_history, downsample, parse_max_points,
+                              resolve_resolution)
 import plotly.graph_objects as go
 import plotly.utils
 import json
@@ -15,9 +33,21 @@ load_dotenv()
 
 app = Flask(__name__)
 parser = CurrencyParser()
+cross_rates = CrossRateEngine(parser)
+rate_analytics = RateAnalytics(parser)
+correlations = CorrelationEngine(parser)
+
+# Фоновый прогрев текущих курсов (PREWARM_ENABLED=true)
+prewarmer = RatePrewarmer(parser)
+# Рассылка изменений курсов подписчикам /api/currency/stream
+rate_events = RateBroadcaster()
+prewarmer.add_listener(rate_events.publish)
+if is_prewarm_enabled():
+    prewarmer.start()
 
 # Настройка статических файлов
 app.config['STATIC_FOLDER'] = 'static'
+static_files = StaticAssetServer(os.path.join(app.root_path, 'static'))
 
 # Получаем параметры хоста
 host = os.getenv('HOST', 'localhost')
@@ -233,439 +263,49 @@ HTML_TEMPLATE = """
 </html>
 """
 
-CURRENCY_HTML_TEMPLATE = """
-<!DOCTYPE html>
-<html lang="ru">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Курсы валют</title>
-    <script src="https://cdn.plot.ly/plotly-2.27.0.min.js"></script>
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-        body {
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, Oxygen, Ubuntu, Cantarell, sans-serif;
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            background-size: cover;
-            background-position: center;
-            background-attachment: fixed;
-            min-height: 100vh;
-            padding: 20px;
-            transition: background-image 0.5s ease;
-        }
-        .container {
-            background: white;
-            border-radius: 20px;
-            box-shadow: 0 20px 60px rgba(0, 0, 0, 0.3);
-            padding: 40px;
-            max-width: 1400px;
-            margin: 0 auto;
-        }
-        h1 {
-            color: #667eea;
-            font-size: 2.5em;
-            text-align: center;
-            margin-bottom: 30px;
-            font-weight: 700;
-        }
-        .nav-links {
-            text-align: center;
-            margin-bottom: 30px;
-        }
-        .nav-links a {
-            color: #667eea;
-            text-decoration: none;
-            margin: 0 15px;
-            font-weight: 500;
-        }
-        .nav-links a:hover {
-            text-decoration: underline;
-        }
-        .controls {
-            display: flex;
-            gap: 15px;
-            margin-bottom: 30px;
-            flex-wrap: wrap;
-            align-items: center;
-        }
-        .control-group {
-            display: flex;
-            flex-direction: column;
-            gap: 5px;
-        }
-        .control-group label {
-            font-size: 0.9em;
-            color: #666;
-            font-weight: 500;
-        }
-        select, input[type="date"], button {
-            padding: 10px 15px;
-            border: 2px solid #e0e0e0;
-            border-radius: 8px;
-            font-size: 1em;
-            font-family: inherit;
-        }
-        select:focus, input[type="date"]:focus {
-            outline: none;
-            border-color: #667eea;
-        }
-        button {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            border: none;
-            cursor: pointer;
-            font-weight: 600;
-            transition: transform 0.2s;
-        }
-        button:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 5px 15px rgba(102, 126, 234, 0.4);
-        }
-        button:active {
-            transform: translateY(0);
-        }
-        .custom-period {
-            display: none;
-            gap: 10px;
-        }
-        .custom-period.active {
-            display: flex;
-        }
-        .chart-container {
-            margin-top: 30px;
-            background: #f8f9fa;
-            border-radius: 10px;
-            padding: 20px;
-        }
-        .stats {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-            gap: 15px;
-            margin-top: 20px;
-        }
-        .stat-card {
-            background: white;
-            padding: 20px;
-            border-radius: 10px;
-            box-shadow: 0 2px 10px rgba(0, 0, 0, 0.1);
-        }
-        .stat-label {
-            font-size: 0.9em;
-            color: #666;
-            margin-bottom: 5px;
-        }
-        .stat-value {
-            font-size: 1.5em;
-            font-weight: 700;
-            color: #333;
-        }
-        .loading {
-            text-align: center;
-            padding: 40px;
-            color: #666;
-            font-size: 1.1em;
-        }
-        .error {
-            background: #fee;
-            color: #c33;
-            padding: 15px;
-            border-radius: 8px;
-            margin-top: 20px;
-        }
-        .current-rates {
-            display: grid;
-            grid-template-columns: repeat(auto-fill, minmax(150px, 1fr));
-            gap: 10px;
-            margin-bottom: 30px;
-        }
-        .rate-card {
-            background: #f8f9fa;
-            padding: 15px;
-            border-radius: 8px;
-            text-align: center;
-        }
-        .rate-code {
-            font-weight: 700;
-            color: #667eea;
-            font-size: 1.1em;
-        }
-        .rate-value {
-            margin-top: 5px;
-            font-size: 1.3em;
-            color: #333;
-        }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div style="position: fixed; top: 20px; right: 20px; z-index: 1000;">
-            <select id="backgroundSelect" style="padding: 8px; border-radius: 5px; border: 1px solid #ddd; background: white;">
-                <option value="">По умолчанию</option>
-            </select>
-        </div>
-        <h1>💱 Курсы валют к рублю</h1>
-        
-        <div class="nav-links">
-            <a href="/">🏠 Главная</a>
-            <a href="/currency">💱 Курсы валют</a>
-        </div>
-        
-        <div class="controls">
-            <div class="control-group">
-                <label>Тип валюты</label>
-                <select id="currencyType">
-                    <option value="fiat">Фиатные валюты</option>
-                    <option value="crypto">Криптовалюты</option>
-                </select>
-            </div>
-            
-            <div class="control-group">
-                <label>Валюта</label>
-                <select id="currencySelect"></select>
-            </div>
-            
-            <div class="control-group">
-                <label>Период</label>
-                <select id="periodSelect">
-                    <option value="7d">7 дней</option>
-                    <option value="30d">30 дней</option>
-                    <option value="90d">90 дней</option>
-                    <option value="1y">1 год</option>
-                    <option value="custom">Кастомный период</option>
-                </select>
-            </div>
-            
-            <div class="custom-period" id="customPeriod">
-                <div class="control-group">
-                    <label>Начальная дата</label>
-                    <input type="date" id="startDate">
-                </div>
-                <div class="control-group">
-                    <label>Конечная дата</label>
-                    <input type="date" id="endDate">
-                </div>
-            </div>
-            
-            <div class="control-group">
-                <label>&nbsp;</label>
-                <button onclick="loadChart()">Показать график</button>
-            </div>
-        </div>
-        
-        <div id="currentRates" class="current-rates"></div>
-        
-        <div id="chartContainer" class="chart-container">
-            <div class="loading">Выберите валюту и период для отображения графика</div>
-        </div>
-    </div>
-    
-    <script>
-        const fiatCurrencies = ['USD', 'EUR', 'GBP', 'JPY', 'CNY', 'CHF', 'AUD', 'CAD', 'NOK', 'SEK'];
-        const cryptoCurrencies = ['BTC', 'ETH', 'BNB', 'XRP', 'ADA', 'SOL', 'DOGE', 'DOT', 'MATIC', 'LTC'];
-        
-        let currentRatesData = {};
-        
-        // Загрузка текущих курсов
-        async function loadCurrentRates() {
-            const type = document.getElementById('currencyType').value;
-            const response = await fetch(`/api/currency/current?type=${type}`);
-            const data = await response.json();
-            
-            if (data.success) {
-                currentRatesData = data.rates;
-                displayCurrentRates(data.rates);
-                updateCurrencySelect(type);
-            }
-        }
-        
-        // Отображение текущих курсов
-        function displayCurrentRates(rates) {
-            const container = document.getElementById('currentRates');
-            container.innerHTML = '';
-            
-            for (const [code, rate] of Object.entries(rates)) {
-                const card = document.createElement('div');
-                card.className = 'rate-card';
-                card.innerHTML = `
-                    <div class="rate-code">${code}</div>
-                    <div class="rate-value">${rate.toLocaleString('ru-RU', {minimumFractionDigits: 2, maximumFractionDigits: 2})}</div>
-                `;
-                container.appendChild(card);
-            }
-        }
-        
-        // Обновление списка валют
-        function updateCurrencySelect(type) {
-            const select = document.getElementById('currencySelect');
-            select.innerHTML = '';
-            
-            const currencies = type === 'fiat' ? fiatCurrencies : cryptoCurrencies;
-            currencies.forEach(code => {
-                const option = document.createElement('option');
-                option.value = code;
-                option.textContent = code;
-                select.appendChild(option);
-            });
-        }
-        
-        // Загрузка графика
-        async function loadChart() {
-            const currency = document.getElementById('currencySelect').value;
-            const period = document.getElementById('periodSelect').value;
-            const container = document.getElementById('chartContainer');
-            
-            // Проверка выбранной валюты
-            if (!currency) {
-                container.innerHTML = '<div class="error">Пожалуйста, выберите валюту</div>';
-                return;
-            }
-            
-            container.innerHTML = '<div class="loading">Загрузка данных...</div>';
-            
-            let url = `/api/currency/history?currency=${encodeURIComponent(currency)}&period=${encodeURIComponent(period)}`;
-            
-            if (period === 'custom') {
-                const startDate = document.getElementById('startDate').value;
-                const endDate = document.getElementById('endDate').value;
-                
-                if (!startDate || !endDate) {
-                    container.innerHTML = '<div class="error">Пожалуйста, выберите начальную и конечную даты</div>';
-                    return;
-                }
-                
-                url += `&start_date=${encodeURIComponent(startDate)}&end_date=${encodeURIComponent(endDate)}`;
-            }
-            
-            try {
-                const response = await fetch(url);
-                const data = await response.json();
-                
-                if (data.success) {
-                    const graphData = JSON.parse(data.graph);
-                    
-                    // Добавляем статистику
-                    const statsHtml = `
-                        <div class="stats">
-                            <div class="stat-card">
-                                <div class="stat-label">Текущий курс</div>
-                                <div class="stat-value">${data.data.current.toLocaleString('ru-RU', {minimumFractionDigits: 2})} ₽</div>
-                            </div>
-                            <div class="stat-card">
-                                <div class="stat-label">Минимальный</div>
-                                <div class="stat-value">${data.data.min.toLocaleString('ru-RU', {minimumFractionDigits: 2})} ₽</div>
-                            </div>
-                            <div class="stat-card">
-                                <div class="stat-label">Максимальный</div>
-                                <div class="stat-value">${data.data.max.toLocaleString('ru-RU', {minimumFractionDigits: 2})} ₽</div>
-                            </div>
-                            <div class="stat-card">
-                                <div class="stat-label">Изменение</div>
-                                <div class="stat-value" style="color: ${data.data.current >= data.data.min ? '#0a0' : '#c33'}">
-                                    ${((data.data.current - data.data.min) / data.data.min * 100).toFixed(2)}%
-                                </div>
-                            </div>
-                        </div>
-                    `;
-                    container.innerHTML = '<div id="chart"></div>' + statsHtml;
-                    Plotly.newPlot('chart', graphData.data, graphData.layout, {responsive: true});
-                } else {
-                    container.innerHTML = `<div class="error">Ошибка: ${data.error || 'Не удалось загрузить данные'}</div>`;
-                }
-            } catch (error) {
-                container.innerHTML = `<div class="error">Ошибка подключения: ${error.message}</div>`;
-            }
-        }
-        
-        // Обработка изменения типа валюты
-        document.getElementById('currencyType').addEventListener('change', () => {
-            loadCurrentRates();
-        });
-        
-        // Обработка изменения периода
-        document.getElementById('periodSelect').addEventListener('change', function() {
-            const customPeriod = document.getElementById('customPeriod');
-            if (this.value === 'custom') {
-                customPeriod.classList.add('active');
-            } else {
-                customPeriod.classList.remove('active');
-            }
-        });
-        
-        // Загрузка списка фонов
-        async function loadBackgrounds() {
-            try {
-                const response = await fetch('/api/backgrounds/list');
-                const data = await response.json();
-                
-                if (data.success && data.backgrounds.length > 0) {
-                    const select = document.getElementById('backgroundSelect');
-                    data.backgrounds.forEach(bg => {
-                        const option = document.createElement('option');
-                        option.value = bg.url;
-                        option.textContent = bg.filename;
-                        select.appendChild(option);
-                    });
-                    
-                    // Загружаем сохраненный фон
-                    const savedBg = localStorage.getItem('selectedBackground');
-                    if (savedBg) {
-                        select.value = savedBg;
-                        applyBackground(savedBg);
-                    }
-                }
-            } catch (error) {
-                console.error('Ошибка загрузки фонов:', error);
-            }
-        }
-        
-        // Применение фона
-        function applyBackground(url) {
-            if (url) {
-                document.body.style.backgroundImage = `url(${url})`;
-                document.body.style.backgroundSize = 'cover';
-                document.body.style.backgroundPosition = 'center';
-                document.body.style.backgroundAttachment = 'fixed';
-            } else {
-                document.body.style.backgroundImage = '';
-                document.body.style.background = 'linear-gradient(135deg, #667eea 0%, #764ba2 100%)';
-            }
-        }
-        
-        // Обработка изменения фона
-        document.getElementById('backgroundSelect').addEventListener('change', function() {
-            const url = this.value;
-            if (url) {
-                localStorage.setItem('selectedBackground', url);
-            } else {
-                localStorage.removeItem('selectedBackground');
-            }
-            applyBackground(url);
-        });
-        
-        // Инициализация
-        loadCurrentRates();
-        loadBackgrounds();
-        
-        // Устанавливаем даты по умолчанию для кастомного периода
-        const today = new Date();
-        const weekAgo = new Date(today);
-        weekAgo.setDate(today.getDate() - 7);
-        
-        document.getElementById('endDate').value = today.toISOString().split('T')[0];
-        document.getElementById('startDate').value = weekAgo.toISOString().split('T')[0];
-    </script>
-</body>
-</html>
-"""
+def cached_jsonify(payload, cache_control, last_modified=None):
+    """JSON-ответ с ETag, Last-Modified и Cache-Control; на условный запрос - 304"""
+    response = jsonify(payload)
+    headers = caching_headers(response.get_data(), cache_control, last_modified)
+    if is_not_modified(request.headers, headers):
+        response = app.response_class(status=304)
+    response.headers.update(headers)
+    return response
+
+@app.after_request
+def compress_response(response):
+    """Сжимает JSON и HTML по Accept-Encoding (файлы и потоковые ответы - как есть)"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    body = response.get_data()
+    encoding = select_encoding(request.headers.get('Accept-Encoding'), response.content_type, len(body))
+    etag = response.headers.get('ETag')
+    apply_encoding_headers(response.headers, response.content_type, len(body), encoding)
+    if encoding:
+        response.set_data(compress_body(body, encoding, etag))
+    return response
+
+def send_static_asset(name):
+    """Файл из static/ с ETag, Range и долгим кэшированием; тело отдаётся частями"""
+    asset = static_files.respond(name, request.headers)
+    if asset is None:
+        abort(404)
+
+    if not asset.length:
+        body = b''
+    elif asset.status == 200:
+        # wsgi.file_wrapper позволяет серверу отдать файл через sendfile
+        body = wrap_file(request.environ, open(asset.path, 'rb'), STREAM_CHUNK_SIZE)
+    else:
+        body = iter_file(asset.path, asset.offset, asset.length)
+    return app.response_class(body, status=asset.status, headers=asset.headers, direct_passthrough=True)
 
 @app.route('/favicon.ico')
 def favicon():
     """Endpoint для favicon"""
-    return send_from_directory(os.path.join(app.root_path, 'static'), 'favicon.ico', mimetype='image/vnd.microsoft.icon')
+    return send_static_asset('favicon.ico')
 
 @app.route('/')
 def index():
@@ -690,52 +330,90 @@ def is_vercel():
 @app.route('/static/backgrounds/<path:filename>')
 def background_file(filename):
     """Endpoint для отдачи файлов фонов"""
-    return send_from_directory(os.path.join(app.root_path, 'static', 'backgrounds'), filename)
+    return send_static_asset(f'backgrounds/{filename}')
 
 @app.route('/api/backgrounds/list')
 def api_backgrounds_list():
     """API для получения списка доступных фонов"""
-    backgrounds_dir = os.path.join(app.root_path, 'static', 'backgrounds')
-    backgrounds = []
-    
     # Определяем окружение
     env = 'vercel' if is_vercel() else 'localhost'
     prefix = 'vercel_bg' if is_vercel() else 'localhost_bg'
     
-    if os.path.exists(backgrounds_dir):
-        for file in os.listdir(backgrounds_dir):
-            # Фильтруем только файлы для текущего окружения
-            if file.startswith(prefix) and file.lower().endswith(('.jpg', '.jpeg', '.png', '.webp', '.gif', '.svg')):
-                backgrounds.append({
-                    'filename': file,
-                    'url': f'/static/backgrounds/{file}'
-                })
+    # Только файлы для текущего окружения; список кэшируется до изменения каталога
+    backgrounds = [
+        {'filename': file, 'url': f'/static/backgrounds/{file}'}
+        for file in static_files.list_files('backgrounds', prefix, BACKGROUND_EXTENSIONS)
+    ]
     
-    return jsonify({
+    return cached_jsonify({
         'success': True,
         'environment': env,
         'backgrounds': backgrounds
-    })
+    }, LISTING_CACHE_CONTROL)
 
 @app.route('/currency')
 def currency():
     """Страница с курсами валют"""
-    return render_template_string(CURRENCY_HTML_TEMPLATE)
+    status, headers, body = get_page('currency.html').respond(request.headers)
+    return app.response_class(body, status=status, headers=headers)
 
 @app.route('/api/currency/current')
 def api_currency_current():
     """API для получения текущих курсов"""
-    currency_type = request.args.get('type', 'fiat')  # fiat или crypto
+    currency_type = request.args.get('type', 'fiat')  # fiat, crypto или all
     
-    if currency_type == 'fiat':
-        rates = parser.get_all_fiat_rates()
-    else:
-        rates = parser.get_all_crypto_rates()
+    rates = get_current_rates(parser, currency_type)
     
-    return jsonify({
+    cache_control, last_modified = current_rates_caching(parser, currency_type, rates)
+    return cached_jsonify({
         'success': True,
         'rates': rates,
         'type': currency_type
+    }, cache_control, last_modified)
+
+@app.route('/api/currency/prewarm')
+def api_currency_prewarm():
+    """API для cron: обновляет текущие курсы в памяти"""
+    if not is_authorized_cron_request(request.headers.get('Authorization')):
+        return jsonify({
+            'success': False,
+            'error': 'Unauthorized'
+        }), 401
+    
+    return jsonify({
+        'success': True,
+        'rates': prewarmer.refresh_once()
+    })
+
+@app.route('/api/currency/stream')
+def api_currency_stream():
+    """SSE: текущие фиатные и криптовалютные курсы при каждом их изменении"""
+    if not rate_events.has_events():
+        rate_events.publish({'fiat': parser.get_all_fiat_rates(), 'crypto': parser.get_all_crypto_rates()})
+    
+    last_event_id = parse_event_id(request.headers.get('Last-Event-ID'))
+    
+    def events():
+        # Курсы обновляет фоновый прогрев; если он не включён, он работает, пока есть подписчики.
+        # Подписка внутри генератора: finally выполняется, только если генератор запущен
+        prewarmer.subscribe()
+        try:
+            yield from rate_events.stream(last_event_id)
+        finally:
+            prewarmer.unsubscribe()
+    
+    return app.response_class(
+        events(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': NO_STORE, 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/currency/metrics')
+def api_currency_metrics():
+    """API для мониторинга кэша и запросов к источникам"""
+    return jsonify({
+        'success': True,
+        'metrics': dict(parser.get_stats(), compression=compression_stats(), events=rate_events.stats())
     })
 
 @app.route('/api/currency/history')
@@ -824,6 +502,37 @@ def api_currency_history():
                 'error': f'Минимальная дата для криптовалют: {min_crypto_date.strftime("%Y-%m-%d")}'
             }), 400
     
+    # Формат ответа: plotly (готовая фигура) или compact (только массивы)
+    response_format = request.args.get('format', 'plotly')
+    if response_format not in HISTORY_FORMATS:
+        return jsonify({
+            'success': False,
+            'error': f'Неизвестный формат {response_format}, допустимо: {", ".join(HISTORY_FORMATS)}'
+        }), 400
+    
+    # Разрешение графика (raw, hourly, daily, weekly или auto) и тип агрегации (close, ohlc);
+    # по умолчанию raw - точки источника в прежнем формате ответа, auto включается явно
+    aggregation = request.args.get('aggregation', 'close')
+    if aggregation not in AGGREGATIONS:
+        return jsonify({
+            'success': False,
+            'error': f'Неизвестный тип агрегации {aggregation}, допустимо: {", ".join(AGGREGATIONS)}'
+        }), 400
+    try:
+        resolution = resolve_resolution(
+            request.args.get('resolution', 'raw'),
+            start_date,
+            end_date,
+            finest='raw' if is_crypto else 'daily'
+        )
+        # Число точек графика: длинный ряд прореживается с сохранением формы (LTTB)
+        max_points = parse_max_points(request.args.get('max_points'))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
     # Получаем данные
     try:
         if is_crypto:
@@ -847,20 +556,63 @@ def api_currency_history():
             'error': error_msg
         }), 400
     
-    # Формируем данные для графика
-    dates = [item['date'].strftime('%Y-%m-%d') for item in history]
-    rates = [item['rate'] for item in history]
+    # Агрегируем точки по интервалам выбранного разрешения
+    is_ohlc = aggregation == 'ohlc'
+    history = aggregate_history(history, resolution, ohlc=is_ohlc)
+    points = downsample(history, max_points) if max_points else history
+    
+    # Формируем данные для графика; min/max/current - по полному ряду
+    date_format = DATE_FORMATS[resolution]
+    dates = points.format_dates(date_format)
+    rates = points.to_list()
+    
+    data = {
+        'dates': dates,
+        'rates': rates,
+        'min': history.min('low' if is_ohlc else None),
+        'max': history.max('high' if is_ohlc else None),
+        'current': history.last(),
+        'resolution': resolution,
+        'total_points': len(history)
+    }
+    if is_ohlc:
+        data['open'] = points.to_list('open')
+        data['high'] = points.to_list('high')
+        data['low'] = points.to_list('low')
+        data['close'] = rates
+    
+    cache_control, last_modified = history_caching(parser, [currency_code], start_date, end_date,
+                                                   [history.last_date()])
+    
+    # Компактный формат: только массивы и подсказка для построения графика на клиенте
+    if response_format == 'compact':
+        return cached_jsonify({
+            'success': True,
+            'format': 'compact',
+            'data': data,
+            'layout': chart_layout_hint(currency_code, is_ohlc)
+        }, cache_control, last_modified)
     
     # Создаем график
     fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=dates,
-        y=rates,
-        mode='lines+markers',
-        name=currency_code,
-        line=dict(color='#667eea', width=2),
-        marker=dict(size=4)
-    ))
+    if is_ohlc:
+        fig.add_trace(go.Candlestick(
+            x=dates,
+            open=data['open'],
+            high=data['high'],
+            low=data['low'],
+            close=rates,
+            name=currency_code
+        ))
+    else:
+        fig.add_trace(go.Scatter(
+            x=dates,
+            y=rates,
+            mode='lines+markers',
+            name=currency_code,
+            line=dict(color='#667eea', width=2),
+            marker=dict(size=4)
+        ))
     
     fig.update_layout(
         title=f'Курс {currency_code} к рублю',
@@ -869,22 +621,335 @@ def api_currency_history():
         hovermode='x unified',
         template='plotly_white',
         height=500,
-        showlegend=False
+        showlegend=False,
+        xaxis_rangeslider_visible=False
     )
     
     graph_json = json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
     
-    return jsonify({
+    return cached_jsonify({
         'success': True,
         'graph': graph_json,
+        'data': data
+    }, cache_control, last_modified)
+
+@app.route('/api/currency/history/batch')
+def api_currency_history_batch():
+    """API для получения истории нескольких валют на общей оси дат"""
+    currency_codes = [code.strip() for code in request.args.get('currencies', '').split(',') if code.strip()]
+    
+    if not currency_codes:
+        return jsonify({
+            'success': False,
+            'error': 'Не указаны валюты'
+        }), 400
+    if len(currency_codes) > MAX_BATCH_CURRENCIES:
+        return jsonify({
+            'success': False,
+            'error': f'Можно запросить не более {MAX_BATCH_CURRENCIES} валют'
+        }), 400
+    
+    try:
+        start_date, end_date = resolve_period(
+            request.args.get('period', '7d'),
+            request.args.get('start_date'),
+            request.args.get('end_date')
+        )
+        # Курсы ЦБ РФ дневные, поэтому общая ось не мельче дня
+        resolution = resolve_resolution(request.args.get('resolution', 'auto'), start_date, end_date, finest='daily')
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    batch = load_history_batch(parser, currency_codes, start_date, end_date, resolution)
+    
+    cache_control, _ = history_caching(
+        parser, currency_codes, start_date, end_date, [],
+        failed=any(not item['success'] for item in batch['series'].values())
+    )
+    return cached_jsonify({
+        'success': any(item['success'] for item in batch['series'].values()),
+        'data': batch
+    }, cache_control)
+
+@app.route('/api/currency/cross')
+def api_currency_cross():
+    """API для кросс-курсов произвольных пар (EUR/USD, BTC/USD, ETH/BTC) через рубль"""
+    pairs_str = request.args.get('pairs', '')
+    with_matrix = request.args.get('matrix', 'false').lower() == 'true'
+    
+    pairs = []
+    if pairs_str or not with_matrix:
+        try:
+            pairs = parse_pairs(pairs_str)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+    
+    codes = {code for pair in pairs for code in pair}
+    unsupported = sorted(code for code in codes if not cross_rates.is_supported(code))
+    if unsupported:
+        return jsonify({
+            'success': False,
+            'error': f"Валюта {', '.join(unsupported)} не поддерживается"
+        }), 400
+    
+    # Курсы пар, матрица и заголовки кэширования - по одному снимку курсов
+    matrix = cross_rates.get_matrix()
+    payload = {
+        'success': True,
+        'rates': cross_rates.get_rates(pairs, matrix)
+    }
+    if with_matrix:
+        payload['matrix'] = matrix.to_dict()
+    
+    only_fiat = not with_matrix and not any(code in parser.CRYPTO_CURRENCIES for code in codes)
+    rates_type = 'fiat' if only_fiat else 'all'
+    cache_control, last_modified = cross_rates_caching(parser, rates_type, matrix, payload['rates'])
+    return cached_jsonify(payload, cache_control, last_modified)
+
+@app.route('/api/currency/cross/history')
+def api_currency_cross_history():
+    """API для истории кросс-курса пары"""
+    try:
+        pairs = parse_pairs(request.args.get('pair', ''))
+        if len(pairs) != 1:
+            raise ValueError('Укажите одну пару, например EUR/USD')
+        start_date, end_date = resolve_period(
+            request.args.get('period', '7d'),
+            request.args.get('start_date'),
+            request.args.get('end_date')
+        )
+        base, quote = pairs[0]
+        has_fiat = any(code in parser.FIAT_CURRENCIES for code in (base, quote))
+        resolution = resolve_resolution(request.args.get('resolution', 'auto'), start_date, end_date,
+                                        finest='daily' if has_fiat else 'raw')
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    if not cross_rates.is_supported(base) or not cross_rates.is_supported(quote):
+        return jsonify({
+            'success': False,
+            'error': f'Пара {base}/{quote} не поддерживается'
+        }), 400
+    error = cross_rates.validate_history(base, quote, start_date, end_date)
+    if error:
+        return jsonify({
+            'success': False,
+            'error': error
+        }), 400
+    
+    try:
+        history = cross_rates.get_history(base, quote, start_date, end_date, resolution)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Ошибка при получении данных: {str(e)}'
+        }), 500
+    
+    if not history:
+        return jsonify({
+            'success': False,
+            'error': f'Не удалось получить данные за указанный период для пары {base}/{quote}'
+        }), 400
+    
+    rates = history.to_list()
+    date_format = DATE_FORMATS[resolution]
+    cache_control, last_modified = history_caching(parser, [base, quote], start_date, end_date,
+                                                   [history.last_date(), history.last_date()])
+    return cached_jsonify({
+        'success': True,
         'data': {
-            'dates': dates,
+            'pair': f'{base}/{quote}',
+            'resolution': resolution,
+            'dates': history.format_dates(date_format),
             'rates': rates,
-            'min': min(rates),
-            'max': max(rates),
-            'current': rates[-1] if rates else None
+            'min': history.min(),
+            'max': history.max(),
+            'current': history.last()
         }
-    })
+    }, cache_control, last_modified)
+
+@app.route('/api/currency/analytics')
+def api_currency_analytics():
+    """API для аналитики курса: доходности, скользящее среднее, волатильность, просадка, изменение за период"""
+    currency_code = request.args.get('currency', '').strip()
+    if not currency_code:
+        return jsonify({
+            'success': False,
+            'error': 'Не указана валюта'
+        }), 400
+    
+    try:
+        start_date, end_date = resolve_period(
+            request.args.get('period', '7d'),
+            request.args.get('start_date'),
+            request.args.get('end_date')
+        )
+        window = parse_window(request.args.get('window'))
+        is_crypto = currency_code in parser.CRYPTO_CURRENCIES
+        resolution = resolve_resolution(request.args.get('resolution', 'auto'), start_date, end_date,
+                                        finest='raw' if is_crypto else 'daily')
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    error = validate_currency_period(parser, currency_code, start_date, end_date)
+    if error:
+        return jsonify({
+            'success': False,
+            'error': error
+        }), 400
+    
+    try:
+        analytics = rate_analytics.get(currency_code, start_date, end_date, resolution, window)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': f'Ошибка при получении данных: {str(e)}'
+        }), 500
+    
+    if not analytics:
+        return jsonify({
+            'success': False,
+            'error': empty_history_error(parser, currency_code)
+        }), 400
+    
+    data = dict(analytics)
+    last_date = data.pop('last_date')
+    cache_control, last_modified = history_caching(parser, [currency_code], start_date, end_date, [last_date])
+    return cached_jsonify({
+        'success': True,
+        'data': data
+    }, cache_control, last_modified)
+
+@app.route('/api/currency/correlation')
+def api_currency_correlation():
+    """API для матрицы корреляций и ковариаций дневных доходностей валют"""
+    currencies_str = request.args.get('currencies', '')
+    currency_codes = [code.strip() for code in currencies_str.split(',') if code.strip()]
+    if not currency_codes:
+        currency_codes = correlations.all_currencies()
+    
+    if len(currency_codes) > MAX_BATCH_CURRENCIES:
+        return jsonify({
+            'success': False,
+            'error': f'Можно запросить не более {MAX_BATCH_CURRENCIES} валют'
+        }), 400
+    
+    try:
+        start_date, end_date = resolve_period(
+            request.args.get('period', '90d'),
+            request.args.get('start_date'),
+            request.args.get('end_date')
+        )
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    matrix = correlations.get_matrix(currency_codes, start_date, end_date)
+    if not matrix['currencies']:
+        return jsonify({
+            'success': False,
+            'error': f'Недостаточно данных: нужно не меньше {MIN_COMMON_DAYS} общих дней с курсами всех валют',
+            'errors': matrix['errors']
+        }), 400
+    
+    cache_control, _ = history_caching(parser, matrix['currencies'], start_date, end_date, [],
+                                       failed=bool(matrix['errors']))
+    return cached_jsonify({
+        'success': True,
+        'data': matrix
+    }, cache_control)
+
+@app.route('/api/currency/export')
+def api_currency_export():
+    """Потоковая выгрузка истории курсов в CSV или NDJSON"""
+    currencies_str = request.args.get('currencies', '')
+    currency_codes = list(dict.fromkeys(code.strip() for code in currencies_str.split(',') if code.strip()))
+    if not currency_codes:
+        return jsonify({
+            'success': False,
+            'error': 'Не указаны валюты'
+        }), 400
+    if len(currency_codes) > MAX_BATCH_CURRENCIES:
+        return jsonify({
+            'success': False,
+            'error': f'Можно запросить не более {MAX_BATCH_CURRENCIES} валют'
+        }), 400
+    
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({
+            'success': False,
+            'error': f'Неизвестный формат {export_format}, допустимо: {", ".join(EXPORT_FORMATS)}'
+        }), 400
+    
+    try:
+        start_date, end_date = resolve_period(
+            request.args.get('period', '1y'),
+            request.args.get('start_date'),
+            request.args.get('end_date')
+        )
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    for code in currency_codes:
+        error = validate_currency_period(parser, code, start_date, end_date)
+        if error:
+            return jsonify({
+                'success': False,
+                'error': error
+            }), 400
+    
+    headers = export_headers(currency_codes, start_date, end_date, export_format)
+    headers['Cache-Control'], _ = history_caching(parser, currency_codes, start_date, end_date, [])
+    return app.response_class(
+        export_chunks(parser, currency_codes, start_date, end_date, export_format),
+        content_type=EXPORT_FORMATS[export_format],
+        headers=headers
+    )
+
+@app.route('/api/currency/snapshot')
+def api_currency_snapshot():
+    """API для курсов всех фиатных валют ЦБ РФ на одну или несколько дат"""
+    try:
+        dates = parse_dates(request.args.get('dates', ''))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    currencies_str = request.args.get('currencies', '')
+    currency_codes = [code.strip() for code in currencies_str.split(',') if code.strip()] or list(parser.FIAT_CURRENCIES)
+    unsupported = [code for code in currency_codes if code not in parser.FIAT_CURRENCIES]
+    if unsupported:
+        return jsonify({
+            'success': False,
+            'error': f"Валюта {', '.join(unsupported)} не поддерживается (снимки ЦБ РФ - только фиатные валюты)"
+        }), 400
+    
+    snapshots = load_snapshots(parser, dates, currency_codes)
+    cache_control, last_modified = snapshots_caching(parser, dates, snapshots)
+    return cached_jsonify({
+        'success': any(item['success'] for item in snapshots.values()),
+        'snapshots': snapshots
+    }, cache_control, last_modified)
 
 if __name__ == '__main__':
     print(f"\n🚀 Запуск сервера на http://{host}:{port}")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Сравнение хранения истории курсов: список словарей и колонки RateSeries
+- Память на ряд (tracemalloc) и время построения
+- min/max/последний курс, срез по датам, экспорт в JSON-массивы
+- Данные синтетические (почасовой ряд криптовалюты), сеть не нужна
+    python benchmark_series.py
+    python benchmark_series.py --points 100000 --runs 5
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+from rate_aggregation import DATE_FORMATS, aggregate_history
+from rate_series import RateSeries
+
+try:
+    import numpy as np
+except ImportError:  # numpy - необязательная зависимость
+    np = None
+
+
+def make_pairs(points: int) -> List[Tuple[datetime, float]]:
+    """Почасовой ряд (дата, курс)"""
+    start = datetime(2020, 1, 1)
+    return [(start + timedelta(hours=index), 1000.0 + (index % 97) * 0.5) for index in range(points)]
+
+
+def measure_memory(build: Callable[[], object]) -> Tuple[object, int]:
+    """Строит объект и возвращает его вместе с объёмом выделенной памяти в байтах"""
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def best_time(func: Callable[[], object], runs: int) -> float:
+    """Лучшее время выполнения в мс"""
+    best = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def records_slice(records: List[Dict], dates: List[datetime], start: datetime, end: datetime) -> List[Dict]:
+    """
+    Срез списка словарей по датам бинарным поиском
+
+    Список дат строится один раз заранее (как индекс времени в RateSeries),
+    поэтому сравнивается сам поиск, а не копирование дат.
+    """
+    return records[bisect_left(dates, start):bisect_right(dates, end)]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Список словарей против RateSeries')
+    arg_parser.add_argument('--points', type=int, default=50000, help='Число точек ряда')
+    arg_parser.add_argument('--runs', type=int, default=3, help='Число запусков, берётся лучший')
+    args = arg_parser.parse_args()
+
+    pairs = make_pairs(args.points)
+    records, records_bytes = measure_memory(
+        lambda: [{'date': date_obj, 'rate': rate, 'currency': 'BTC'} for date_obj, rate in pairs]
+    )
+    series, series_bytes = measure_memory(lambda: RateSeries.from_pairs(pairs, 'BTC'))
+    record_dates = [record['date'] for record in records]
+
+    slice_start = pairs[len(pairs) // 4][0]
+    slice_end = pairs[len(pairs) // 2][0]
+    date_format = DATE_FORMATS['hourly']
+
+    cases = [
+        ('построение',
+         lambda: [{'date': date_obj, 'rate': rate, 'currency': 'BTC'} for date_obj, rate in pairs],
+         lambda: RateSeries.from_pairs(pairs, 'BTC')),
+        ('min/max/последний',
+         lambda: (min(r['rate'] for r in records), max(r['rate'] for r in records), records[-1]['rate']),
+         lambda: (series.min(), series.max(), series.last())),
+        ('срез по датам',
+         lambda: records_slice(records, record_dates, slice_start, slice_end),
+         lambda: series.slice(slice_start, slice_end)),
+        ('JSON-массивы',
+         lambda: json.dumps({'dates': [r['date'].strftime(date_format) for r in records],
+                             'rates': [r['rate'] for r in records]}),
+         lambda: json.dumps(series.to_json(date_format))),
+    ]
+
+    print(f"Точек: {args.points}, numpy: {'да' if np is not None else 'нет (array)'}")
+    print(f'  память: список словарей {records_bytes / 1024:.0f} КБ, '
+          f'RateSeries {series_bytes / 1024:.0f} КБ '
+          f'(данные {series.nbytes() / 1024:.0f} КБ)')
+    print(f"  {'операция':<20} {'словари':>10} {'RateSeries':>12}")
+    for name, with_records, with_series in cases:
+        records_ms = best_time(with_records, args.runs)
+        series_ms = best_time(with_series, args.runs)
+        print(f'  {name:<20} {records_ms:>7.2f} мс {series_ms:>9.2f} мс')
+
+    daily_ms = best_time(lambda: aggregate_history(series, 'daily'), args.runs)
+    ohlc_ms = best_time(lambda: aggregate_history(series, 'daily', ohlc=True), args.runs)
+    print(f'  агрегация RateSeries: daily {daily_ms:.2f} мс, daily OHLC {ohlc_ms:.2f} мс')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Защита от недоступных источников курсов
+- CircuitBreaker: после серии ошибок запросы к источнику сразу отклоняются,
+  через recovery_timeout пропускается пробный запрос (half-open)
+- RetryPolicy: ограниченное число повторов с экспоненциальной задержкой,
+  случайным разбросом (jitter), учётом Retry-After и общим бюджетом повторов
+"""
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+
+class CircuitOpenError(Exception):
+    """Источник временно отключён автоматом защиты"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Источник {name} временно недоступен, повтор через {retry_in:.0f} с")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Автомат защиты для одного источника"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        """
+        Args:
+            name: Имя источника (для сообщений и мониторинга)
+            failure_threshold: Число ошибок подряд, после которого автомат размыкается
+            recovery_timeout: Через сколько секунд пропустить пробный запрос
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_until = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self._stats = {'successes': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    @property
+    def state(self) -> str:
+        """Текущее состояние: closed, open или half_open"""
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() >= self._opened_until:
+                return self.HALF_OPEN
+            return self._state
+
+    def before_request(self):
+        """
+        Проверяет, можно ли обращаться к источнику
+
+        Raises:
+            CircuitOpenError: Если автомат разомкнут или пробный запрос уже выполняется
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._state == self.OPEN:
+                if now < self._opened_until:
+                    self._stats['rejected'] += 1
+                    raise CircuitOpenError(self.name, self._opened_until - now)
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    self._stats['rejected'] += 1
+                    raise CircuitOpenError(self.name, self.recovery_timeout)
+                self._probe_in_flight = True
+
+    def record_success(self):
+        """Успешный запрос: автомат замыкается"""
+        with self._lock:
+            self._stats['successes'] += 1
+            self._failures = 0
+            self._state = self.CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self, retry_after: Optional[float] = None):
+        """
+        Неудачный запрос (один на запрос после всех повторов)
+
+        Автомат размыкается после failure_threshold отказов подряд или при отказе
+        пробного запроса. Retry-After сам по себе автомат не размыкает, а только
+        продлевает паузу, если автомат размыкается этим отказом.
+
+        Args:
+            retry_after: Пауза, запрошенная источником (Retry-After), в секундах
+        """
+        with self._lock:
+            self._stats['failures'] += 1
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._stats['opened'] += 1
+                self._state = self.OPEN
+                self._opened_until = time.monotonic() + max(self.recovery_timeout, retry_after or 0.0)
+
+    def release(self):
+        """
+        Запрос завершился без результата (например, непредвиденным исключением)
+
+        Отказ не засчитывается, но пробный запрос half-open освобождается,
+        иначе автомат отклонял бы все следующие запросы.
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self) -> Dict:
+        """Состояние и счётчики для мониторинга"""
+        state = self.state
+        with self._lock:
+            retry_in = max(self._opened_until - time.monotonic(), 0.0) if state == self.OPEN else 0.0
+            return dict(self._stats, state=state, consecutive_failures=self._failures,
+                        retry_in=round(retry_in, 1))
+
+
+class RetryPolicy:
+    """Повторы с экспоненциальной задержкой, jitter и общим бюджетом"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.3, max_delay: float = 2.0,
+                 budget_ratio: float = 0.2, budget_max: float = 10.0):
+        """
+        Args:
+            max_attempts: Максимум попыток на один запрос (включая первую)
+            base_delay: Базовая задержка перед повтором в секундах
+            max_delay: Максимальная задержка; если Retry-After больше - повтора не будет
+            budget_ratio: Сколько повторов накапливается за каждый запрос
+            budget_max: Максимальный запас повторов
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.budget_max = budget_max
+        self._budget = budget_max
+        self._lock = threading.Lock()
+
+    def on_request(self):
+        """Учитывает новый запрос в бюджете повторов"""
+        with self._lock:
+            self._budget = min(self._budget + self.budget_ratio, self.budget_max)
+
+    def next_delay(self, attempt: int, retry_after: Optional[float] = None) -> Optional[float]:
+        """
+        Задержка перед следующей попыткой или None, если повторять не нужно
+
+        Args:
+            attempt: Номер завершившейся неудачей попытки (с 1)
+            retry_after: Пауза, запрошенная источником, в секундах
+        """
+        if attempt >= self.max_attempts:
+            return None
+        if retry_after is not None and retry_after > self.max_delay:
+            return None
+
+        with self._lock:
+            if self._budget < 1:
+                return None
+            self._budget -= 1
+
+        if retry_after is not None:
+            return retry_after
+        # Full jitter: случайная задержка от 0 до экспоненциальной границы
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def budget(self) -> float:
+        """Оставшийся запас повторов"""
+        with self._lock:
+            return round(self._budget, 2)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Разбирает заголовок Retry-After (секунды или HTTP-дата) в секунды"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Кросс-курсы произвольных пар валют через рубль
+- Цены всех валют в рублях берутся из одного снимка ЦБ РФ и курсов CoinGecko
+- Матрица кросс-курсов считается за один проход (numpy, если установлен)
+  и пересчитывается только при обновлении исходных курсов
+- Курс пары из готовой матрицы - O(1)
+- Исторический кросс-курс - отношение двух рядов к рублю на общей оси дат
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from currency_api import get_history, validate_currency_period
+from rate_aggregation import aggregate_history
+from rate_series import RateSeries
+
+try:
+    import numpy as np
+except ImportError:  # numpy - необязательная зависимость
+    np = None
+
+BASE_CURRENCY = 'RUB'
+
+# Максимум пар в одном запросе
+MAX_CROSS_PAIRS = 50
+
+
+def parse_pairs(pairs_str: str) -> List[Tuple[str, str]]:
+    """
+    Разбирает список пар вида EUR/USD,BTC/USD
+
+    Raises:
+        ValueError: С сообщением для пользователя, если пара задана неверно
+    """
+    pairs = []
+    for pair in pairs_str.split(','):
+        pair = pair.strip().upper()
+        if not pair:
+            continue
+        base, sep, quote = pair.partition('/')
+        if not sep or not base or not quote:
+            raise ValueError(f'Неверный формат пары {pair}, ожидается BASE/QUOTE (например, EUR/USD)')
+        pairs.append((base, quote))
+    if not pairs:
+        raise ValueError('Не указаны пары валют')
+    if len(pairs) > MAX_CROSS_PAIRS:
+        raise ValueError(f'Можно запросить не более {MAX_CROSS_PAIRS} пар')
+    return pairs
+
+
+class CrossRateMatrix:
+    """Матрица кросс-курсов: matrix[i][j] - цена единицы currencies[i] в единицах currencies[j]"""
+
+    def __init__(self, prices: Dict[str, float], updated_at: Optional[Dict[str, Optional[float]]] = None):
+        """
+        Args:
+            prices: Цена единицы валюты в рублях для каждого кода (включая RUB = 1)
+            updated_at: Время обновления исходных курсов {'fiat', 'crypto'} (unix timestamp);
+                None - курсов источника нет
+        """
+        self.updated_at = updated_at or {}
+        self.currencies = list(prices)
+        self.index = {code: position for position, code in enumerate(self.currencies)}
+        values = [prices[code] for code in self.currencies]
+
+        if np is not None:
+            vector = np.asarray(values, dtype=float)
+            self.matrix = np.divide.outer(vector, vector)
+        else:
+            inverse = [1.0 / value for value in values]
+            self.matrix = [[value * inv for inv in inverse] for value in values]
+
+    def rate(self, base: str, quote: str) -> Optional[float]:
+        """Курс пары base/quote или None, если одной из валют нет в снимке"""
+        i = self.index.get(base)
+        j = self.index.get(quote)
+        if i is None or j is None:
+            return None
+        return float(self.matrix[i][j])
+
+    def to_dict(self) -> Dict:
+        """Матрица для JSON-ответа"""
+        rows = self.matrix.tolist() if np is not None else self.matrix
+        return {'currencies': self.currencies, 'matrix': rows}
+
+
+class CrossRateEngine:
+    """Кросс-курсы на основе кэшированных курсов парсера"""
+
+    def __init__(self, parser):
+        """
+        Args:
+            parser: Экземпляр CurrencyParser
+        """
+        self.parser = parser
+        self._sources: Tuple[Optional[Dict], Optional[Dict]] = (None, None)
+        self._matrix: Optional[CrossRateMatrix] = None
+        self._lock = threading.Lock()
+
+    def is_supported(self, currency_code: str) -> bool:
+        """Есть ли валюта в справочниках парсера"""
+        return (currency_code == BASE_CURRENCY or currency_code in self.parser.FIAT_CURRENCIES
+                or currency_code in self.parser.CRYPTO_CURRENCIES)
+
+    def rub_prices(self, snapshot: Optional[Dict], crypto_rates: Dict[str, float]) -> Dict[str, float]:
+        """Цена единицы каждой валюты в рублях (курс ЦБ РФ делится на номинал)"""
+        prices = {BASE_CURRENCY: 1.0}
+        if snapshot:
+            valutes = snapshot['valutes']
+            for code in self.parser.FIAT_CURRENCIES:
+                valute = valutes.get(code)
+                if valute and valute['value'] > 0:
+                    prices[code] = valute['value'] / valute['nominal']
+        for code, rate in crypto_rates.items():
+            if rate and rate > 0:
+                prices[code] = rate
+        return prices
+
+    def get_matrix(self) -> CrossRateMatrix:
+        """
+        Матрица кросс-курсов для текущих курсов
+
+        Снимок ЦБ РФ и курсы CoinGecko приходят из кэша парсера тем же объектом,
+        пока не обновятся, поэтому матрица пересчитывается только после обновления.
+        """
+        snapshot = self.parser.get_daily_snapshot()
+        crypto_rates = self.parser.get_all_crypto_rates()
+
+        with self._lock:
+            if self._matrix is not None and self._sources[0] is snapshot and self._sources[1] is crypto_rates:
+                return self._matrix
+
+        updated_at = {
+            'fiat': self.parser.cbr_publication_timestamp(snapshot['date']) if snapshot and snapshot['date'] else None,
+            'crypto': self.parser.cache.stored_at(('crypto_prices',)) if crypto_rates else None,
+        }
+        matrix = CrossRateMatrix(self.rub_prices(snapshot, crypto_rates), updated_at)
+        with self._lock:
+            self._sources = (snapshot, crypto_rates)
+            self._matrix = matrix
+        return matrix
+
+    def get_rates(self, pairs: List[Tuple[str, str]],
+                  matrix: Optional[CrossRateMatrix] = None) -> Dict[str, Optional[float]]:
+        """
+        Курсы пар {'EUR/USD': курс}; None - курс одной из валют недоступен
+
+        Args:
+            pairs: Пары (base, quote)
+            matrix: Уже полученная матрица (по умолчанию - get_matrix())
+        """
+        matrix = matrix or self.get_matrix()
+        return {f'{base}/{quote}': matrix.rate(base, quote) for base, quote in pairs}
+
+    def validate_history(self, base: str, quote: str, start_date: datetime, end_date: datetime) -> Optional[str]:
+        """Проверяет валюты пары и ограничения источников; возвращает текст ошибки или None"""
+        for code in (base, quote):
+            if code == BASE_CURRENCY:
+                continue
+            error = validate_currency_period(self.parser, code, start_date, end_date)
+            if error:
+                return error
+        if base == quote:
+            return 'Валюты пары должны различаться'
+        return None
+
+    def get_history(self, base: str, quote: str, start_date: datetime, end_date: datetime,
+                    resolution: str = 'daily') -> RateSeries:
+        """
+        История кросс-курса base/quote
+
+        Оба ряда к рублю загружаются параллельно и агрегируются до общего разрешения.
+        На общей оси дат пропуски заполняются последним известным курсом
+        (курс ЦБ РФ действует до следующей публикации).
+
+        Args:
+            base: Базовая валюта
+            quote: Валюта котировки
+            start_date: Начальная дата
+            end_date: Конечная дата
+            resolution: Разрешение ряда (см. rate_aggregation.RESOLUTIONS)
+
+        Returns:
+            Ряд с кодом пары BASE/QUOTE; пустой, если ряд получить не удалось
+        """
+        legs = [code for code in (base, quote) if code != BASE_CURRENCY]
+        with ThreadPoolExecutor(max_workers=len(legs)) as executor:
+            loaded = dict(zip(legs, executor.map(
+                lambda code: self._rub_series(code, start_date, end_date, resolution), legs
+            )))
+        pair = f'{base}/{quote}'
+        if any(not series for series in loaded.values()):
+            return RateSeries.empty(pair)
+
+        axis = sorted({timestamp for series in loaded.values() for timestamp in series})
+        last = {code: None for code in legs}
+        last[BASE_CURRENCY] = 1.0
+
+        timestamps = []
+        rates = []
+        for timestamp in axis:
+            for code in legs:
+                if timestamp in loaded[code]:
+                    last[code] = loaded[code][timestamp]
+            if last[base] is None or last[quote] is None:
+                continue
+            timestamps.append(timestamp)
+            rates.append(last[base] / last[quote])
+        return RateSeries(pair, timestamps, rates)
+
+    def _rub_series(self, currency_code: str, start_date: datetime, end_date: datetime,
+                    resolution: str) -> Dict[float, float]:
+        """
+        Ряд цены единицы валюты в рублях {timestamp: цена}
+
+        Курс ЦБ РФ делится на номинал той же записи до агрегации: номинал валюты
+        со временем меняется, и номинал текущего снимка к старым курсам неприменим.
+
+        Raises:
+            ValueError: Номинал котировки ЦБ РФ неизвестен
+        """
+        history = get_history(self.parser, currency_code, start_date, end_date)
+        if history and currency_code in self.parser.FIAT_CURRENCIES:
+            nominals = history.columns.get('nominal')
+            if nominals is None:
+                raise ValueError(f'Неизвестен номинал котировки ЦБ РФ для {currency_code}')
+            history = RateSeries(currency_code, history.timestamps, [
+                rate / nominal for rate, nominal in zip(history.values.tolist(), nominals.tolist())
+            ])
+        history = aggregate_history(history, resolution)
+        return {
+            timestamp: rate
+            for timestamp, rate in zip(history.timestamps.tolist(), history.values.tolist()) if rate > 0
+        }
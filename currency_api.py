@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Общая логика API курсов валют для app.py (Flask) и api/index.py (Vercel)
+- Разбор периода запроса
+- Пакетная загрузка истории нескольких валют с выравниванием по датам
+- Снимки курсов ЦБ РФ на несколько дат (один запрос XML_daily.asp на дату)
+- Политики HTTP-кэширования ответов
+- Подсказка для построения графика на клиенте (компактный формат истории)
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from http_caching import NO_STORE, cache_control
+
+# rate_aggregation и rate_series импортируются в функциях истории:
+# /api/currency/current и статика на Vercel обходятся без них
+
+# Длительность стандартных периодов
+PERIODS = {
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+    '90d': timedelta(days=90),
+    '1y': timedelta(days=365),
+}
+
+# Ограничения источников
+MAX_PERIOD_DAYS = 1825  # 5 лет
+MAX_CRYPTO_DAYS = 365  # CoinGecko
+MIN_CRYPTO_DATE = datetime(2013, 1, 1)
+
+# Форматы ответа /api/currency/history
+HISTORY_FORMATS = ('plotly', 'compact')
+
+# Максимум валют и параллельных загрузок в одном пакетном запросе
+MAX_BATCH_CURRENCIES = 20
+BATCH_MAX_WORKERS = 8
+
+# Максимум дат и параллельных загрузок снимков ЦБ РФ в одном запросе
+MAX_SNAPSHOT_DATES = 31
+SNAPSHOT_MAX_WORKERS = 4
+MIN_CBR_DATE = datetime(1992, 7, 1)
+
+
+def resolve_period(period: str, start_date_str: Optional[str] = None,
+                   end_date_str: Optional[str] = None) -> Tuple[datetime, datetime]:
+    """
+    Определяет границы периода запроса
+
+    Args:
+        period: 7d, 30d, 90d, 1y или custom (неизвестные значения - 7d)
+        start_date_str: Начальная дата custom-периода (YYYY-MM-DD)
+        end_date_str: Конечная дата custom-периода (YYYY-MM-DD)
+
+    Returns:
+        Кортеж (начальная дата, конечная дата)
+
+    Raises:
+        ValueError: С сообщением для пользователя, если период задан неверно
+    """
+    end_date = datetime.now()
+
+    if period != 'custom':
+        return end_date - PERIODS.get(period, PERIODS['7d']), end_date
+
+    if not start_date_str or not end_date_str:
+        raise ValueError('Для кастомного периода необходимо указать начальную и конечную даты')
+    try:
+        start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
+        end_date = datetime.strptime(end_date_str, '%Y-%m-%d')
+    except ValueError as e:
+        raise ValueError(f'Неверный формат даты: {str(e)}')
+
+    if start_date >= end_date:
+        raise ValueError('Начальная дата должна быть раньше конечной')
+    if (end_date - start_date).days > MAX_PERIOD_DAYS:
+        raise ValueError(f'Максимальный период не должен превышать {MAX_PERIOD_DAYS // 365} лет')
+
+    return start_date, end_date
+
+
+def validate_currency_period(parser, currency_code: str, start_date: datetime,
+                             end_date: datetime) -> Optional[str]:
+    """Проверяет валюту и ограничения источника; возвращает текст ошибки или None"""
+    is_crypto = currency_code in parser.CRYPTO_CURRENCIES
+    if not is_crypto and currency_code not in parser.FIAT_CURRENCIES:
+        return f'Валюта {currency_code} не поддерживается'
+
+    if is_crypto:
+        period_days = (end_date - start_date).days
+        if period_days > MAX_CRYPTO_DAYS:
+            return f'Для криптовалют максимальный период составляет {MAX_CRYPTO_DAYS} дней. Выбранный период: {period_days} дней'
+        if start_date < MIN_CRYPTO_DATE:
+            return f'Минимальная дата для криптовалют: {MIN_CRYPTO_DATE.strftime("%Y-%m-%d")}'
+
+    return None
+
+
+def empty_history_error(parser, currency_code: str) -> str:
+    """Текст ошибки для пустой истории, как у /api/currency/history"""
+    error_msg = f'Не удалось получить данные за указанный период для валюты {currency_code}'
+    if currency_code in parser.CRYPTO_CURRENCIES:
+        error_msg += '. Возможно, период слишком большой или CoinGecko API временно недоступен. Попробуйте уменьшить период.'
+    else:
+        error_msg += '. Возможно, указанный период выходит за пределы доступных данных ЦБ РФ.'
+    return error_msg
+
+
+def chart_layout_hint(currency_code: str, is_ohlc: bool = False) -> Dict:
+    """Параметры графика для format=compact: клиент строит trace сам, без фигуры Plotly на сервере"""
+    return {
+        'type': 'candlestick' if is_ohlc else 'scatter',
+        'name': currency_code,
+        'title': f'Курс {currency_code} к рублю',
+        'xaxis_title': 'Дата',
+        'yaxis_title': 'Курс (RUB)',
+        'height': 500
+    }
+
+
+def get_current_rates(parser, currency_type: str) -> Dict:
+    """
+    Текущие курсы для /api/currency/current
+
+    Для type=all фиатные и криптовалютные курсы загружаются параллельно через
+    синхронный парсер - с его кэшем (включая последние известные значения при отказе
+    источника), автоматами защиты, повторами и объединением одинаковых запросов.
+
+    Args:
+        parser: Экземпляр CurrencyParser
+        currency_type: fiat, crypto или all
+
+    Returns:
+        Словарь {код: курс}; для all - {'fiat': {...}, 'crypto': {...}}
+    """
+    if currency_type == 'fiat':
+        return parser.get_all_fiat_rates()
+    if currency_type == 'all':
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            fiat = executor.submit(parser.get_all_fiat_rates)
+            crypto = executor.submit(parser.get_all_crypto_rates)
+            return {'fiat': fiat.result(), 'crypto': crypto.result()}
+    return parser.get_all_crypto_rates()
+
+
+def get_history(parser, currency_code: str, start_date: datetime, end_date: datetime) -> 'RateSeries':
+    """История фиатной валюты или криптовалюты через синхронный парсер"""
+    if currency_code in parser.CRYPTO_CURRENCIES:
+        return parser.get_crypto_rates_history(currency_code, start_date, end_date)
+    return parser.get_fiat_rates_history(currency_code, start_date, end_date)
+
+
+def load_histories(parser, currency_codes: List[str], start_date: datetime,
+                   end_date: datetime) -> Tuple[Dict[str, 'RateSeries'], Dict[str, str]]:
+    """
+    Загружает историю нескольких валют параллельно (через кэш парсера)
+
+    Args:
+        parser: Экземпляр CurrencyParser
+        currency_codes: Коды валют без повторов
+        start_date: Начальная дата
+        end_date: Конечная дата
+
+    Returns:
+        Кортеж ({код: ряд} для загруженных валют, {код: текст ошибки} для остальных)
+    """
+    from rate_series import RateSeries
+
+    histories: Dict[str, RateSeries] = {}
+    errors: Dict[str, str] = {}
+    to_load = []
+
+    for code in currency_codes:
+        error = validate_currency_period(parser, code, start_date, end_date)
+        if error:
+            errors[code] = error
+        else:
+            to_load.append(code)
+
+    if to_load:
+        def load(code: str):
+            try:
+                return code, get_history(parser, code, start_date, end_date), None
+            except Exception as e:
+                return code, RateSeries.empty(code), f'Ошибка при получении данных: {str(e)}'
+
+        with ThreadPoolExecutor(max_workers=min(len(to_load), BATCH_MAX_WORKERS)) as executor:
+            for code, history, error in executor.map(load, to_load):
+                if error:
+                    errors[code] = error
+                elif not history:
+                    errors[code] = empty_history_error(parser, code)
+                else:
+                    histories[code] = history
+
+    return histories, errors
+
+
+def load_history_batch(parser, currency_codes: List[str], start_date: datetime, end_date: datetime,
+                       resolution: str = 'daily') -> Dict:
+    """
+    Загружает историю нескольких валют параллельно и выравнивает ряды по общей оси дат
+
+    Args:
+        parser: Экземпляр CurrencyParser
+        currency_codes: Коды валют
+        start_date: Начальная дата
+        end_date: Конечная дата
+        resolution: Разрешение общей оси (daily или weekly)
+
+    Returns:
+        Словарь {'dates': [...], 'resolution': ..., 'series': {код: {...}}}; для каждой
+        валюты либо success=True и курсы (None там, где данных нет), либо success=False и error
+    """
+    from rate_aggregation import DATE_FORMATS, aggregate_history
+    from rate_series import RateSeries
+
+    codes = list(dict.fromkeys(currency_codes))
+    loaded, errors = load_histories(parser, codes, start_date, end_date)
+    series: Dict[str, Dict] = {code: {'success': False, 'error': error} for code, error in errors.items()}
+    histories = {code: aggregate_history(history, resolution) for code, history in loaded.items()}
+
+    # Общая ось дат - объединение времени точек всех рядов
+    axis = sorted({timestamp for history in histories.values() for timestamp in history.timestamps.tolist()})
+    positions = {timestamp: index for index, timestamp in enumerate(axis)}
+
+    for code, history in histories.items():
+        aligned = [None] * len(axis)
+        for timestamp, rate in zip(history.timestamps.tolist(), history.values.tolist()):
+            aligned[positions[timestamp]] = rate
+        series[code] = {
+            'success': True,
+            'rates': aligned,
+            'min': history.min(),
+            'max': history.max(),
+            'current': history.last()
+        }
+
+    return {
+        'dates': RateSeries('', axis, []).format_dates(DATE_FORMATS[resolution]),
+        'resolution': resolution,
+        'series': {code: series[code] for code in codes}
+    }
+
+
+def parse_dates(dates_str: str) -> List[datetime]:
+    """
+    Разбирает список дат вида 2024-01-10,2024-02-01 (повторы убираются)
+
+    Raises:
+        ValueError: С сообщением для пользователя, если даты заданы неверно
+    """
+    dates = []
+    for date_str in dict.fromkeys(part.strip() for part in dates_str.split(',')):
+        if not date_str:
+            continue
+        try:
+            date_obj = datetime.strptime(date_str, '%Y-%m-%d')
+        except ValueError as e:
+            raise ValueError(f'Неверный формат даты: {str(e)}')
+        # Курсы на завтра ЦБ РФ публикует накануне
+        if date_obj.date() > datetime.now().date() + timedelta(days=1):
+            raise ValueError(f'Курсы на {date_str} ещё не опубликованы')
+        if date_obj < MIN_CBR_DATE:
+            raise ValueError(f'Курсы ЦБ РФ доступны с {MIN_CBR_DATE.strftime("%Y-%m-%d")}')
+        dates.append(date_obj)
+    if not dates:
+        raise ValueError('Не указаны даты')
+    if len(dates) > MAX_SNAPSHOT_DATES:
+        raise ValueError(f'Можно запросить не более {MAX_SNAPSHOT_DATES} дат')
+    return dates
+
+
+def load_snapshots(parser, dates: List[datetime], currency_codes: List[str]) -> Dict[str, Dict]:
+    """
+    Курсы валют ЦБ РФ на несколько дат
+
+    Снимок на дату - один запрос XML_daily.asp со всеми валютами; снимки за прошедшие
+    даты парсер хранит бессрочно. Загрузка идёт параллельно, не больше
+    SNAPSHOT_MAX_WORKERS запросов одновременно.
+
+    Args:
+        parser: Экземпляр CurrencyParser
+        dates: Даты снимков
+        currency_codes: Коды фиатных валют
+
+    Returns:
+        Словарь {YYYY-MM-DD: {...}}; для каждой даты либо success=True, дата публикации
+        и курсы {код: {'value', 'nominal', 'rate'}} (rate - за единицу валюты),
+        либо success=False и error
+    """
+    with ThreadPoolExecutor(max_workers=min(len(dates), SNAPSHOT_MAX_WORKERS)) as executor:
+        snapshots = list(executor.map(parser.get_daily_snapshot, dates))
+
+    result = {}
+    for date_obj, snapshot in zip(dates, snapshots):
+        key = date_obj.strftime('%Y-%m-%d')
+        if not snapshot:
+            result[key] = {'success': False, 'error': f'Не удалось получить курсы ЦБ РФ на {key}'}
+            continue
+        valutes = snapshot['valutes']
+        result[key] = {
+            'success': True,
+            'date': snapshot['date'].strftime('%Y-%m-%d') if snapshot['date'] else key,
+            'rates': {
+                code: {
+                    'value': valutes[code]['value'],
+                    'nominal': valutes[code]['nominal'],
+                    'rate': valutes[code]['value'] / valutes[code]['nominal'],
+                }
+                for code in currency_codes if code in valutes
+            }
+        }
+    return result
+
+
+def snapshots_caching(parser, dates: List[datetime], snapshots: Dict[str, Dict]) -> Tuple[str, Optional[float]]:
+    """
+    Cache-Control и Last-Modified для снимков курсов на даты
+
+    Снимки за прошедшие даты не меняются; если среди дат есть сегодняшняя
+    или завтрашняя - политика как у текущих фиатных курсов. Ответ, в котором
+    хотя бы один снимок не загрузился, не кэшируется.
+
+    Args:
+        parser: Экземпляр CurrencyParser
+        dates: Даты снимков
+        snapshots: Результат load_snapshots() для тех же дат
+    """
+    if not all(item['success'] for item in snapshots.values()):
+        return NO_STORE, None
+    today = datetime.now().date()
+    last_modified = max(parser.cbr_publication_timestamp(date_obj) for date_obj in dates)
+    if all(date_obj.date() < today for date_obj in dates):
+        return cache_control(86400, 30 * 86400, immutable=True), last_modified
+    return _fiat_rates_policy(parser), last_modified
+
+
+def _fiat_rates_policy(parser) -> str:
+    """Cache-Control текущих курсов ЦБ РФ: в CDN до ближайшей публикации"""
+    until_publication = parser.seconds_until_cbr_publication()
+    return cache_control(min(300, until_publication), until_publication, stale_while_revalidate=600)
+
+
+def current_rates_caching(parser, currency_type: str, rates: Dict) -> Tuple[str, Optional[float]]:
+    """
+    Cache-Control и Last-Modified для /api/currency/current
+
+    Фиатные курсы кэшируются в CDN до ближайшей публикации ЦБ РФ,
+    курсы CoinGecko - на время жизни кэша парсера. Пустые курсы (источник
+    недоступен и в кэше парсера ничего нет) не кэшируются.
+
+    Args:
+        parser: Экземпляр CurrencyParser
+        currency_type: fiat, crypto или all
+        rates: Курсы из get_current_rates() для того же currency_type
+    """
+    parts = rates.values() if currency_type == 'all' else [rates]
+    if not all(parts):
+        return NO_STORE, None
+    return _current_rates_policy(parser, currency_type), parser.get_last_modified(currency_type)
+
+
+def cross_rates_caching(parser, currency_type: str, matrix,
+                        rates: Dict[str, Optional[float]]) -> Tuple[str, Optional[float]]:
+    """
+    Cache-Control и Last-Modified для /api/currency/cross
+
+    Политика - как у текущих курсов того же типа. Наличие курсов и время их изменения
+    берутся из матрицы, по которой посчитан ответ, без повторного обращения к курсам.
+    Ответ не кэшируется, если курс какой-либо пары или курсы нужного источника недоступны.
+
+    Args:
+        parser: Экземпляр CurrencyParser
+        currency_type: fiat (в ответе только фиатные валюты) или all
+        matrix: CrossRateMatrix, по которой посчитаны курсы
+        rates: Курсы пар из CrossRateEngine.get_rates()
+    """
+    sources = ('fiat',) if currency_type == 'fiat' else ('fiat', 'crypto')
+    updated = [matrix.updated_at.get(source) for source in sources]
+    if None in updated or None in rates.values():
+        return NO_STORE, None
+    return _current_rates_policy(parser, currency_type), max(updated)
+
+
+def _current_rates_policy(parser, currency_type: str) -> str:
+    """Cache-Control текущих курсов: фиатных - до публикации ЦБ РФ, иначе - по кэшу курсов CoinGecko"""
+    if currency_type == 'fiat':
+        return _fiat_rates_policy(parser)
+    return cache_control(parser.CRYPTO_PRICES_TTL // 2, parser.CRYPTO_PRICES_TTL,
+                         stale_while_revalidate=parser.CRYPTO_PRICES_TTL)
+
+
+def history_caching(parser, currency_codes: List[str], start_date: datetime, end_date: datetime,
+                    last_dates: List[datetime], failed: bool = False) -> Tuple[str, Optional[float]]:
+    """
+    Cache-Control и Last-Modified для ответов с историей курсов
+
+    Неполные ответы не кэшируются: если по части валют данных нет или у ряда ЦБ РФ
+    остались незагруженные диапазоны (CurrencyParser.get_history_gaps), иначе CDN
+    закрепил бы неполные данные до следующей публикации или навсегда для прошлого периода.
+
+    Args:
+        parser: Экземпляр CurrencyParser
+        currency_codes: Коды валют в ответе
+        start_date: Начальная дата запрошенного периода
+        end_date: Конечная дата запрошенного периода
+        last_dates: Даты последних точек рядов
+        failed: По части валют данные получить не удалось
+    """
+    if failed or not currency_codes or any(
+            parser.get_history_gaps(code, start_date, end_date)
+            for code in currency_codes if code in parser.FIAT_CURRENCIES):
+        return NO_STORE, None
+
+    has_crypto = any(code in parser.CRYPTO_CURRENCIES for code in currency_codes)
+
+    last_modified = None
+    if last_dates:
+        last_modified = max(
+            date_obj.timestamp() if code in parser.CRYPTO_CURRENCIES
+            else parser.cbr_publication_timestamp(date_obj)
+            for code, date_obj in zip(currency_codes, last_dates)
+        )
+
+    # Закрытый период в прошлом больше не изменится
+    if end_date.date() < datetime.now().date() - timedelta(days=1):
+        return cache_control(86400, 30 * 86400, immutable=True), last_modified
+
+    if has_crypto:
+        policy = cache_control(60, parser.CRYPTO_HISTORY_TTL, stale_while_revalidate=parser.CRYPTO_HISTORY_TTL)
+    else:
+        policy = cache_control(600, parser.seconds_until_cbr_publication(), stale_while_revalidate=3600)
+    return policy, last_modified
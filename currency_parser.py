@@ -7,13 +7,36 @@
 - Криптовалюты: CoinGecko API
 """
 
+import json
 import requests
-from requests.exceptions import RequestException
+from requests.exceptions import HTTPError, RequestException
 import xml.etree.ElementTree as ET
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+import threading
 import time
 
+from circuit_breaker import CircuitBreaker, RetryPolicy, parse_retry_after
+from history_store import HistoryStore
+from rate_cache import PartialResult, TTLCache
+from rate_series import RateSeries
+from single_flight import SingleFlight
+
+
+class IncompleteHistoryError(Exception):
+    """История загружена не полностью: часть диапазонов не удалось получить из источника"""
+    
+    def __init__(self, series: RateSeries, gaps: List[Tuple[date, date]]):
+        """
+        Args:
+            series: Ряд за период без незагруженных диапазонов
+            gaps: Незагруженные диапазоны (начало, конец) включительно
+        """
+        super().__init__(', '.join(f'{gap_start} - {gap_end}' for gap_start, gap_end in gaps))
+        self.series = series
+        self.gaps = gaps
+
 
 class CurrencyParser:
     """Класс для парсинга курсов валют"""
@@ -53,11 +76,262 @@ class CurrencyParser:
         'LTC': 'litecoin',
     }
     
-    def __init__(self):
+    # ЦБ РФ публикует курсы на следующий день около 15:30 по Москве
+    CBR_TIMEZONE = timezone(timedelta(hours=3))
+    CBR_PUBLICATION_TIME = (15, 30)
+    
+    # Таймаут установки соединения (секунды); таймаут чтения задаётся в запросе
+    CONNECT_TIMEOUT = 3.05
+    
+    # Размер части ответа при потоковом разборе XML (байты)
+    STREAM_CHUNK_SIZE = 16 * 1024
+    
+    # Время жизни кэша по источникам (секунды)
+    CRYPTO_PRICES_TTL = 60
+    CRYPTO_HISTORY_TTL = 300
+    # Сколько секунд после истечения TTL можно отдавать устаревшие данные
+    CBR_STALE_TTL = 3600
+    CRYPTO_STALE_TTL = 300
+    # Неполная история (часть диапазонов не загрузилась) кэшируется ненадолго
+    PARTIAL_HISTORY_TTL = 60
+    
+    # Окно запроса истории CoinGecko при выгрузке: до 90 дней CoinGecko отдаёт почасовые точки
+    CRYPTO_EXPORT_WINDOW = timedelta(days=30)
+    
+    # Сколько снимков XML_daily.asp за прошедшие даты держать в памяти
+    PAST_SNAPSHOTS_SIZE = 1024
+    
+    def __init__(self, cache_size: int = 512, history_store: Optional[HistoryStore] = None):
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
+        # Снимки XML_daily.asp за прошедшие даты: {date: snapshot}, давно не запрошенные вытесняются
+        self._daily_snapshots: OrderedDict = OrderedDict()
+        self._snapshots_lock = threading.Lock()
+        # Кэш текущих курсов и истории с TTL по источникам
+        self.cache = TTLCache(max_size=cache_size)
+        # Объединение одинаковых одновременных запросов к источникам
+        self.single_flight = SingleFlight()
+        # Автоматы защиты источников и политика повторов
+        self.breakers = {
+            'cbr': CircuitBreaker('cbr'),
+            'coingecko': CircuitBreaker('coingecko'),
+        }
+        self.retry_policy = RetryPolicy()
+        # Локальное хранилище истории фиатных курсов (SQLite)
+        self.history_store = history_store
+        if self.history_store is None:
+            try:
+                self.history_store = HistoryStore()
+            except Exception as e:
+                print(f"Хранилище истории недоступно, история загружается напрямую: {e}")
+    
+    @classmethod
+    def seconds_until_cbr_publication(cls, now: Optional[datetime] = None) -> float:
+        """Секунды до ближайшей публикации курсов ЦБ РФ (не меньше минуты)"""
+        now = now or datetime.now(cls.CBR_TIMEZONE)
+        hour, minute = cls.CBR_PUBLICATION_TIME
+        publication = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if publication <= now:
+            publication += timedelta(days=1)
+        return max((publication - now).total_seconds(), 60.0)
+    
+    def _get_content(self, url: str, params: Optional[Dict] = None, timeout: float = 10) -> bytes:
+        """
+        GET-запрос к источнику с объединением одинаковых одновременных запросов
+        
+        Все потоки, запросившие один и тот же URL с теми же параметрами,
+        пока первый запрос не завершился, получают его результат.
+        """
+        key = (url, tuple(sorted((params or {}).items())))
+        
+        def fetch() -> bytes:
+            return self._request(url, params=params, timeout=timeout).content
+        
+        return self.single_flight.do(key, fetch)
+    
+    def _upstream_for(self, url: str) -> str:
+        """Имя источника по URL запроса"""
+        return 'coingecko' if url.startswith(self.COINGECKO_API) else 'cbr'
+    
+    def _request(self, url: str, params: Optional[Dict] = None, timeout: float = 10,
+                 stream: bool = False) -> requests.Response:
+        """
+        GET-запрос через автомат защиты источника с ограниченными повторами
+        
+        Сетевые ошибки, 429 и 5xx повторяются с jitter-задержкой (с учётом Retry-After).
+        Запрос, не удавшийся после всех повторов, - один отказ источника. После серии
+        отказов автомат размыкается, и запросы сразу завершаются CircuitOpenError,
+        пока источник не восстановится.
+        
+        Raises:
+            CircuitOpenError: Источник временно отключён
+            RequestException: Ошибка запроса после всех повторов
+        """
+        breaker = self.breakers[self._upstream_for(url)]
+        breaker.before_request()
+        self.retry_policy.on_request()
+        recorded = False
+        attempt = 0
+        
+        try:
+            while True:
+                attempt += 1
+                retry_after = None
+                try:
+                    response = self.session.get(url, params=params, stream=stream,
+                                                timeout=(self.CONNECT_TIMEOUT, timeout))
+                except RequestException as e:
+                    error = e
+                else:
+                    if response.status_code != 429 and response.status_code < 500:
+                        recorded = True
+                        breaker.record_success()
+                        response.raise_for_status()
+                        return response
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    error = HTTPError(f"{response.status_code} от {breaker.name}: {url}", response=response)
+                    response.close()
+                
+                delay = self.retry_policy.next_delay(attempt, retry_after)
+                if delay is None:
+                    recorded = True
+                    breaker.record_failure(retry_after)
+                    raise error
+                time.sleep(delay)
+        finally:
+            if not recorded:
+                # Непредвиденное исключение: пробный запрос half-open не должен зависнуть
+                breaker.release()
+    
+    def _get_json(self, url: str, params: Optional[Dict] = None, timeout: float = 10):
+        """GET-запрос к источнику, возвращает разобранный JSON"""
+        return json.loads(self._get_content(url, params=params, timeout=timeout))
+    
+    def get_stats(self) -> Dict[str, Dict]:
+        """Счётчики кэша, объединения запросов и состояние источников для мониторинга"""
+        return {
+            'cache': self.cache.stats(),
+            'single_flight': self.single_flight.stats(),
+            'upstreams': self.get_upstream_state(),
+            'retry_budget': self.retry_policy.budget(),
+            'past_snapshots': {'size': len(self._daily_snapshots), 'max_size': self.PAST_SNAPSHOTS_SIZE},
+        }
+    
+    @classmethod
+    def cbr_publication_timestamp(cls, rates_date: datetime) -> float:
+        """
+        Время публикации курсов ЦБ РФ на дату (unix timestamp)
+        
+        Курсы на дату устанавливаются накануне, около 15:30 по Москве.
+        Результат не позже текущего момента.
+        """
+        hour, minute = cls.CBR_PUBLICATION_TIME
+        published = datetime.combine(rates_date.date() - timedelta(days=1), datetime.min.time())
+        published = published.replace(hour=hour, minute=minute, tzinfo=cls.CBR_TIMEZONE)
+        return min(published.timestamp(), time.time())
+    
+    def get_last_modified(self, currency_type: str) -> Optional[float]:
+        """
+        Время последнего изменения текущих курсов (unix timestamp)
+        
+        Args:
+            currency_type: fiat, crypto или all
+        """
+        timestamps = []
+        if currency_type in ('fiat', 'all'):
+            snapshot = self.get_daily_snapshot()
+            if snapshot and snapshot['date']:
+                timestamps.append(self.cbr_publication_timestamp(snapshot['date']))
+        if currency_type in ('crypto', 'all'):
+            stored_at = self.cache.stored_at(('crypto_prices',))
+            if stored_at:
+                timestamps.append(stored_at)
+        return max(timestamps) if timestamps else None
+    
+    def get_upstream_state(self) -> Dict[str, Dict]:
+        """Состояние автоматов защиты источников (closed, open, half_open)"""
+        return {name: breaker.stats() for name, breaker in self.breakers.items()}
+    
+    def get_daily_snapshot(self, date: Optional[datetime] = None) -> Optional[Dict]:
+        """
+        Получает все курсы ЦБ РФ на дату одним запросом XML_daily.asp
+        
+        Документ разбирается один раз и индексируется по буквенному коду валюты.
+        Снимки за прошедшие даты не меняются, поэтому кэшируются без срока жизни
+        (вытесняются только давно не запрошенные сверх PAST_SNAPSHOTS_SIZE).
+        
+        Args:
+            date: Дата снимка (если None - текущая дата)
+        
+        Returns:
+            Словарь {'date': дата публикации, 'valutes': {CharCode: {...}}} или None
+        """
+        if date is None:
+            date = datetime.now()
+        
+        day = date.date()
+        is_past = day < datetime.now().date()
+        
+        if not is_past:
+            return self.cache.get_or_load(
+                ('cbr_daily', day),
+                lambda: self._fetch_daily_snapshot(date),
+                ttl=self.seconds_until_cbr_publication(),
+                stale_ttl=self.CBR_STALE_TTL
+            )
+        
+        with self._snapshots_lock:
+            snapshot = self._daily_snapshots.get(day)
+            if snapshot is not None:
+                self._daily_snapshots.move_to_end(day)
+        if snapshot is not None:
+            return snapshot
+        
+        snapshot = self._fetch_daily_snapshot(date)
+        if snapshot:
+            with self._snapshots_lock:
+                self._daily_snapshots[day] = snapshot
+                while len(self._daily_snapshots) > self.PAST_SNAPSHOTS_SIZE:
+                    self._daily_snapshots.popitem(last=False)
+        
+        return snapshot
+    
+    def _fetch_daily_snapshot(self, date: datetime) -> Optional[Dict]:
+        """Загружает и разбирает XML_daily.asp на дату"""
+        try:
+            url = f"{self.CBR_API_DAILY}?date_req={date.strftime('%d/%m/%Y')}"
+            snapshot = self._parse_daily_snapshot(self._get_content(url))
+            return snapshot if snapshot['valutes'] else None
+        except Exception as e:
+            print(f"Ошибка при получении курсов ЦБ РФ на {date.date()}: {e}")
+            return None
+    
+    @staticmethod
+    def _parse_daily_snapshot(content: bytes) -> Dict:
+        """Разбирает документ XML_daily.asp в индекс {CharCode: запись}"""
+        root = ET.fromstring(content)
+        
+        date_attr = root.get('Date')
+        published = datetime.strptime(date_attr, '%d.%m.%Y') if date_attr else None
+        
+        valutes = {}
+        for valute in root.findall('Valute'):
+            char_code = valute.findtext('CharCode')
+            value_str = valute.findtext('Value')
+            nominal_str = valute.findtext('Nominal')
+            # Курс без номинала нельзя пересчитать за единицу валюты
+            if not char_code or not value_str or not nominal_str:
+                continue
+            valutes[char_code] = {
+                'id': valute.get('ID'),
+                'nominal': int(nominal_str),
+                'value': float(value_str.replace(',', '.')),
+                'name': valute.findtext('Name'),
+            }
+        
+        return {'date': published, 'valutes': valutes}
     
     def get_fiat_rate(self, currency_code: str, date: Optional[datetime] = None) -> Optional[float]:
         """
@@ -73,43 +347,14 @@ class CurrencyParser:
         if currency_code not in self.FIAT_CURRENCIES:
             return None
         
-        if date is None:
-            date = datetime.now()
-        
-        try:
-            if date.date() == datetime.now().date():
-                # Текущий курс
-                url = f"{self.CBR_API_DAILY}?date_req={date.strftime('%d/%m/%Y')}"
-            else:
-                # Исторический курс
-                valute_id = self.FIAT_CURRENCIES[currency_code]
-                date_start = date.strftime('%d/%m/%Y')
-                url = f"{self.CBR_API_HISTORY}?date_req1={date_start}&date_req2={date_start}&VAL_NM_RQ={valute_id}"
-            
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            
-            root = ET.fromstring(response.content)
-            
-            # Поиск валюты
-            for valute in root.findall('Valute'):
-                if valute.get('ID') == self.FIAT_CURRENCIES[currency_code]:
-                    value_str = valute.find('Value').text.replace(',', '.')
-                    return float(value_str)
-            
-            # Если не нашли в списке, пробуем по коду
-            for valute in root.findall('Valute'):
-                char_code = valute.find('CharCode').text
-                if char_code == currency_code:
-                    value_str = valute.find('Value').text.replace(',', '.')
-                    return float(value_str)
-            
-            return None
-        except Exception as e:
-            print(f"Ошибка при получении курса {currency_code}: {e}")
+        snapshot = self.get_daily_snapshot(date)
+        if not snapshot:
             return None
+        
+        valute = snapshot['valutes'].get(currency_code)
+        return valute['value'] if valute else None
     
-    def get_fiat_rates_history(self, currency_code: str, start_date: datetime, end_date: datetime) -> List[Dict]:
+    def get_fiat_rates_history(self, currency_code: str, start_date: datetime, end_date: datetime) -> RateSeries:
         """
         Получает историю курсов фиатной валюты
         
@@ -119,38 +364,292 @@ class CurrencyParser:
             end_date: Конечная дата
         
         Returns:
-            Список словарей с датами и курсами
+            Ряд курсов (пустой, если данных нет)
         """
         if currency_code not in self.FIAT_CURRENCIES:
-            return []
+            return RateSeries.empty(currency_code)
         
-        valute_id = self.FIAT_CURRENCIES[currency_code]
-        history = []
+        period = (currency_code, start_date.date(), end_date.date())
         
-        try:
-            date_start = start_date.strftime('%d/%m/%Y')
-            date_end = end_date.strftime('%d/%m/%Y')
-            url = f"{self.CBR_API_HISTORY}?date_req1={date_start}&date_req2={date_end}&VAL_NM_RQ={valute_id}"
-            
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            
-            root = ET.fromstring(response.content)
+        def load() -> RateSeries:
+            # Выполняется и при обычной, и при фоновой (stale-while-revalidate) загрузке
+            try:
+                series = self._load_fiat_rates_history(currency_code, start_date, end_date)
+            except IncompleteHistoryError as e:
+                # Неполный ряд не должен жить в кэше до следующей публикации ЦБ РФ
+                self.cache.set(('fiat_history_gaps', *period), e.gaps, ttl=self.PARTIAL_HISTORY_TTL)
+                raise PartialResult(e.series, self.PARTIAL_HISTORY_TTL)
+            self.cache.invalidate(('fiat_history_gaps', *period))
+            return series
+        
+        return self.cache.get_or_load(
+            ('fiat_history', *period),
+            load,
+            ttl=self.seconds_until_cbr_publication(),
+            stale_ttl=self.CBR_STALE_TTL
+        )
+    
+    def is_fiat_history_fresh(self, currency_code: str, start_date: datetime, end_date: datetime) -> bool:
+        """
+        Лежит ли в кэше свежая и полная история фиатной валюты за период
+        
+        False, если история устарела (отдаётся, пока идёт фоновое обновление)
+        или загружена не полностью: производные от неё результаты нельзя кэшировать надолго.
+        """
+        period = (currency_code, start_date.date(), end_date.date())
+        return (self.cache.get(('fiat_history', *period)) is not None
+                and not self.cache.get(('fiat_history_gaps', *period)))
+    
+    def get_history_gaps(self, currency_code: str, start_date: datetime,
+                         end_date: datetime) -> List[Tuple[date, date]]:
+        """
+        Диапазоны, которые не удалось загрузить при последней загрузке истории фиатной валюты
+        
+        Returns:
+            Список интервалов (начало, конец) включительно; пустой, если история полная
+        """
+        return self.cache.get(('fiat_history_gaps', currency_code, start_date.date(), end_date.date())) or []
+    
+    def _load_fiat_rates_history(self, currency_code: str, start_date: datetime, end_date: datetime) -> RateSeries:
+        """
+        Читает историю из локального хранилища, догружая только недостающие диапазоны
+        
+        Прошедшие курсы ЦБ РФ не меняются, поэтому диапазоны до вчерашнего дня
+        отмечаются как загруженные и больше не запрашиваются. Текущий день
+        догружается повторно, когда истекает запись в кэше.
+        
+        Raises:
+            IncompleteHistoryError: Часть диапазонов не загрузилась; в исключении ряд
+                без них и сами диапазоны
+        """
+        if self.history_store is None:
+            try:
+                return self._fetch_fiat_rates_history(currency_code, start_date, end_date)
+            except Exception as e:
+                print(f"Ошибка при получении истории курса {currency_code}: {e}")
+                return RateSeries.empty(currency_code)
+        
+        start, end = start_date.date(), end_date.date()
+        last_final_day = datetime.now().date() - timedelta(days=1)
+        failed = []
+        
+        for gap_start, gap_end in self.history_store.missing_ranges(currency_code, start, end):
+            try:
+                series = self._fetch_fiat_rates_history(
+                    currency_code,
+                    datetime.combine(gap_start, datetime.min.time()),
+                    datetime.combine(gap_end, datetime.min.time())
+                )
+            except Exception as e:
+                print(f"Ошибка при получении истории курса {currency_code} за {gap_start} - {gap_end}: {e}")
+                failed.append((gap_start, gap_end))
+                continue
+            self.history_store.save(currency_code, series, covered=(gap_start, min(gap_end, last_final_day)))
+        
+        series = self.history_store.read(currency_code, start, end)
+        if failed:
+            raise IncompleteHistoryError(series, failed)
+        return series
+    
+    def _fetch_fiat_rates_history(self, currency_code: str, start_date: datetime, end_date: datetime) -> RateSeries:
+        """Загружает историю курса фиатной валюты из XML_dynamic.asp (ошибки пробрасываются)"""
+        def fetch() -> RateSeries:
+            return RateSeries.from_pairs(self.iter_fiat_rates_history(currency_code, start_date, end_date),
+                                         currency_code, columns=('nominal',))
+        
+        return self.single_flight.do(
+            ('fiat_history', currency_code, start_date.date(), end_date.date()),
+            fetch
+        )
+    
+    def iter_fiat_rates_history(self, currency_code: str, start_date: datetime,
+                                end_date: datetime) -> Iterator[Tuple[datetime, float, int]]:
+        """
+        Потоково загружает историю курса фиатной валюты из XML_dynamic.asp
+        
+        Тело ответа подаётся в инкрементальный XML-парсер по частям, обработанные
+        элементы сразу освобождаются. ЦБ РФ отдаёт записи в порядке дат,
+        поэтому сортировка не нужна. Ошибки сети и разбора пробрасываются.
+        
+        Args:
+            currency_code: Код валюты
+            start_date: Начальная дата
+            end_date: Конечная дата
+        
+        Yields:
+            Кортежи (дата, курс, номинал); курс дан за номинал единиц валюты
+        """
+        if currency_code not in self.FIAT_CURRENCIES:
+            return
+        
+        url = self._fiat_history_url(currency_code, start_date, end_date)
+        with self._request(url, stream=True) as response:
+            yield from self._iter_fiat_history_records(response.iter_content(chunk_size=self.STREAM_CHUNK_SIZE))
+    
+    def iter_rates_history(self, currency_code: str, start_date: datetime,
+                           end_date: datetime) -> Iterator[Tuple[datetime, float]]:
+        """
+        Потоково отдаёт историю курса валюты для выгрузки, не собирая ряд в памяти
+        
+        Фиатные курсы: загруженные диапазоны читаются из локального хранилища порциями,
+        недостающие - потоково из XML_dynamic.asp (в хранилище не сохраняются).
+        Криптовалюты: см. iter_crypto_rates_history().
+        Ошибки сети и разбора пробрасываются.
+        
+        Yields:
+            Кортежи (дата, курс) в порядке дат; для криптовалют - время точки в UTC
+        """
+        if currency_code in self.CRYPTO_CURRENCIES:
+            yield from self.iter_crypto_rates_history(currency_code, start_date, end_date)
+            return
+        if currency_code not in self.FIAT_CURRENCIES:
+            return
+        if self.history_store is None:
+            for date_obj, rate, _ in self.iter_fiat_rates_history(currency_code, start_date, end_date):
+                yield date_obj, rate
+            return
+        
+        start, end = start_date.date(), end_date.date()
+        cursor = start
+        for gap_start, gap_end in self.history_store.missing_ranges(currency_code, start, end):
+            if cursor < gap_start:
+                yield from self.history_store.iter_rows(currency_code, cursor, gap_start - timedelta(days=1))
+            for date_obj, rate, _ in self.iter_fiat_rates_history(
+                currency_code,
+                datetime.combine(gap_start, datetime.min.time()),
+                datetime.combine(gap_end, datetime.min.time())
+            ):
+                yield date_obj, rate
+            cursor = gap_end + timedelta(days=1)
+        if cursor <= end:
+            yield from self.history_store.iter_rows(currency_code, cursor, end)
+    
+    def iter_crypto_rates_history(self, currency_code: str, start_date: datetime,
+                                  end_date: datetime) -> Iterator[Tuple[datetime, float]]:
+        """
+        Потоково отдаёт почасовую историю курса криптовалюты для выгрузки
+        
+        Загруженные дни (UTC) читаются из локального хранилища порциями, недостающие
+        запрашиваются у CoinGecko окнами по CRYPTO_EXPORT_WINDOW: в памяти не больше
+        одного окна. Завершённые дни окна сохраняются в хранилище и больше не запрашиваются.
+        Ошибки сети и разбора пробрасываются.
+        
+        Yields:
+            Кортежи (время точки в UTC, курс) в порядке времени
+        """
+        if currency_code not in self.CRYPTO_CURRENCIES:
+            return
+        
+        start = start_date.astimezone(timezone.utc)
+        end = end_date.astimezone(timezone.utc)
+        if self.history_store is None:
+            yield from self._iter_crypto_days(currency_code, start.date(), end.date(), start, end)
+            return
+        
+        cursor = start.date()
+        for gap_start, gap_end in self.history_store.missing_ranges(currency_code, start.date(), end.date()):
+            if cursor < gap_start:
+                yield from self.history_store.iter_points(
+                    currency_code, max(start, self._utc_day_start(cursor)),
+                    self._utc_day_start(gap_start) - timedelta(seconds=1)
+                )
+            yield from self._iter_crypto_days(currency_code, gap_start, gap_end, start, end)
+            cursor = gap_end + timedelta(days=1)
+        if cursor <= end.date():
+            yield from self.history_store.iter_points(currency_code, max(start, self._utc_day_start(cursor)), end)
+    
+    @staticmethod
+    def _utc_day_start(day: date) -> datetime:
+        """Начало дня в UTC"""
+        return datetime.combine(day, datetime.min.time(), tzinfo=timezone.utc)
+    
+    def _iter_crypto_days(self, currency_code: str, first_day: date, last_day: date,
+                          start: datetime, end: datetime) -> Iterator[Tuple[datetime, float]]:
+        """
+        Загружает дни [first_day, last_day] (UTC) у CoinGecko окнами и отдаёт точки внутри [start, end]
+        
+        Завершённые дни окна (до текущего дня UTC) сохраняются в хранилище, если оно есть.
+        """
+        now = datetime.now(timezone.utc)
+        today_start = self._utc_day_start(now.date())
+        window_start = self._utc_day_start(first_day)
+        stop = min(self._utc_day_start(last_day) + timedelta(days=1), now)
+        
+        while window_start < stop:
+            window_end = min(window_start + self.CRYPTO_EXPORT_WINDOW, stop)
+            # Запрос длиннее суток: иначе для последних суток CoinGecko отдаёт 5-минутные точки
+            request_start = min(window_start, window_end - timedelta(days=2))
+            url, params = self._crypto_history_request(currency_code, request_start, window_end)
+            series = self._parse_crypto_history(self._get_json(url, params=params, timeout=30),
+                                                currency_code, window_start, window_end)
+            # Точка ровно на границе окна относится к следующему окну
+            series = series[:len(series) - 1] if series and series.timestamps[-1] >= window_end.timestamp() else series
             
-            for record in root.findall('Record'):
-                date_str = record.get('Date')
-                value_str = record.find('Value').text.replace(',', '.')
-                date_obj = datetime.strptime(date_str, '%d.%m.%Y')
-                history.append({
-                    'date': date_obj,
-                    'rate': float(value_str),
-                    'currency': currency_code
-                })
+            finished_end = min(window_end, today_start)
+            if self.history_store is not None and series and finished_end > window_start:
+                finished = series.slice(window_start, finished_end - timedelta(microseconds=1))
+                self.history_store.save(
+                    currency_code, finished, with_time=True,
+                    covered=(window_start.date(), (finished_end - timedelta(days=1)).date())
+                )
             
-            return sorted(history, key=lambda x: x['date'])
-        except Exception as e:
-            print(f"Ошибка при получении истории курса {currency_code}: {e}")
-            return []
+            low, high = start.timestamp(), end.timestamp()
+            for timestamp, rate in zip(series.timestamps.tolist(), series.values.tolist()):
+                if low <= timestamp <= high:
+                    yield datetime.fromtimestamp(timestamp, timezone.utc), rate
+            window_start = window_end
+    
+    def _fiat_history_url(self, currency_code: str, start_date: datetime, end_date: datetime) -> str:
+        """URL запроса XML_dynamic.asp для валюты и периода"""
+        valute_id = self.FIAT_CURRENCIES[currency_code]
+        date_start = start_date.strftime('%d/%m/%Y')
+        date_end = end_date.strftime('%d/%m/%Y')
+        return f"{self.CBR_API_HISTORY}?date_req1={date_start}&date_req2={date_end}&VAL_NM_RQ={valute_id}"
+    
+    @classmethod
+    def _parse_fiat_history(cls, content: bytes, currency_code: str) -> RateSeries:
+        """Разбирает документ XML_dynamic.asp в ряд курсов с колонкой nominal"""
+        return RateSeries.from_pairs(cls._iter_fiat_history_records([content]), currency_code, columns=('nominal',))
+    
+    @staticmethod
+    def _iter_fiat_history_records(chunks: Iterable[bytes]) -> Iterator[Tuple[datetime, float, int]]:
+        """
+        Инкрементально разбирает части документа XML_dynamic.asp в кортежи (дата, курс, номинал)
+        
+        Номинал берётся из каждой записи: ЦБ РФ меняет его (например, после деноминации),
+        и номинал текущего снимка к старым курсам неприменим.
+        
+        Raises:
+            ValueError: В записи нет курса или номинала
+        """
+        pull_parser = ET.XMLPullParser(events=('start', 'end'))
+        root = None
+        
+        def records():
+            nonlocal root
+            for event, element in pull_parser.read_events():
+                if event == 'start':
+                    if root is None:
+                        root = element
+                    continue
+                if element.tag != 'Record':
+                    continue
+                date_str = element.get('Date')
+                value_str = element.findtext('Value')
+                nominal_str = element.findtext('Nominal')
+                if not value_str or not nominal_str:
+                    raise ValueError(f"В записи XML_dynamic.asp за {date_str} нет курса или номинала")
+                yield (datetime.strptime(date_str, '%d.%m.%Y'), float(value_str.replace(',', '.')),
+                       int(nominal_str))
+                # Освобождаем обработанную запись, чтобы дерево не росло
+                element.clear()
+                root.remove(element)
+        
+        for chunk in chunks:
+            pull_parser.feed(chunk)
+            yield from records()
+        pull_parser.close()
+        yield from records()
     
     def get_crypto_rate(self, currency_code: str) -> Optional[float]:
         """
@@ -165,27 +664,9 @@ class CurrencyParser:
         if currency_code not in self.CRYPTO_CURRENCIES:
             return None
         
-        try:
-            coin_id = self.CRYPTO_CURRENCIES[currency_code]
-            url = f"{self.COINGECKO_API}/simple/price"
-            params = {
-                'ids': coin_id,
-                'vs_currencies': 'rub'
-            }
-            
-            response = self.session.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            if coin_id in data and 'rub' in data[coin_id]:
-                return data[coin_id]['rub']
-            
-            return None
-        except Exception as e:
-            print(f"Ошибка при получении курса криптовалюты {currency_code}: {e}")
-            return None
+        return self.get_all_crypto_rates().get(currency_code)
     
-    def get_crypto_rates_history(self, currency_code: str, start_date: datetime, end_date: datetime) -> List[Dict]:
+    def get_crypto_rates_history(self, currency_code: str, start_date: datetime, end_date: datetime) -> RateSeries:
         """
         Получает историю курсов криптовалюты
         
@@ -195,89 +676,142 @@ class CurrencyParser:
             end_date: Конечная дата
         
         Returns:
-            Список словарей с датами и курсами
+            Ряд курсов (пустой, если данных нет)
         """
         if currency_code not in self.CRYPTO_CURRENCIES:
-            return []
-        
-        coin_id = self.CRYPTO_CURRENCIES[currency_code]
-        history = []
+            return RateSeries.empty(currency_code)
         
+        # Границы округляются до 5 минут, чтобы соседние запросы попадали в один ключ
+        bucket = self.CRYPTO_HISTORY_TTL
+        return self.cache.get_or_load(
+            ('crypto_history', currency_code,
+             int(start_date.timestamp()) // bucket, int(end_date.timestamp()) // bucket),
+            lambda: self._fetch_crypto_rates_history(currency_code, start_date, end_date),
+            ttl=self.CRYPTO_HISTORY_TTL,
+            stale_ttl=self.CRYPTO_STALE_TTL
+        )
+    
+    def _fetch_crypto_rates_history(self, currency_code: str, start_date: datetime, end_date: datetime) -> RateSeries:
+        """Загружает историю курса криптовалюты из CoinGecko market_chart/range"""
         try:
-            # CoinGecko API использует timestamp в секундах
-            start_timestamp = int(start_date.timestamp())
-            end_timestamp = int(end_date.timestamp())
-            
-            url = f"{self.COINGECKO_API}/coins/{coin_id}/market_chart/range"
-            params = {
-                'vs_currency': 'rub',
-                'from': start_timestamp,
-                'to': end_timestamp
-            }
-            
-            response = self.session.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            data = response.json()
+            url, params = self._crypto_history_request(currency_code, start_date, end_date)
             
-            if 'prices' in data and len(data['prices']) > 0:
-                for price_data in data['prices']:
-                    timestamp = price_data[0] / 1000  # Конвертируем из миллисекунд
-                    date_obj = datetime.fromtimestamp(timestamp)
-                    rate = price_data[1]
-                    
-                    # Фильтруем только даты в нужном диапазоне
-                    if start_date <= date_obj <= end_date:
-                        history.append({
-                            'date': date_obj,
-                            'rate': rate,
-                            'currency': currency_code
-                        })
-            else:
-                # Если данных нет, возможно API вернул ошибку
-                if 'error' in data:
-                    print(f"CoinGecko API ошибка: {data['error']}")
-                else:
-                    print(f"CoinGecko API вернул пустые данные для {currency_code}")
+            data = self._get_json(url, params=params, timeout=30)
             
-            return sorted(history, key=lambda x: x['date'])
+            return self._parse_crypto_history(data, currency_code, start_date, end_date)
         except RequestException as e:
             print(f"Ошибка сети при получении истории курса криптовалюты {currency_code}: {e}")
-            return []
+            return RateSeries.empty(currency_code)
         except Exception as e:
             print(f"Ошибка при получении истории курса криптовалюты {currency_code}: {e}")
-            return []
+            return RateSeries.empty(currency_code)
+    
+    def _crypto_history_request(self, currency_code: str, start_date: datetime, end_date: datetime):
+        """URL и параметры запроса CoinGecko market_chart/range"""
+        coin_id = self.CRYPTO_CURRENCIES[currency_code]
+        url = f"{self.COINGECKO_API}/coins/{coin_id}/market_chart/range"
+        # CoinGecko API использует timestamp в секундах
+        params = {
+            'vs_currency': 'rub',
+            'from': int(start_date.timestamp()),
+            'to': int(end_date.timestamp())
+        }
+        return url, params
+    
+    @staticmethod
+    def _parse_crypto_history(data: Dict, currency_code: str, start_date: datetime, end_date: datetime) -> RateSeries:
+        """Разбирает ответ market_chart/range в ряд курсов"""
+        points = []
+        
+        if 'prices' in data and len(data['prices']) > 0:
+            # Фильтруем только даты в нужном диапазоне, сравнивая timestamp без создания datetime
+            low, high = start_date.timestamp(), end_date.timestamp()
+            for price_data in data['prices']:
+                timestamp = price_data[0] / 1000  # Конвертируем из миллисекунд
+                if low <= timestamp <= high:
+                    points.append((timestamp, price_data[1]))
+        else:
+            # Если данных нет, возможно API вернул ошибку
+            if 'error' in data:
+                print(f"CoinGecko API ошибка: {data['error']}")
+            else:
+                print(f"CoinGecko API вернул пустые данные для {currency_code}")
+        
+        points.sort()
+        return RateSeries(currency_code, [point[0] for point in points], [point[1] for point in points])
     
     def get_all_fiat_rates(self, date: Optional[datetime] = None) -> Dict[str, float]:
-        """Получает все основные фиатные курсы"""
-        rates = {}
-        for currency in self.FIAT_CURRENCIES.keys():
-            rate = self.get_fiat_rate(currency, date)
-            if rate:
-                rates[currency] = rate
-            time.sleep(0.1)  # Небольшая задержка для избежания блокировки
-        return rates
+        """Получает все основные фиатные курсы из одного снимка ЦБ РФ"""
+        snapshot = self.get_daily_snapshot(date)
+        if not snapshot:
+            return {}
+        
+        valutes = snapshot['valutes']
+        return {
+            currency: valutes[currency]['value']
+            for currency in self.FIAT_CURRENCIES
+            if currency in valutes
+        }
     
     def get_all_crypto_rates(self) -> Dict[str, float]:
         """Получает все основные криптовалютные курсы"""
-        rates = {}
+        return self.cache.get_or_load(
+            ('crypto_prices',),
+            self._fetch_all_crypto_rates,
+            ttl=self.CRYPTO_PRICES_TTL,
+            stale_ttl=self.CRYPTO_STALE_TTL
+        )
+    
+    def refresh_current_rates(self, fiat: bool = True, crypto: bool = True) -> Dict[str, Dict[str, float]]:
+        """
+        Принудительно загружает текущие курсы и кладёт их в кэш (для фонового прогрева)
+        
+        Пока идёт загрузка, читатели продолжают получать прежние значения из кэша.
+        
+        Args:
+            fiat: Обновить снимок ЦБ РФ
+            crypto: Обновить курсы CoinGecko
+        
+        Returns:
+            Словарь {'fiat': {...}, 'crypto': {...}} с актуальными курсами
+        """
+        if fiat:
+            now = datetime.now()
+            snapshot = self._fetch_daily_snapshot(now)
+            if snapshot:
+                self.cache.set(('cbr_daily', now.date()), snapshot,
+                               ttl=self.seconds_until_cbr_publication(), stale_ttl=self.CBR_STALE_TTL)
+        if crypto:
+            rates = self._fetch_all_crypto_rates()
+            if rates:
+                self.cache.set(('crypto_prices',), rates,
+                               ttl=self.CRYPTO_PRICES_TTL, stale_ttl=self.CRYPTO_STALE_TTL)
+        
+        return {'fiat': self.get_all_fiat_rates(), 'crypto': self.get_all_crypto_rates()}
+    
+    def is_fiat_snapshot_fresh(self) -> bool:
+        """Есть ли в кэше свежий снимок ЦБ РФ на сегодня"""
+        return self.cache.get(('cbr_daily', datetime.now().date())) is not None
+    
+    def _fetch_all_crypto_rates(self) -> Dict[str, float]:
+        """Загружает курсы всех криптовалют одним запросом simple/price"""
         try:
-            coin_ids = ','.join(self.CRYPTO_CURRENCIES.values())
             url = f"{self.COINGECKO_API}/simple/price"
             params = {
-                'ids': coin_ids,
+                'ids': ','.join(self.CRYPTO_CURRENCIES.values()),
                 'vs_currencies': 'rub'
             }
             
-            response = self.session.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            for currency_code, coin_id in self.CRYPTO_CURRENCIES.items():
-                if coin_id in data and 'rub' in data[coin_id]:
-                    rates[currency_code] = data[coin_id]['rub']
-            
-            return rates
+            return self._parse_crypto_prices(self._get_json(url, params=params))
         except Exception as e:
             print(f"Ошибка при получении криптовалютных курсов: {e}")
             return {}
-
+    
+    @classmethod
+    def _parse_crypto_prices(cls, data: Dict) -> Dict[str, float]:
+        """Разбирает ответ simple/price в словарь {код: курс}"""
+        rates = {}
+        for currency_code, coin_id in cls.CRYPTO_CURRENCIES.items():
+            if coin_id in data and 'rub' in data[coin_id]:
+                rates[currency_code] = data[coin_id]['rub']
+        return rates
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Локальное хранилище истории курсов (SQLite)
+- Курсы хранятся по ключу (валюта, дата) вместе с номиналом котировки ЦБ РФ
+  (курс дан за nominal единиц валюты); почасовые курсы криптовалют -
+  по ключу (валюта, время точки в UTC)
+- Для каждой валюты хранятся уже загруженные диапазоны дат,
+  чтобы догружать из источника только недостающие интервалы
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterator, List, Optional, Tuple
+
+from rate_series import RateSeries
+
+
+def default_store_path() -> str:
+    """Путь к базе: HISTORY_STORE_PATH, /tmp на Vercel или рядом с приложением"""
+    path = os.getenv('HISTORY_STORE_PATH')
+    if path:
+        return path
+    if os.getenv('VERCEL') == '1':
+        return '/tmp/currency_history.sqlite3'
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'currency_history.sqlite3')
+
+
+def time_key(timestamp: float) -> str:
+    """Ключ точки с временем: момент в UTC в ISO 8601 (строки упорядочены так же, как время)"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec='seconds')
+
+
+class HistoryStore:
+    """Хранилище исторических курсов с учётом загруженных диапазонов"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS rates (
+            currency TEXT NOT NULL,
+            date TEXT NOT NULL,
+            rate REAL NOT NULL,
+            nominal INTEGER,
+            PRIMARY KEY (currency, date)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS coverage (
+            currency TEXT NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS coverage_currency ON coverage (currency);
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or default_store_path()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._migrate()
+        self._conn.executescript(self.SCHEMA)
+
+    def _migrate(self):
+        """
+        Сбрасывает курсы, сохранённые без номинала (прежняя схема)
+
+        Такие курсы нельзя пересчитать за единицу валюты, поэтому они
+        удаляются вместе с отметками о загрузке и будут загружены заново.
+        """
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(rates)")]
+        if columns and 'nominal' not in columns:
+            with self._conn:
+                self._conn.execute("DROP TABLE rates")
+                self._conn.execute("DROP TABLE IF EXISTS coverage")
+
+    def missing_ranges(self, currency: str, start: date, end: date) -> List[Tuple[date, date]]:
+        """
+        Возвращает диапазоны дат внутри [start, end], которые ещё не загружались
+
+        Args:
+            currency: Код валюты
+            start: Начальная дата
+            end: Конечная дата
+
+        Returns:
+            Список интервалов (начало, конец) включительно
+        """
+        missing = []
+        cursor = start
+        for covered_start, covered_end in self._coverage(currency):
+            if covered_end < cursor:
+                continue
+            if covered_start > end:
+                break
+            if covered_start > cursor:
+                missing.append((cursor, covered_start - timedelta(days=1)))
+            cursor = max(cursor, covered_end + timedelta(days=1))
+            if cursor > end:
+                break
+        if cursor <= end:
+            missing.append((cursor, end))
+        return missing
+
+    def save(self, currency: str, records: RateSeries, covered: Optional[Tuple[date, date]] = None,
+             with_time: bool = False):
+        """
+        Сохраняет курсы и отмечает диапазон как загруженный
+
+        Args:
+            currency: Код валюты
+            records: Ряд курсов (номинал - из колонки nominal, если она есть)
+            covered: Диапазон дат, полностью загруженный из источника
+            with_time: Ключ точки - время в UTC (time_key), а не день
+        """
+        timestamps = records.timestamps.tolist()
+        if with_time:
+            keys = [time_key(timestamp) for timestamp in timestamps]
+        else:
+            keys = [datetime.fromtimestamp(timestamp).date().isoformat() for timestamp in timestamps]
+        nominals = records.columns.get('nominal')
+        nominals = [int(nominal) for nominal in nominals.tolist()] if nominals is not None else [None] * len(records)
+        rows = [
+            (currency, key, rate, nominal)
+            for key, rate, nominal in zip(keys, records.values.tolist(), nominals)
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO rates (currency, date, rate, nominal) VALUES (?, ?, ?, ?)", rows
+            )
+            if covered and covered[0] <= covered[1]:
+                self._merge_coverage(currency, covered)
+
+    def read(self, currency: str, start: date, end: date) -> RateSeries:
+        """Читает курсы за период в порядке дат; колонка nominal - если номинал известен для всех точек"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT date, rate, nominal FROM rates WHERE currency = ? AND date BETWEEN ? AND ? ORDER BY date",
+                (currency, start.isoformat(), end.isoformat())
+            ).fetchall()
+        nominals = [nominal for _, _, nominal in rows]
+        return RateSeries(
+            currency,
+            [datetime.fromisoformat(day).timestamp() for day, _, _ in rows],
+            [rate for _, rate, _ in rows],
+            {'nominal': nominals} if None not in nominals else None
+        )
+
+    def iter_rows(self, currency: str, start: date, end: date,
+                  batch_size: int = 1000) -> Iterator[Tuple[datetime, float]]:
+        """
+        Читает курсы за период в порядке дат порциями по batch_size
+
+        Каждая порция - отдельный запрос с продолжением после последней прочитанной даты,
+        поэтому блокировка не удерживается, пока потребитель обрабатывает строки.
+        """
+        for day, rate in self._iter_keys(currency, start.isoformat(), end.isoformat(), batch_size):
+            yield datetime.fromisoformat(day), rate
+
+    def iter_points(self, currency: str, start: datetime, end: datetime,
+                    batch_size: int = 1000) -> Iterator[Tuple[datetime, float]]:
+        """
+        Читает точки с временем (сохранённые с with_time) за период порциями по batch_size
+
+        Yields:
+            Кортежи (время точки в UTC, курс) в порядке времени
+        """
+        for key, rate in self._iter_keys(currency, time_key(start.timestamp()), time_key(end.timestamp()),
+                                         batch_size):
+            yield datetime.fromisoformat(key), rate
+
+    def _iter_keys(self, currency: str, low: str, high: str, batch_size: int) -> Iterator[Tuple[str, float]]:
+        """Строки (ключ, курс) с ключами в [low, high] порциями с продолжением после последнего ключа"""
+        last_key = None
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT date, rate FROM rates WHERE currency = ? AND date BETWEEN ? AND ? AND date > ? "
+                    "ORDER BY date LIMIT ?",
+                    (currency, low, high, last_key or '', batch_size)
+                ).fetchall()
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            last_key = rows[-1][0]
+
+    def _coverage(self, currency: str) -> List[Tuple[date, date]]:
+        """Загруженные диапазоны валюты, отсортированные по началу"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT start_date, end_date FROM coverage WHERE currency = ? ORDER BY start_date",
+                (currency,)
+            ).fetchall()
+        return [(date.fromisoformat(start), date.fromisoformat(end)) for start, end in rows]
+
+    def _merge_coverage(self, currency: str, covered: Tuple[date, date]):
+        """Объединяет новый диапазон с пересекающимися и смежными (под блокировкой)"""
+        rows = self._conn.execute(
+            "SELECT start_date, end_date FROM coverage WHERE currency = ?", (currency,)
+        ).fetchall()
+        intervals = sorted(
+            [(date.fromisoformat(start), date.fromisoformat(end)) for start, end in rows] + [covered]
+        )
+
+        merged = [intervals[0]]
+        for start, end in intervals[1:]:
+            last_start, last_end = merged[-1]
+            if start <= last_end + timedelta(days=1):
+                merged[-1] = (last_start, max(last_end, end))
+            else:
+                merged.append((start, end))
+
+        self._conn.execute("DELETE FROM coverage WHERE currency = ?", (currency,))
+        self._conn.executemany(
+            "INSERT INTO coverage (currency, start_date, end_date) VALUES (?, ?, ?)",
+            [(currency, start.isoformat(), end.isoformat()) for start, end in merged]
+        )
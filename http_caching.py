@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+HTTP-кэширование ответов API для app.py и api/index.py
+- ETag по хэшу содержимого ответа
+- Last-Modified по времени публикации данных
+- Cache-Control / s-maxage для браузера и CDN Vercel
+- Обработка If-None-Match / If-Modified-Since (304 Not Modified)
+- Выбор сжатия по Accept-Encoding
+"""
+
+import hashlib
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Iterable, Mapping, Optional
+
+# Ответы, которые нельзя кэшировать
+NO_STORE = 'no-store'
+
+
+def cache_control(max_age: int, s_maxage: Optional[int] = None, stale_while_revalidate: int = 0,
+                  immutable: bool = False) -> str:
+    """
+    Формирует значение Cache-Control для публичного ответа
+
+    Args:
+        max_age: Время жизни в браузере (секунды)
+        s_maxage: Время жизни в CDN (секунды), по умолчанию как max_age
+        stale_while_revalidate: Сколько CDN может отдавать устаревший ответ, обновляя его в фоне
+        immutable: Ответ никогда не изменится
+    """
+    parts = ['public', f'max-age={max(int(max_age), 0)}']
+    if s_maxage is not None:
+        parts.append(f's-maxage={max(int(s_maxage), 0)}')
+    if stale_while_revalidate:
+        parts.append(f'stale-while-revalidate={int(stale_while_revalidate)}')
+    if immutable:
+        parts.append('immutable')
+    return ', '.join(parts)
+
+
+def make_etag(body: bytes) -> str:
+    """Сильный ETag по хэшу содержимого"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def http_date(timestamp: float) -> str:
+    """Дата в формате HTTP (RFC 7231)"""
+    return formatdate(timestamp, usegmt=True)
+
+
+def caching_headers(body: bytes, cache_control_value: str,
+                    last_modified: Optional[float] = None) -> Dict[str, str]:
+    """
+    Заголовки кэширования для тела ответа
+
+    Args:
+        body: Тело ответа
+        cache_control_value: Значение Cache-Control
+        last_modified: Время изменения данных (unix timestamp); не может быть в будущем
+    """
+    headers = {
+        'ETag': make_etag(body),
+        'Cache-Control': cache_control_value,
+    }
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(min(last_modified, time.time()))
+    return headers
+
+
+def is_not_modified(request_headers: Mapping, headers: Mapping) -> bool:
+    """
+    Проверяет условный запрос: можно ли ответить 304 Not Modified
+
+    If-None-Match имеет приоритет над If-Modified-Since (RFC 7232).
+
+    Args:
+        request_headers: Заголовки запроса (Flask request.headers или BaseHTTPRequestHandler.headers)
+        headers: Заголовки ответа из caching_headers()
+    """
+    if_none_match = request_headers.get('If-None-Match')
+    if if_none_match:
+        etag = headers.get('ETag')
+        candidates = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+    if_modified_since = request_headers.get('If-Modified-Since')
+    last_modified = headers.get('Last-Modified')
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+
+    return False
+
+
+def negotiate_encoding(accept_encoding: Optional[str], available: Iterable[str]) -> Optional[str]:
+    """
+    Выбирает сжатие ответа по заголовку Accept-Encoding
+
+    Args:
+        accept_encoding: Значение Accept-Encoding запроса
+        available: Доступные сжатия в порядке предпочтения сервера (например, ('br', 'gzip'))
+
+    Returns:
+        Выбранное сжатие или None, если ответ нужно отдать без сжатия
+    """
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        weight = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for coding in available:
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Страницы сайта как готовые ответы в памяти для app.py и api/index.py
+- Шаблоны лежат в templates/ и читаются с диска один раз
+- Сжатые варианты (gzip и brotli, если установлен) готовятся заранее
+- Сильный ETag для каждого варианта, ответ 304 на условный запрос
+"""
+
+import os
+import threading
+from typing import Dict, Mapping, Optional, Tuple
+
+from http_caching import cache_control, is_not_modified, make_etag, negotiate_encoding
+from response_compression import ENCODINGS, compress
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+# Страницы не версионируются в имени, поэтому браузер перепроверяет их через 5 минут
+PAGE_CACHE_CONTROL = cache_control(300, 3600, stale_while_revalidate=86400)
+
+
+class PageAsset:
+    """Страница с заранее подготовленными вариантами тела и ETag"""
+
+    def __init__(self, body: bytes, content_type: str = 'text/html; charset=utf-8'):
+        self.content_type = content_type
+        self.variants: Dict[Optional[str], bytes] = {None: body}
+
+        # Страница сжимается один раз, поэтому с максимальным уровнем
+        for encoding in ENCODINGS:
+            data = compress(body, encoding, level=11 if encoding == 'br' else 9)
+            if len(data) < len(body):
+                self.variants[encoding] = data
+
+        # ETag считается по байтам варианта, поэтому у каждого сжатия он свой
+        self.etags = {encoding: make_etag(data) for encoding, data in self.variants.items()}
+
+    def respond(self, request_headers: Mapping) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Готовит ответ для запроса
+
+        Args:
+            request_headers: Заголовки запроса (Flask request.headers или BaseHTTPRequestHandler.headers)
+
+        Returns:
+            Кортеж (статус, заголовки, тело); на условный запрос - 304 с пустым телом
+        """
+        available = [encoding for encoding in ENCODINGS if encoding in self.variants]
+        encoding = negotiate_encoding(request_headers.get('Accept-Encoding'), available)
+        body = self.variants[encoding]
+
+        headers = {
+            'Content-Type': self.content_type,
+            'ETag': self.etags[encoding],
+            'Cache-Control': PAGE_CACHE_CONTROL,
+            'Vary': 'Accept-Encoding',
+        }
+        if encoding:
+            headers['Content-Encoding'] = encoding
+
+        if is_not_modified(request_headers, headers):
+            return 304, headers, b''
+        headers['Content-Length'] = str(len(body))
+        return 200, headers, body
+
+
+_pages: Dict[str, PageAsset] = {}
+_pages_lock = threading.Lock()
+
+
+def get_page(name: str) -> PageAsset:
+    """
+    Страница из templates/ (читается и сжимается при первом обращении)
+
+    Args:
+        name: Имя файла шаблона, например currency.html
+    """
+    page = _pages.get(name)
+    if page is None:
+        with _pages_lock:
+            page = _pages.get(name)
+            if page is None:
+                with open(os.path.join(TEMPLATES_DIR, name), 'rb') as f:
+                    page = PageAsset(f.read())
+                _pages[name] = page
+    return page
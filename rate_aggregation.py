@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Агрегация истории курсов на стороне сервера
+- Разрешения: raw (как есть), hourly, daily, weekly
+- Для каждого интервала - курс закрытия или свеча OHLC
+- Прореживание ряда для графика до заданного числа точек (LTTB)
+"""
+
+from array import array
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from rate_series import RateSeries
+
+RESOLUTIONS = ('raw', 'hourly', 'daily', 'weekly')
+AGGREGATIONS = ('close', 'ohlc')
+
+# Границы параметра max_points (число точек графика)
+MIN_CHART_POINTS = 3
+MAX_CHART_POINTS = 10000
+
+# Формат дат в ответе API для каждого разрешения
+# (raw - как в прежнем ответе /api/currency/history, только дата)
+DATE_FORMATS = {
+    'raw': '%Y-%m-%d',
+    'hourly': '%Y-%m-%d %H:%M',
+    'daily': '%Y-%m-%d',
+    'weekly': '%Y-%m-%d',
+}
+
+
+def resolve_resolution(resolution: str, start_date: datetime, end_date: datetime,
+                       finest: str = 'raw') -> str:
+    """
+    Определяет разрешение для периода
+
+    Args:
+        resolution: raw, hourly, daily, weekly или auto
+        start_date: Начальная дата
+        end_date: Конечная дата
+        finest: Самое мелкое разрешение, которое имеет смысл для источника
+            (для курсов ЦБ РФ - daily)
+
+    Returns:
+        Одно из RESOLUTIONS; для auto - hourly до 7 дней, daily до 2 лет, иначе weekly
+
+    Raises:
+        ValueError: Если разрешение не поддерживается
+    """
+    if resolution == 'auto':
+        days = (end_date - start_date).days
+        if days <= 7:
+            resolution = 'hourly'
+        elif days <= 730:
+            resolution = 'daily'
+        else:
+            resolution = 'weekly'
+    elif resolution not in RESOLUTIONS:
+        raise ValueError(f"Неизвестное разрешение {resolution}, допустимо: auto, {', '.join(RESOLUTIONS)}")
+
+    if RESOLUTIONS.index(resolution) < RESOLUTIONS.index(finest):
+        return finest
+    return resolution
+
+
+def bucket_start(date: datetime, resolution: str) -> datetime:
+    """Начало интервала, в который попадает дата"""
+    if resolution == 'hourly':
+        return date.replace(minute=0, second=0, microsecond=0)
+    day = date.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == 'weekly':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def bucket_end(start: datetime, resolution: str) -> datetime:
+    """Начало следующего интервала"""
+    if resolution == 'hourly':
+        return start + timedelta(hours=1)
+    if resolution == 'weekly':
+        return start + timedelta(days=7)
+    return start + timedelta(days=1)
+
+
+def aggregate_history(history: RateSeries, resolution: str, ohlc: bool = False) -> RateSeries:
+    """
+    Агрегирует упорядоченный по времени ряд по интервалам за один проход
+
+    Граница интервала вычисляется один раз на интервал, для остальных точек
+    достаточно сравнить timestamp с концом текущего интервала.
+
+    Args:
+        history: Ряд курсов валюты
+        resolution: Одно из RESOLUTIONS
+        ohlc: Добавить в ряд колонки open/high/low (rates - курс закрытия)
+
+    Returns:
+        Ряд по интервалам; rates - курс закрытия интервала
+    """
+    if resolution == 'raw':
+        if not ohlc:
+            return history
+        return RateSeries(history.currency, history.timestamps, history.values,
+                          {'open': history.values, 'high': history.values, 'low': history.values})
+
+    starts, closes, opens, highs, lows = (array('d') for _ in range(5))
+    end = None
+    for timestamp, rate in zip(history.timestamps.tolist(), history.values.tolist()):
+        if end is not None and timestamp < end:
+            closes[-1] = rate
+            if rate > highs[-1]:
+                highs[-1] = rate
+            if rate < lows[-1]:
+                lows[-1] = rate
+            continue
+        start = bucket_start(datetime.fromtimestamp(timestamp), resolution)
+        end = bucket_end(start, resolution).timestamp()
+        starts.append(start.timestamp())
+        closes.append(rate)
+        opens.append(rate)
+        highs.append(rate)
+        lows.append(rate)
+
+    columns = {'open': opens, 'high': highs, 'low': lows} if ohlc else None
+    return RateSeries(history.currency, starts, closes, columns)
+
+
+def parse_max_points(max_points_str: Optional[str]) -> Optional[int]:
+    """
+    Разбирает параметр max_points (None - ряд не прореживается)
+
+    Raises:
+        ValueError: С сообщением для пользователя, если число точек задано неверно
+    """
+    if not max_points_str:
+        return None
+    try:
+        max_points = int(max_points_str)
+    except ValueError:
+        raise ValueError(f'Неверное значение max_points {max_points_str}, ожидается целое число')
+    if not MIN_CHART_POINTS <= max_points <= MAX_CHART_POINTS:
+        raise ValueError(f'max_points должно быть от {MIN_CHART_POINTS} до {MAX_CHART_POINTS}')
+    return max_points
+
+
+def lttb_indices(timestamps: List[float], values: List[float], max_points: int) -> List[int]:
+    """
+    Позиции точек, отобранных алгоритмом Largest-Triangle-Three-Buckets
+
+    Первая и последняя точки сохраняются, остальные делятся на max_points - 2 корзины;
+    из каждой берётся точка, образующая наибольший треугольник с точкой,
+    выбранной в предыдущей корзине, и средней точкой следующей корзины.
+    Каждая точка рассматривается не более двух раз - время линейное.
+    """
+    count = len(values)
+    if max_points >= count or max_points < MIN_CHART_POINTS:
+        return list(range(count))
+
+    every = (count - 2) / (max_points - 2)
+    selected = [0]
+    previous = 0
+    for bucket in range(max_points - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+
+        # Средняя точка следующей корзины (для последней корзины - последняя точка ряда)
+        next_start = end
+        next_end = min(int((bucket + 2) * every) + 1, count)
+        next_count = next_end - next_start
+        avg_x = sum(timestamps[next_start:next_end]) / next_count
+        avg_y = sum(values[next_start:next_end]) / next_count
+
+        prev_x, prev_y = timestamps[previous], values[previous]
+        best_area = -1.0
+        for index in range(start, end):
+            area = abs((prev_x - avg_x) * (values[index] - prev_y)
+                       - (prev_x - timestamps[index]) * (avg_y - prev_y))
+            if area > best_area:
+                best_area = area
+                previous = index
+        selected.append(previous)
+
+    selected.append(count - 1)
+    return selected
+
+
+def downsample(history: RateSeries, max_points: int) -> RateSeries:
+    """
+    Прореживает ряд для графика до max_points точек с сохранением формы
+
+    Линейный ряд прореживается LTTB. Свечи (колонки open/high/low) объединяются
+    по соседним группам: open первой, close последней, максимум high и минимум low,
+    чтобы экстремумы периода не терялись.
+
+    Args:
+        history: Ряд курсов (после aggregate_history)
+        max_points: Максимальное число точек в ответе
+    """
+    count = len(history)
+    if count <= max_points:
+        return history
+
+    timestamps = history.timestamps.tolist()
+    values = history.values.tolist()
+
+    if 'high' in history.columns:
+        opens = history.to_list('open')
+        highs = history.to_list('high')
+        lows = history.to_list('low')
+        bounds = [count * group // max_points for group in range(max_points + 1)]
+        groups = list(zip(bounds, bounds[1:]))
+        return RateSeries(
+            history.currency,
+            [timestamps[start] for start, _ in groups],
+            [values[end - 1] for _, end in groups],
+            {
+                'open': [opens[start] for start, _ in groups],
+                'high': [max(highs[start:end]) for start, end in groups],
+                'low': [min(lows[start:end]) for start, end in groups],
+            }
+        )
+
+    indices = lttb_indices(timestamps, values, max_points)
+    return RateSeries(
+        history.currency,
+        [timestamps[index] for index in indices],
+        [values[index] for index in indices],
+        {name: [column[index] for index in indices] for name, column in history.columns.items()}
+    )
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Аналитика ряда курсов для /api/currency/analytics
+- Логарифмические доходности, скользящее среднее и скользящая волатильность,
+  просадка от максимума и изменение за период
+- Оконные операции векторные (numpy, если установлен), без numpy -
+  один проход с накопленными суммами
+- Результат кэшируется в кэше парсера по (валюта, период, разрешение, окно):
+  несколько виджетов с разными окнами используют одну загрузку ряда
+"""
+
+import math
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from currency_api import get_history
+from rate_aggregation import DATE_FORMATS, aggregate_history
+from rate_cache import PartialResult
+from rate_series import RateSeries
+
+try:
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:  # numpy - необязательная зависимость
+    np = None
+
+# Окно скользящих показателей (в точках ряда)
+DEFAULT_WINDOW = 20
+MIN_WINDOW = 2
+MAX_WINDOW = 365
+
+YEAR_SECONDS = 365.25 * 86400
+
+
+def parse_window(window_str: Optional[str]) -> int:
+    """
+    Разбирает размер окна из параметра запроса
+
+    Raises:
+        ValueError: С сообщением для пользователя, если окно задано неверно
+    """
+    if not window_str:
+        return DEFAULT_WINDOW
+    try:
+        window = int(window_str)
+    except ValueError:
+        raise ValueError(f'Неверный размер окна {window_str}, ожидается целое число')
+    if not MIN_WINDOW <= window <= MAX_WINDOW:
+        raise ValueError(f'Размер окна должен быть от {MIN_WINDOW} до {MAX_WINDOW} точек')
+    return window
+
+
+def _json_list(values) -> List[Optional[float]]:
+    """Список для JSON: NaN (нет данных, например неполное окно) заменяется на None"""
+    data = values.tolist() if hasattr(values, 'tolist') else values
+    return [None if value is None or value != value else value for value in data]
+
+
+def log_returns(values) -> List[float]:
+    """Логарифмические доходности ln(v[i] / v[i-1]), на одну точку короче ряда"""
+    if np is not None:
+        return np.diff(np.log(values))
+    logs = [math.log(value) for value in values]
+    return [current - previous for previous, current in zip(logs, logs[1:])]
+
+
+def rolling_mean(values, window: int):
+    """Скользящее среднее; первые window - 1 точек - NaN"""
+    if len(values) < window:
+        return [math.nan] * len(values)
+    if np is not None:
+        result = np.full(len(values), np.nan)
+        result[window - 1:] = sliding_window_view(values, window).mean(axis=1)
+        return result
+
+    result = [math.nan] * (window - 1)
+    total = sum(values[:window])
+    result.append(total / window)
+    for index in range(window, len(values)):
+        total += values[index] - values[index - window]
+        result.append(total / window)
+    return result
+
+
+def rolling_std(values, window: int):
+    """Скользящее выборочное стандартное отклонение; первые window - 1 точек - NaN"""
+    if len(values) < window:
+        return [math.nan] * len(values)
+    if np is not None:
+        result = np.full(len(values), np.nan)
+        result[window - 1:] = sliding_window_view(values, window).std(axis=1, ddof=1)
+        return result
+
+    # Суммы считаются от среднего всего ряда, чтобы не терять точность при вычитании
+    shift = sum(values) / len(values)
+    centered = [value - shift for value in values]
+    total = sum(centered[:window])
+    total_sq = sum(value * value for value in centered[:window])
+
+    def std() -> float:
+        variance = (total_sq - total * total / window) / (window - 1)
+        return math.sqrt(variance) if variance > 0 else 0.0
+
+    result = [math.nan] * (window - 1)
+    result.append(std())
+    for index in range(window, len(values)):
+        added, removed = centered[index], centered[index - window]
+        total += added - removed
+        total_sq += added * added - removed * removed
+        result.append(std())
+    return result
+
+
+def drawdown(values):
+    """Просадка от максимума на каждую точку: v / max(v[:i+1]) - 1 (0 или отрицательная)"""
+    if np is not None:
+        return values / np.maximum.accumulate(values) - 1.0
+    result = []
+    peak = -math.inf
+    for value in values:
+        peak = max(peak, value)
+        result.append(value / peak - 1.0)
+    return result
+
+
+def periods_per_year(series: RateSeries) -> Optional[float]:
+    """
+    Число точек ряда в году для годовой волатильности
+
+    Оценивается по самому ряду: так учитываются и выходные без курсов ЦБ РФ,
+    и неравномерные точки raw-разрешения.
+    """
+    if len(series) < 2:
+        return None
+    span = series.timestamps[-1] - series.timestamps[0]
+    return (len(series) - 1) * YEAR_SECONDS / span if span > 0 else None
+
+
+def compute_analytics(series: RateSeries, window: int) -> Dict:
+    """
+    Показатели ряда курсов
+
+    Args:
+        series: Ряд курсов (положительные значения)
+        window: Окно скользящих показателей в точках
+
+    Returns:
+        Словарь с рядами той же длины, что и курсы (None - нет данных для точки),
+        и сводкой за весь период
+    """
+    values = series.values
+    returns = log_returns(values)
+    annual = periods_per_year(series)
+    scale = math.sqrt(annual) if annual else 1.0
+
+    # Доходность i относится к дате i + 1, поэтому ряды доходностей сдвинуты на точку
+    volatility = [None] + [
+        None if value is None else value * scale for value in _json_list(rolling_std(returns, window))
+    ]
+
+    drawdowns = drawdown(values)
+    first, last = float(values[0]), float(values[-1])
+    total_volatility = None
+    if len(returns) >= 2:
+        total_volatility = float(rolling_std(returns, len(returns))[-1]) * scale
+
+    return {
+        'window': window,
+        'periods_per_year': annual,
+        'returns': [None] + _json_list(returns),
+        'moving_average': _json_list(rolling_mean(values, window)),
+        'volatility': volatility,
+        'drawdown': _json_list(drawdowns),
+        'summary': {
+            'first': first,
+            'last': last,
+            'change': last - first,
+            'change_percent': (last / first - 1.0) * 100,
+            'min': series.min(),
+            'max': series.max(),
+            'volatility': total_volatility,
+            'max_drawdown': min(_json_list(drawdowns)),
+        }
+    }
+
+
+class RateAnalytics:
+    """Аналитика рядов курсов с кэшированием в кэше парсера"""
+
+    def __init__(self, parser):
+        """
+        Args:
+            parser: Экземпляр CurrencyParser
+        """
+        self.parser = parser
+
+    def get(self, currency_code: str, start_date: datetime, end_date: datetime,
+            resolution: str, window: int) -> Dict:
+        """
+        Аналитика ряда валюты за период
+
+        Ряд берётся из кэша истории парсера и агрегируется до разрешения;
+        результат живёт в кэше столько же, сколько история (устаревшая
+        или неполная - PARTIAL_HISTORY_TTL).
+
+        Returns:
+            Словарь из compute_analytics() с датами, курсами и датой последней точки (last_date);
+            пустой, если ряд получить не удалось
+        """
+        is_crypto = currency_code in self.parser.CRYPTO_CURRENCIES
+        if is_crypto:
+            # Границы округляются так же, как ключ истории криптовалют в парсере
+            bucket = self.parser.CRYPTO_HISTORY_TTL
+            period_key = (int(start_date.timestamp()) // bucket, int(end_date.timestamp()) // bucket)
+            ttl, stale_ttl = self.parser.CRYPTO_HISTORY_TTL, self.parser.CRYPTO_STALE_TTL
+        else:
+            period_key = (start_date.date(), end_date.date())
+            ttl, stale_ttl = self.parser.seconds_until_cbr_publication(), self.parser.CBR_STALE_TTL
+
+        key = ('analytics', currency_code, *period_key, resolution, window)
+        return self.parser.cache.get_or_load(
+            key,
+            lambda: self._compute(currency_code, start_date, end_date, resolution, window),
+            ttl=ttl,
+            stale_ttl=stale_ttl
+        )
+
+    def _compute(self, currency_code: str, start_date: datetime, end_date: datetime,
+                 resolution: str, window: int) -> Dict:
+        """
+        Загружает ряд и считает показатели
+
+        Raises:
+            PartialResult: История устарела или загружена не полностью -
+                показатели по ней живут в кэше недолго
+        """
+        history = aggregate_history(get_history(self.parser, currency_code, start_date, end_date), resolution)
+        if not history:
+            return {}
+        result = compute_analytics(history, window)
+        result.update({
+            'currency': currency_code,
+            'resolution': resolution,
+            'last_date': history.last_date(),
+            'dates': history.format_dates(DATE_FORMATS[resolution]),
+            'rates': history.to_list(),
+        })
+        if currency_code in self.parser.FIAT_CURRENCIES and not self.parser.is_fiat_history_fresh(
+                currency_code, start_date, end_date):
+            raise PartialResult(result, self.parser.PARTIAL_HISTORY_TTL)
+        return result
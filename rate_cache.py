@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Кэш с ограниченным размером, TTL и отдачей устаревших данных
+- LRU-вытеснение при превышении max_size
+- Свой TTL для каждой записи
+- Stale-while-revalidate: устаревшее значение отдаётся сразу,
+  а обновление выполняется в фоновом потоке
+- Если источник недоступен, отдаётся последнее известное значение
+- Неполный результат загрузки (PartialResult) кэшируется ненадолго,
+  одинаково при обычной и при фоновой загрузке
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class PartialResult(Exception):
+    """
+    Загрузчик получил значение не полностью (часть источника не ответила)
+
+    Значение кэшируется на короткий ttl вместо обычного, чтобы неполные данные
+    не жили в кэше так же долго, как полные.
+    """
+
+    def __init__(self, value: Any, ttl: float):
+        """
+        Args:
+            value: Неполное значение
+            ttl: Время жизни значения в кэше в секундах
+        """
+        super().__init__(f'Неполный результат (кэшируется на {ttl:.0f} с)')
+        self.value = value
+        self.ttl = ttl
+
+
+class _CacheEntry:
+    """Запись кэша"""
+
+    __slots__ = ('value', 'stored_at', 'expires_at', 'stale_until')
+
+    def __init__(self, value: Any, ttl: float, stale_ttl: float):
+        now = time.monotonic()
+        self.value = value
+        self.stored_at = time.time()
+        self.expires_at = now + ttl
+        self.stale_until = self.expires_at + stale_ttl
+
+
+class TTLCache:
+    """Потокобезопасный LRU-кэш с TTL и stale-while-revalidate"""
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._entries: 'OrderedDict[Hashable, _CacheEntry]' = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'stale_hits': 0, 'misses': 0, 'refreshes': 0, 'evictions': 0,
+                       'fallbacks': 0}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Возвращает свежее значение или None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def get_last_known(self, key: Hashable) -> Optional[Any]:
+        """Последнее известное значение, даже просроченное (для отдачи при отказе источника), или None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._stats['fallbacks'] += 1
+            return entry.value
+
+    def set(self, key: Hashable, value: Any, ttl: float, stale_ttl: float = 0.0):
+        """Сохраняет значение с заданным TTL"""
+        with self._lock:
+            self._store(key, value, ttl, stale_ttl)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], ttl: float,
+                    stale_ttl: float = 0.0) -> Any:
+        """
+        Возвращает значение из кэша или загружает его через loader
+
+        Пустые результаты (None, {}, []) не кэшируются - это признак ошибки источника.
+        В этом случае возвращается последнее известное значение, даже просроченное.
+        Если loader выбросил PartialResult, его значение кэшируется на PartialResult.ttl
+        без периода устаревания.
+
+        Args:
+            key: Ключ кэша
+            loader: Функция загрузки значения из источника
+            ttl: Время жизни свежего значения в секундах
+            stale_ttl: Сколько секунд после истечения TTL можно отдавать устаревшее
+                значение, пока идёт фоновое обновление
+
+        Returns:
+            Значение из кэша или результат loader()
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return entry.value
+                if entry.stale_until > now:
+                    self._entries.move_to_end(key)
+                    self._stats['stale_hits'] += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        self._stats['refreshes'] += 1
+                        threading.Thread(
+                            target=self._refresh,
+                            args=(key, loader, ttl, stale_ttl),
+                            daemon=True
+                        ).start()
+                    return entry.value
+            self._stats['misses'] += 1
+
+        try:
+            value = loader()
+        except PartialResult as partial:
+            value, ttl, stale_ttl = partial.value, partial.ttl, 0.0
+        if value:
+            self.set(key, value, ttl, stale_ttl)
+        elif entry is not None:
+            with self._lock:
+                self._stats['fallbacks'] += 1
+            return entry.value
+        return value
+
+    def stored_at(self, key: Hashable) -> Optional[float]:
+        """Время (unix timestamp) сохранения значения или None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.stored_at if entry else None
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Удаляет запись по ключу или очищает весь кэш"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Счётчики попаданий и промахов для мониторинга"""
+        with self._lock:
+            return dict(self._stats, size=len(self._entries), max_size=self.max_size)
+
+    def _refresh(self, key: Hashable, loader: Callable[[], Any], ttl: float, stale_ttl: float):
+        """Фоновое обновление устаревшей записи"""
+        try:
+            try:
+                value = loader()
+            except PartialResult as partial:
+                value, ttl, stale_ttl = partial.value, partial.ttl, 0.0
+            if value:
+                self.set(key, value, ttl, stale_ttl)
+        except Exception as e:
+            print(f"Ошибка фонового обновления кэша {key}: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _store(self, key: Hashable, value: Any, ttl: float, stale_ttl: float):
+        """Сохраняет запись и вытесняет самые старые при переполнении (под блокировкой)"""
+        self._entries[key] = _CacheEntry(value, ttl, stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
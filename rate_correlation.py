@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Матрица корреляций и ковариаций курсов валют
+- Ряды загружаются параллельно через кэш парсера и агрегируются до дневных
+- Общий дневной индекс - дни, за которые есть курсы всех валют
+  (у ЦБ РФ нет курсов на выходные, заполнение пропусков дало бы нулевые доходности)
+- Считается по дневным логарифмическим доходностям: корреляция уровней курсов
+  отражает общий тренд, а не совместное движение
+- Обе матрицы - одним векторным шагом (numpy, если установлен)
+- Результат запоминается, пока кэш парсера отдаёт те же объекты рядов
+"""
+
+import math
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from currency_api import load_histories
+from rate_aggregation import aggregate_history
+from rate_series import RateSeries
+
+try:
+    import numpy as np
+except ImportError:  # numpy - необязательная зависимость
+    np = None
+
+# Минимум общих дней: меньше двух доходностей не дают ковариации
+MIN_COMMON_DAYS = 3
+
+# Сколько последних результатов запоминается (разные наборы валют и периоды)
+MEMO_SIZE = 32
+
+
+def _json_matrix(matrix) -> List[List[Optional[float]]]:
+    """Матрица для JSON: NaN (валюта с неизменным курсом) заменяется на None"""
+    rows = matrix.tolist() if hasattr(matrix, 'tolist') else matrix
+    return [[None if value != value else value for value in row] for row in rows]
+
+
+def covariance_and_correlation(rows: List[List[float]]) -> Tuple[List[List[float]], List[List[float]]]:
+    """
+    Выборочная ковариация и корреляция Пирсона для строк одинаковой длины
+
+    Returns:
+        Кортеж (ковариация, корреляция); корреляция с рядом нулевой дисперсии - NaN
+    """
+    if np is not None:
+        data = np.asarray(rows, dtype=np.float64)
+        covariance = np.atleast_2d(np.cov(data))
+        deviation = np.sqrt(np.diag(covariance))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlation = covariance / np.outer(deviation, deviation)
+        return covariance, np.clip(correlation, -1.0, 1.0)
+
+    length = len(rows[0])
+    centered = []
+    for row in rows:
+        mean = sum(row) / length
+        centered.append([value - mean for value in row])
+    covariance = [
+        [sum(a * b for a, b in zip(left, right)) / (length - 1) for right in centered]
+        for left in centered
+    ]
+    deviation = [math.sqrt(covariance[i][i]) for i in range(len(rows))]
+    correlation = [
+        [max(-1.0, min(1.0, covariance[i][j] / (deviation[i] * deviation[j])))
+         if deviation[i] and deviation[j] else math.nan
+         for j in range(len(rows))]
+        for i in range(len(rows))
+    ]
+    return covariance, correlation
+
+
+def daily_returns(histories: Dict[str, RateSeries]) -> Tuple[List[float], Dict[str, List[float]]]:
+    """
+    Дневные логарифмические доходности на общем индексе дней
+
+    Returns:
+        Кортеж (общие дни - timestamp начала дня, {код: доходности}); доходностей на одну меньше, чем дней
+    """
+    daily = {code: aggregate_history(history, 'daily') for code, history in histories.items()}
+    common = None
+    for series in daily.values():
+        days = set(series.timestamps.tolist())
+        common = days if common is None else common & days
+    axis = sorted(common or ())
+
+    returns = {}
+    for code, series in daily.items():
+        rates = dict(zip(series.timestamps.tolist(), series.values.tolist()))
+        logs = [math.log(rates[day]) for day in axis]
+        returns[code] = [current - previous for previous, current in zip(logs, logs[1:])]
+    return axis, returns
+
+
+class CorrelationEngine:
+    """Корреляции курсов с запоминанием результата до обновления рядов"""
+
+    def __init__(self, parser):
+        """
+        Args:
+            parser: Экземпляр CurrencyParser
+        """
+        self.parser = parser
+        self._memo: 'OrderedDict[Tuple, Tuple[Tuple[RateSeries, ...], Dict]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def all_currencies(self) -> List[str]:
+        """Все отслеживаемые валюты: фиатные, затем криптовалюты"""
+        return list(self.parser.FIAT_CURRENCIES) + list(self.parser.CRYPTO_CURRENCIES)
+
+    def get_matrix(self, currency_codes: List[str], start_date: datetime, end_date: datetime) -> Dict:
+        """
+        Матрицы корреляций и ковариаций дневных доходностей
+
+        Ряды берутся из кэша парсера; пока он отдаёт те же объекты рядов,
+        повторный запрос возвращает запомненный результат без пересчёта.
+
+        Args:
+            currency_codes: Коды валют
+            start_date: Начальная дата
+            end_date: Конечная дата
+
+        Returns:
+            Словарь {'currencies', 'days', 'start_date', 'end_date', 'correlation',
+            'covariance', 'errors'}; currencies пуст, если общих дней недостаточно
+        """
+        codes = list(dict.fromkeys(currency_codes))
+        histories, errors = load_histories(self.parser, codes, start_date, end_date)
+        sources = tuple(histories.get(code) for code in codes)
+        key = (tuple(codes), start_date.date(), end_date.date())
+
+        with self._lock:
+            cached = self._memo.get(key)
+            if cached is not None and len(cached[0]) == len(sources) and all(
+                    cached_series is series for cached_series, series in zip(cached[0], sources)):
+                self._memo.move_to_end(key)
+                return cached[1]
+
+        result = self._compute(histories, errors)
+        with self._lock:
+            self._memo[key] = (sources, result)
+            self._memo.move_to_end(key)
+            while len(self._memo) > MEMO_SIZE:
+                self._memo.popitem(last=False)
+        return result
+
+    def _compute(self, histories: Dict[str, RateSeries], errors: Dict[str, str]) -> Dict:
+        """Выравнивает ряды и считает матрицы"""
+        result = {
+            'currencies': [],
+            'days': 0,
+            'start_date': None,
+            'end_date': None,
+            'correlation': [],
+            'covariance': [],
+            'errors': errors,
+        }
+        if not histories:
+            return result
+
+        axis, returns = daily_returns(histories)
+        result['days'] = len(axis)
+        if len(axis) < MIN_COMMON_DAYS:
+            return result
+
+        covariance, correlation = covariance_and_correlation(list(returns.values()))
+        result.update({
+            'currencies': list(returns),
+            'start_date': datetime.fromtimestamp(axis[0]).strftime('%Y-%m-%d'),
+            'end_date': datetime.fromtimestamp(axis[-1]).strftime('%Y-%m-%d'),
+            'correlation': _json_matrix(correlation),
+            'covariance': _json_matrix(covariance),
+        })
+        return result
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Рассылка обновлений текущих курсов по Server-Sent Events
+- Фоновый прогрев публикует курсы, событие создаётся только при изменении
+- Все подписчики получают одно и то же событие, к источникам они не обращаются
+- Heartbeat-комментарии держат соединение открытым через прокси
+- Переподключение с Last-Event-ID: пропущенные события отдаются из буфера,
+  если их там уже нет - отдаётся текущий снимок
+"""
+
+import json
+import threading
+from collections import deque
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+# Пауза между heartbeat-комментариями (секунды)
+HEARTBEAT_INTERVAL = 15
+
+# Через сколько миллисекунд браузер переподключается после обрыва
+RECONNECT_DELAY_MS = 5000
+
+# На Vercel соединение не держится: ответ закрывается сразу, браузер переподключается реже
+SERVERLESS_RECONNECT_DELAY_MS = 30000
+
+# Сколько последних событий хранится для переподключения
+EVENT_BUFFER_SIZE = 32
+
+EVENT_NAME = 'rates'
+
+
+def format_event(event_id: int, data: str, event: str = EVENT_NAME) -> str:
+    """Событие в формате text/event-stream"""
+    return f'id: {event_id}\nevent: {event}\ndata: {data}\n\n'
+
+
+def parse_event_id(last_event_id: Optional[str]) -> Optional[int]:
+    """Номер события из заголовка Last-Event-ID (None, если его нет или он неверный)"""
+    try:
+        return int(last_event_id) if last_event_id else None
+    except ValueError:
+        return None
+
+
+class RateBroadcaster:
+    """Хранит последние события с курсами и будит подписчиков при новых"""
+
+    def __init__(self, buffer_size: int = EVENT_BUFFER_SIZE):
+        self._events: Deque[Tuple[int, str]] = deque(maxlen=buffer_size)
+        self._last_rates: Optional[Dict] = None
+        self._next_id = 1
+        self._subscribers = 0
+        self._condition = threading.Condition()
+
+    def publish(self, rates: Dict) -> Optional[int]:
+        """
+        Публикует курсы, если они изменились
+
+        Args:
+            rates: Словарь {'fiat': {...}, 'crypto': {...}}
+
+        Returns:
+            Номер нового события или None, если курсы не изменились
+        """
+        if not rates or not any(rates.values()):
+            return None
+        with self._condition:
+            if rates == self._last_rates:
+                return None
+            event_id = self._next_id
+            self._next_id += 1
+            self._last_rates = rates
+            self._events.append((event_id, json.dumps(rates, ensure_ascii=False)))
+            self._condition.notify_all()
+            return event_id
+
+    def has_events(self) -> bool:
+        """Публиковались ли уже курсы"""
+        with self._condition:
+            return bool(self._events)
+
+    def events_after(self, last_event_id: Optional[int]) -> List[Tuple[int, str]]:
+        """
+        События, которых у клиента ещё нет
+
+        Без Last-Event-ID или если пропущенные события уже вытеснены из буфера,
+        возвращается только последний снимок.
+        """
+        with self._condition:
+            return self._events_after(last_event_id)
+
+    def stream(self, last_event_id: Optional[int] = None,
+               heartbeat_interval: float = HEARTBEAT_INTERVAL) -> Iterator[str]:
+        """
+        Бесконечный поток text/event-stream для одного подписчика
+
+        Args:
+            last_event_id: Номер последнего полученного клиентом события (Last-Event-ID)
+            heartbeat_interval: Пауза между heartbeat-комментариями
+        """
+        with self._condition:
+            self._subscribers += 1
+        try:
+            yield f'retry: {RECONNECT_DELAY_MS}\n\n'
+            while True:
+                with self._condition:
+                    events = self._events_after(last_event_id)
+                    if not events:
+                        self._condition.wait(heartbeat_interval)
+                        events = self._events_after(last_event_id)
+                if not events:
+                    yield ': heartbeat\n\n'
+                    continue
+                for event_id, data in events:
+                    yield format_event(event_id, data)
+                last_event_id = events[-1][0]
+        finally:
+            with self._condition:
+                self._subscribers -= 1
+
+    def snapshot(self, last_event_id: Optional[int] = None,
+                 reconnect_delay_ms: int = SERVERLESS_RECONNECT_DELAY_MS) -> str:
+        """
+        Короткий ответ text/event-stream для окружений без долгих соединений (Vercel)
+
+        Содержит новые для клиента события и интервал переподключения;
+        EventSource переподключится сам и пришлёт Last-Event-ID.
+        """
+        chunks = [f'retry: {reconnect_delay_ms}\n\n']
+        chunks.extend(format_event(event_id, data) for event_id, data in self.events_after(last_event_id))
+        return ''.join(chunks)
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        """Число подписчиков и номер последнего события для метрик"""
+        with self._condition:
+            return {
+                'subscribers': self._subscribers,
+                'last_event_id': self._events[-1][0] if self._events else None,
+            }
+
+    def _events_after(self, last_event_id: Optional[int]) -> List[Tuple[int, str]]:
+        """events_after() под блокировкой"""
+        if not self._events:
+            return []
+        if last_event_id is None or last_event_id < self._events[0][0] - 1 or last_event_id >= self._next_id:
+            latest = self._events[-1]
+            return [] if last_event_id == latest[0] else [latest]
+        return [event for event in self._events if event[0] > last_event_id]
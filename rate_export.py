@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Потоковая выгрузка истории курсов в CSV и NDJSON для /api/currency/export
+- Строки формируются генератором из хранилища или источника,
+  весь ряд в памяти не собирается
+- Несколько валют выгружаются друг за другом в одном ответе (строка - валюта, дата, курс)
+- Строки объединяются в части по EXPORT_CHUNK_ROWS для chunked-ответа
+"""
+
+import json
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Tuple
+
+# Форматы выгрузки и их Content-Type
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Сколько строк отправляется одной частью ответа
+EXPORT_CHUNK_ROWS = 500
+
+CSV_HEADER = 'currency,date,rate\r\n'
+
+
+def iter_rows(parser, currency_codes: List[str], start_date: datetime,
+              end_date: datetime) -> Iterator[Tuple[str, str, float]]:
+    """
+    Строки выгрузки (валюта, дата, курс) по валютам в порядке запроса
+
+    Дата фиатных курсов - день (YYYY-MM-DD), криптовалют - время точки в UTC
+    в ISO 8601 со смещением (2024-01-01T12:00:00+00:00).
+    """
+    for code in currency_codes:
+        if code in parser.CRYPTO_CURRENCIES:
+            for date_obj, rate in parser.iter_rates_history(code, start_date, end_date):
+                yield code, date_obj.astimezone(timezone.utc).isoformat(), rate
+        else:
+            for date_obj, rate in parser.iter_rates_history(code, start_date, end_date):
+                yield code, date_obj.strftime('%Y-%m-%d'), rate
+
+
+def format_row(export_format: str, row: Tuple[str, str, float]) -> str:
+    """Строка выгрузки в формате csv или ndjson"""
+    currency, date_str, rate = row
+    if export_format == 'csv':
+        return f'{currency},{date_str},{rate!r}\r\n'
+    return json.dumps({'currency': currency, 'date': date_str, 'rate': rate}) + '\n'
+
+
+def export_chunks(parser, currency_codes: List[str], start_date: datetime, end_date: datetime,
+                  export_format: str) -> Iterator[bytes]:
+    """
+    Части тела выгрузки
+
+    Ошибка источника посреди выгрузки пробрасывается: заголовки уже отправлены,
+    поэтому ответ обрывается, и клиент видит незавершённую передачу.
+
+    Args:
+        parser: Экземпляр CurrencyParser
+        currency_codes: Коды валют (уже проверенные)
+        start_date: Начальная дата
+        end_date: Конечная дата
+        export_format: csv или ndjson
+    """
+    lines = [CSV_HEADER] if export_format == 'csv' else []
+    for row in iter_rows(parser, currency_codes, start_date, end_date):
+        lines.append(format_row(export_format, row))
+        if len(lines) >= EXPORT_CHUNK_ROWS:
+            yield ''.join(lines).encode('utf-8')
+            lines = []
+    if lines:
+        yield ''.join(lines).encode('utf-8')
+
+
+def export_headers(currency_codes: List[str], start_date: datetime, end_date: datetime,
+                   export_format: str) -> Dict[str, str]:
+    """Заголовки ответа выгрузки: имя файла и запрет буферизации в прокси"""
+    filename = f"rates_{'-'.join(currency_codes)}_{start_date:%Y%m%d}_{end_date:%Y%m%d}.{export_format}"
+    if len(filename) > 120:
+        filename = f'rates_{start_date:%Y%m%d}_{end_date:%Y%m%d}.{export_format}'
+    return {
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Accel-Buffering': 'no',
+    }
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Фоновый прогрев текущих курсов
+- Курсы CoinGecko обновляются с заданным интервалом
+- Снимок ЦБ РФ обновляется, когда истекает его запись в кэше
+  (TTL выровнен по времени публикации курсов ЦБ РФ)
+- После каждого обновления курсы передаются подписчикам (рассылка SSE)
+- Запуск: поток внутри Flask (PREWARM_ENABLED=true или, пока есть
+  подписчики /api/currency/stream, subscribe/unsubscribe), cron Vercel
+  (/api/currency/prewarm) или CLI для cron, вызывающий тот же endpoint:
+    python rate_scheduler.py --url http://localhost:8000/api/currency/prewarm
+"""
+
+import argparse
+import hmac
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+import requests
+from dotenv import load_dotenv
+
+from currency_parser import CurrencyParser
+
+
+class RatePrewarmer:
+    """Периодически обновляет текущие курсы в кэше парсера"""
+
+    def __init__(self, parser: CurrencyParser, interval: Optional[float] = None):
+        """
+        Args:
+            parser: Парсер, кэш которого нужно держать прогретым
+            interval: Интервал обновления криптовалют в секундах (по умолчанию PREWARM_INTERVAL или 60)
+        """
+        self.parser = parser
+        self.interval = interval or float(os.getenv('PREWARM_INTERVAL', '60'))
+        self.last_rates: Dict[str, Dict[str, float]] = {}
+        self.listeners: List[Callable[[Dict[str, Dict[str, float]]], object]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._pinned = False
+        self._subscribers = 0
+
+    def refresh_once(self) -> Dict[str, Dict[str, float]]:
+        """Обновляет курсы CoinGecko и, если нужно, снимок ЦБ РФ"""
+        self.last_rates = self.parser.refresh_current_rates(
+            fiat=not self.parser.is_fiat_snapshot_fresh(),
+            crypto=True
+        )
+        for listener in self.listeners:
+            try:
+                listener(self.last_rates)
+            except Exception as e:
+                print(f"Ошибка обработчика обновления курсов: {e}")
+        return self.last_rates
+
+    def add_listener(self, listener: Callable[[Dict[str, Dict[str, float]]], object]):
+        """Подписывает функцию на обновления: она получает {'fiat': {...}, 'crypto': {...}}"""
+        self.listeners.append(listener)
+
+    def next_delay(self) -> float:
+        """Пауза до следующего обновления: интервал или ближайшая публикация ЦБ РФ"""
+        return min(self.interval, self.parser.seconds_until_cbr_publication())
+
+    def start(self):
+        """Запускает обновление в фоновом потоке до вызова stop()"""
+        with self._lock:
+            self._pinned = True
+            self._start_locked()
+
+    def stop(self):
+        """Останавливает фоновый поток"""
+        with self._lock:
+            self._pinned = False
+            self._stop.set()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=5)
+
+    def subscribe(self):
+        """Подписчик рассылки подключился: прогрев работает, пока есть подписчики"""
+        with self._lock:
+            self._subscribers += 1
+            self._start_locked()
+
+    def unsubscribe(self):
+        """Подписчик отключился: без подписчиков прогрев, запущенный не через start(), останавливается"""
+        with self._lock:
+            self._subscribers -= 1
+            if self._subscribers == 0 and not self._pinned:
+                # Поток завершится после текущего обновления, ждать его не нужно
+                self._stop.set()
+
+    def _start_locked(self):
+        """Запускает поток или отменяет ещё не завершённую остановку (под блокировкой)"""
+        self._stop.clear()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='rate-prewarmer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._stop.is_set():
+                    self._thread = None
+                    return
+            try:
+                self.refresh_once()
+            except Exception as e:
+                print(f"Ошибка прогрева курсов: {e}")
+            self._stop.wait(self.next_delay())
+
+
+def is_prewarm_enabled() -> bool:
+    """Включён ли фоновый прогрев (PREWARM_ENABLED=true)"""
+    return os.getenv('PREWARM_ENABLED', 'False').lower() == 'true'
+
+
+def is_authorized_cron_request(authorization: Optional[str]) -> bool:
+    """
+    Проверяет заголовок Authorization cron-запроса (Bearer CRON_SECRET)
+
+    Без CRON_SECRET запрос отклоняется: иначе любой мог бы заставлять сервер
+    обращаться к источникам в обход кэша.
+    """
+    secret = os.getenv('CRON_SECRET')
+    if not secret or not authorization:
+        return False
+    return hmac.compare_digest(authorization.encode(), f'Bearer {secret}'.encode())
+
+
+def main():
+    load_dotenv()
+    host = os.getenv('HOST', 'localhost')
+    port = os.getenv('PORT', '8000')
+
+    arg_parser = argparse.ArgumentParser(
+        description='Прогрев кэша текущих курсов на работающем сервере (для cron)'
+    )
+    arg_parser.add_argument(
+        '--url',
+        default=f'http://{host}:{port}/api/currency/prewarm',
+        help='Адрес endpoint прогрева'
+    )
+    args = arg_parser.parse_args()
+
+    secret = os.getenv('CRON_SECRET')
+    if not secret:
+        arg_parser.error('не задан CRON_SECRET: без него сервер отклоняет запросы прогрева')
+    headers = {'Authorization': f'Bearer {secret}'}
+
+    response = requests.get(args.url, headers=headers, timeout=60)
+    response.raise_for_status()
+    data = response.json()
+    print(f"Обновлено: {len(data['rates']['fiat'])} фиатных, {len(data['rates']['crypto'])} криптовалютных курсов")
+
+
+if __name__ == '__main__':
+    main()
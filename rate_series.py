@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Колоночный ряд курсов одной валюты
+- Время (unix timestamp) и курсы хранятся в непрерывных массивах float64:
+  numpy (указан в requirements.txt, импортируется при первом построении ряда),
+  без него - array('d') из стандартной библиотеки
+- Срез по датам - бинарный поиск, min/max/last - без обхода записей в Python
+- Дополнительные колонки (open/high/low для свечей, номинал котировки ЦБ РФ) той же длины
+- Экспорт в JSON-массивы для ответов API
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+_numpy = None
+_numpy_loaded = False
+
+
+def _np():
+    """
+    Модуль numpy или None, если он не установлен
+
+    Импортируется при первом построении ряда, а не при загрузке модуля:
+    импорт numpy занимает десятки миллисекунд на каждом холодном старте,
+    даже если запрос рядов не строит (/api/currency/current, статика).
+    """
+    global _numpy, _numpy_loaded
+    if not _numpy_loaded:
+        try:
+            import numpy
+        except ImportError:  # numpy - необязательная зависимость
+            numpy = None
+        _numpy, _numpy_loaded = numpy, True
+    return _numpy
+
+
+def _to_array(values: Iterable[float]):
+    """Непрерывный массив float64"""
+    np = _np()
+    if np is not None:
+        if not isinstance(values, (np.ndarray, array, list)):
+            values = list(values)
+        return np.asarray(values, dtype=np.float64)
+    return values if isinstance(values, array) else array('d', values)
+
+
+class RateSeries:
+    """Ряд курсов валюты, упорядоченный по времени"""
+
+    __slots__ = ('currency', 'timestamps', 'values', 'columns')
+
+    def __init__(self, currency: str, timestamps: Iterable[float], values: Iterable[float],
+                 columns: Optional[Dict[str, Iterable[float]]] = None):
+        """
+        Args:
+            currency: Код валюты (или пары для кросс-курса)
+            timestamps: Время точек (unix timestamp) по возрастанию
+            values: Курсы (курс закрытия для свечей)
+            columns: Дополнительные колонки той же длины, например open/high/low
+        """
+        self.currency = currency
+        self.timestamps = _to_array(timestamps)
+        self.values = _to_array(values)
+        self.columns = {name: _to_array(column) for name, column in (columns or {}).items()}
+
+    @classmethod
+    def empty(cls, currency: str) -> 'RateSeries':
+        """Пустой ряд (признак отсутствия данных)"""
+        return cls(currency, [], [])
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple], currency: str, columns: Sequence[str] = ()) -> 'RateSeries':
+        """
+        Ряд из пар (дата, курс) в порядке дат, за один проход
+
+        Args:
+            pairs: Кортежи (дата, курс) или (дата, курс, значения колонок columns...)
+            currency: Код валюты
+            columns: Имена дополнительных колонок, например ('nominal',)
+        """
+        timestamps = array('d')
+        values = array('d')
+        extra = [array('d') for _ in columns]
+        for date_obj, rate, *other in pairs:
+            timestamps.append(date_obj.timestamp())
+            values.append(rate)
+            for column, value in zip(extra, other):
+                column.append(value)
+        return cls(currency, timestamps, values, dict(zip(columns, extra)))
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict], currency: str) -> 'RateSeries':
+        """Ряд из записей {'date', 'rate'} в порядке дат"""
+        return cls.from_pairs(((record['date'], record['rate']) for record in records), currency)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __bool__(self) -> bool:
+        return len(self.values) > 0
+
+    def __getitem__(self, index: slice) -> 'RateSeries':
+        """Срез по позициям (без копирования данных для numpy)"""
+        if not isinstance(index, slice):
+            raise TypeError('RateSeries поддерживает только срезы; для точки используйте date_at()')
+        return RateSeries(
+            self.currency,
+            self.timestamps[index],
+            self.values[index],
+            {name: column[index] for name, column in self.columns.items()}
+        )
+
+    def __iter__(self) -> Iterator[Tuple[datetime, float]]:
+        """Пары (дата, курс)"""
+        for timestamp, value in zip(self.timestamps, self.values):
+            yield datetime.fromtimestamp(timestamp), float(value)
+
+    def slice(self, start: datetime, end: datetime) -> 'RateSeries':
+        """Точки с датами в диапазоне [start, end] (бинарный поиск по времени)"""
+        low, high = start.timestamp(), end.timestamp()
+        np = _np()
+        if np is not None:
+            left = int(np.searchsorted(self.timestamps, low, side='left'))
+            right = int(np.searchsorted(self.timestamps, high, side='right'))
+        else:
+            left = bisect_left(self.timestamps, low)
+            right = bisect_right(self.timestamps, high)
+        return self[left:right]
+
+    def date_at(self, position: int) -> datetime:
+        """Дата точки по позиции (поддерживаются отрицательные позиции)"""
+        return datetime.fromtimestamp(self.timestamps[position])
+
+    def last_date(self) -> Optional[datetime]:
+        """Дата последней точки"""
+        return self.date_at(-1) if self else None
+
+    def last(self) -> Optional[float]:
+        """Последний курс"""
+        return float(self.values[-1]) if self else None
+
+    def min(self, column: Optional[str] = None) -> Optional[float]:
+        """Минимум курса (или колонки, например low)"""
+        data = self.columns[column] if column else self.values
+        if not len(data):
+            return None
+        return float(data.min()) if _np() is not None else min(data)
+
+    def max(self, column: Optional[str] = None) -> Optional[float]:
+        """Максимум курса (или колонки, например high)"""
+        data = self.columns[column] if column else self.values
+        if not len(data):
+            return None
+        return float(data.max()) if _np() is not None else max(data)
+
+    def dates(self) -> List[datetime]:
+        """Даты точек"""
+        return [datetime.fromtimestamp(timestamp) for timestamp in self.timestamps]
+
+    def format_dates(self, date_format: str) -> List[str]:
+        """Даты точек в виде строк"""
+        return [datetime.fromtimestamp(timestamp).strftime(date_format) for timestamp in self.timestamps]
+
+    def to_list(self, column: Optional[str] = None) -> List[float]:
+        """Курсы (или колонка) в виде списка для JSON"""
+        return (self.columns[column] if column else self.values).tolist()
+
+    def to_json(self, date_format: str, columns: Sequence[str] = ()) -> Dict[str, List]:
+        """Массивы {'dates': [...], 'rates': [...], колонка: [...]} для ответа API"""
+        data = {'dates': self.format_dates(date_format), 'rates': self.to_list()}
+        for name in columns:
+            data[name] = self.to_list(name)
+        return data
+
+    def to_records(self) -> List[Dict]:
+        """Записи {'date', 'rate', 'currency'} (прежний формат истории)"""
+        return [{'date': date_obj, 'rate': rate, 'currency': self.currency} for date_obj, rate in self]
+
+    def nbytes(self) -> int:
+        """Объём данных массивов в байтах"""
+        arrays = [self.timestamps, self.values, *self.columns.values()]
+        if _np() is not None:
+            return sum(data.nbytes for data in arrays)
+        return sum(data.itemsize * len(data) for data in arrays)
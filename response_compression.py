@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Сжатие ответов API и страниц для app.py и api/index.py
+- gzip и brotli (если установлен) по заголовку Accept-Encoding
+- Маленькие ответы и несжимаемые типы отдаются как есть
+- Сжатые тела повторяющихся ответов берутся из кэша
+- ETag сжатого ответа становится слабым (W/"..."): байты на проводе
+  отличаются от несжатого варианта, но смысл ответа тот же
+"""
+
+import gzip
+from typing import Dict, Optional
+
+from http_caching import make_etag, negotiate_encoding
+from rate_cache import TTLCache
+
+try:
+    import brotli
+except ImportError:  # brotli - необязательная зависимость
+    brotli = None
+
+# Сжатия в порядке предпочтения сервера
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+# Ответы меньше порога не сжимаются: выигрыш меньше накладных расходов
+MIN_COMPRESS_SIZE = 1024
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+# Уровни сжатия для ответов, которые сжимаются на лету
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Кэш сжатых тел: (ETag несжатого тела, сжатие) -> байты
+COMPRESSED_CACHE_TTL = 600
+_compressed_cache = TTLCache(max_size=128)
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """
+    Сжимает данные
+
+    Args:
+        data: Исходные байты
+        encoding: gzip или br
+        level: Уровень сжатия (по умолчанию GZIP_LEVEL / BROTLI_QUALITY)
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY if level is None else level)
+    # mtime=0 - одинаковые данные дают одинаковые байты
+    return gzip.compress(data, compresslevel=GZIP_LEVEL if level is None else level, mtime=0)
+
+
+def is_compressible(content_type: Optional[str], size: int) -> bool:
+    """Стоит ли сжимать ответ такого типа и размера"""
+    return bool(content_type) and size >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def select_encoding(accept_encoding: Optional[str], content_type: Optional[str], size: int) -> Optional[str]:
+    """Сжатие для ответа или None, если его нужно отдать как есть"""
+    if not is_compressible(content_type, size):
+        return None
+    return negotiate_encoding(accept_encoding, ENCODINGS)
+
+
+def apply_encoding_headers(headers: Dict[str, str], content_type: Optional[str], size: int,
+                           encoding: Optional[str]):
+    """
+    Дополняет заголовки ответа: Vary, Content-Encoding и слабый ETag для сжатого тела
+
+    Args:
+        headers: Заголовки ответа (изменяются на месте)
+        content_type: Тип содержимого ответа
+        size: Размер несжатого тела
+        encoding: Выбранное сжатие из select_encoding()
+    """
+    if not is_compressible(content_type, size):
+        return
+    headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        headers['Content-Encoding'] = encoding
+        etag = headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            headers['ETag'] = f'W/{etag}'
+
+
+def compress_body(body: bytes, encoding: str, etag: Optional[str] = None) -> bytes:
+    """
+    Сжатое тело ответа (из кэша, если такой ответ уже сжимался)
+
+    Args:
+        body: Несжатое тело
+        encoding: gzip или br
+        etag: ETag несжатого тела, если уже посчитан
+    """
+    key = (etag or make_etag(body), encoding)
+    return _compressed_cache.get_or_load(key, lambda: compress(body, encoding), COMPRESSED_CACHE_TTL)
+
+
+def compression_stats() -> Dict[str, int]:
+    """Счётчики кэша сжатых тел для метрик"""
+    return _compressed_cache.stats()
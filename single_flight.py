@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Объединение одинаковых одновременных запросов (single-flight)
+- Первый вызов с ключом выполняет функцию, остальные ждут его результата
+- Исключение первого вызова получают все ожидающие
+- Счётчики позволяют видеть, сколько запросов было объединено
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Call:
+    """Выполняющийся вызов и его результат"""
+
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Потокобезопасное объединение одинаковых вызовов"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'executed': 0, 'merged': 0, 'errors': 0}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Выполняет fn или присоединяется к уже выполняющемуся вызову с тем же ключом
+
+        Args:
+            key: Ключ запроса (например, URL и параметры)
+            fn: Функция, выполняющая запрос
+
+        Returns:
+            Результат fn, общий для всех одновременных вызовов
+        """
+        with self._lock:
+            self._stats['calls'] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._stats['merged'] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._stats['executed'] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+        return call.result
+
+    def stats(self) -> Dict[str, int]:
+        """Счётчики вызовов для мониторинга"""
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Отчёт о времени импорта точек входа и проверка бюджета холодного старта
+- Каждая точка входа импортируется в отдельном процессе с python -X importtime
+- Выводится время импорта модулей, которые точка входа загружает напрямую
+- Если время импорта превышает бюджет, скрипт завершается с кодом 1;
+  в тестах бюджет проверяет tests/test_startup_budget.py
+    python startup_budget.py
+    python startup_budget.py --entry api.index --runs 5 --top 15
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Бюджет времени импорта точек входа (миллисекунды)
+STARTUP_BUDGETS_MS = {
+    'api.index': 150,  # Vercel: платится на каждом холодном старте
+    'app': 1500,  # Flask: долгоживущий процесс
+}
+
+
+def measure_imports(module: str) -> Tuple[float, List[Tuple[str, float, float, int]]]:
+    """
+    Импортирует модуль в отдельном процессе с -X importtime
+
+    Args:
+        module: Имя модуля точки входа (например, api.index)
+
+    Returns:
+        Кортеж (общее время импорта модуля в мс, [(модуль, собственное время в мс,
+        накопленное время в мс, глубина вложенности), ...])
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'Не удалось импортировать {module}:\n{result.stderr}')
+
+    records = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        records.append((name.strip(), int(self_us) / 1000, int(cumulative_us) / 1000, depth))
+
+    # Запись модуля точки входа идёт после всех его зависимостей
+    for index in range(len(records) - 1, -1, -1):
+        if records[index][0] == module and records[index][3] == 0:
+            break
+    else:
+        raise RuntimeError(f'В выводе -X importtime нет модуля {module}')
+
+    # Зависимости точки входа - записи между предыдущим модулем верхнего уровня и ей
+    start = index
+    while start > 0 and records[start - 1][3] > 0:
+        start -= 1
+    return records[index][2], records[start:index + 1]
+
+
+def report(module: str, runs: int, top: int) -> float:
+    """Печатает отчёт по точке входа и возвращает лучшее время импорта в мс"""
+    best_total, best_records = None, []
+    for _ in range(runs):
+        total, records = measure_imports(module)
+        if best_total is None or total < best_total:
+            best_total, best_records = total, records
+
+    direct: Dict[str, Tuple[float, float]] = {
+        name: (self_ms, cumulative_ms)
+        for name, self_ms, cumulative_ms, depth in best_records if depth == 1
+    }
+    print(f'{module}: {best_total:.1f} мс (лучший из {runs} запусков)')
+    print(f"  {'модуль':<40} {'собственное':>12} {'накопленное':>12}")
+    for name, (self_ms, cumulative_ms) in sorted(direct.items(), key=lambda item: -item[1][1])[:top]:
+        print(f'  {name:<40} {self_ms:>9.1f} мс {cumulative_ms:>9.1f} мс')
+    return best_total
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description='Время импорта точек входа и проверка бюджета холодного старта'
+    )
+    arg_parser.add_argument(
+        '--entry',
+        action='append',
+        choices=sorted(STARTUP_BUDGETS_MS),
+        help='Точка входа (по умолчанию все)'
+    )
+    arg_parser.add_argument('--runs', type=int, default=3, help='Число запусков, берётся лучший')
+    arg_parser.add_argument('--top', type=int, default=10, help='Сколько модулей показать')
+    arg_parser.add_argument(
+        '--budget-ms',
+        type=float,
+        help='Бюджет в мс вместо значения по умолчанию для точки входа'
+    )
+    args = arg_parser.parse_args()
+
+    failed = []
+    for module in args.entry or list(STARTUP_BUDGETS_MS):
+        budget = args.budget_ms or STARTUP_BUDGETS_MS[module]
+        total = report(module, max(args.runs, 1), args.top)
+        status = 'OK' if total <= budget else 'ПРЕВЫШЕН'
+        print(f'  бюджет {budget:.0f} мс: {status}\n')
+        if total > budget:
+            failed.append(module)
+
+    if failed:
+        print(f"Бюджет времени запуска превышен: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Отдача статических файлов (фоны, favicon) для app.py и api/index.py
+- Индекс метаданных файлов в памяти: размер, время изменения, ETag, тип
+- Content-Length, сильный ETag, Last-Modified и ответ 304 на условный запрос
+- Долгое кэширование (immutable) для имён с хэшем содержимого, например bg.3f2a9c1d.webp
+- Range-запросы (один диапазон) с ответом 206 и проверкой If-Range
+- Файл отдаётся частями, без чтения целиком в память
+- Список файлов каталога кэшируется до изменения mtime каталога
+"""
+
+import hashlib
+import os
+import re
+import threading
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple
+
+from http_caching import cache_control, http_date, is_not_modified
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+CONTENT_TYPES = {
+    '.svg': 'image/svg+xml',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.webp': 'image/webp',
+    '.gif': 'image/gif',
+    '.ico': 'image/vnd.microsoft.icon',
+}
+
+# Имя с хэшем содержимого: такой файл никогда не меняется
+FINGERPRINT_RE = re.compile(r'\.[0-9a-f]{8,}\.[A-Za-z0-9]+$')
+
+# Один диапазон байтов: bytes=0-499, bytes=500-, bytes=-500
+RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)')
+
+IMMUTABLE_CACHE_CONTROL = cache_control(31536000, immutable=True)
+ASSET_CACHE_CONTROL = cache_control(3600, 86400)
+LISTING_CACHE_CONTROL = cache_control(300, 3600)
+
+BACKGROUND_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.svg')
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class AssetInfo:
+    """Метаданные файла"""
+
+    __slots__ = ('path', 'size', 'mtime', 'etag', 'content_type', 'cache_control')
+
+    def __init__(self, path: str, name: str, stat: os.stat_result):
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.content_type = CONTENT_TYPES.get(os.path.splitext(name)[1].lower(), 'application/octet-stream')
+        self.cache_control = IMMUTABLE_CACHE_CONTROL if FINGERPRINT_RE.search(name) else ASSET_CACHE_CONTROL
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        self.etag = '"' + digest.hexdigest()[:32] + '"'
+
+
+class AssetResponse:
+    """Ответ на запрос файла: статус, заголовки и диапазон байтов для отправки"""
+
+    __slots__ = ('status', 'headers', 'path', 'offset', 'length')
+
+    def __init__(self, status: int, headers: Dict[str, str], path: str = '', offset: int = 0, length: int = 0):
+        self.status = status
+        self.headers = headers
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Разбирает заголовок Range с одним диапазоном байтов
+
+    Args:
+        range_header: Значение заголовка Range
+        size: Размер файла
+
+    Returns:
+        (начало, конец включительно); None - отдать файл целиком
+        (нет заголовка, несколько диапазонов или неверный синтаксис)
+
+    Raises:
+        ValueError: Диапазон не пересекается с файлом (ответ 416)
+    """
+    match = RANGE_RE.fullmatch(range_header.strip()) if range_header else None
+    if not match or not any(match.groups()):
+        return None
+
+    first, last = match.groups()
+    if not first:
+        # bytes=-N - последние N байт
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError('Пустой диапазон')
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size:
+        raise ValueError('Диапазон за пределами файла')
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def iter_file(path: str, offset: int, length: int, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    """Читает диапазон файла частями"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class StaticAssetServer:
+    """Отдача файлов из каталога с индексом метаданных в памяти"""
+
+    def __init__(self, root_dir: str = STATIC_DIR):
+        self.root_dir = os.path.realpath(root_dir)
+        self._index: Dict[str, AssetInfo] = {}
+        self._listings: Dict[Tuple[str, str, Tuple[str, ...]], Tuple[int, List[str]]] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, name: str) -> Optional[AssetInfo]:
+        """
+        Метаданные файла по имени относительно корня (None - нет файла или путь вне корня)
+
+        ETag пересчитывается, только если у файла изменились размер или время изменения.
+        """
+        path = os.path.realpath(os.path.join(self.root_dir, name))
+        if os.path.commonpath([path, self.root_dir]) != self.root_dir:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        info = self._index.get(name)
+        if info is None or info.size != stat.st_size or info.mtime != stat.st_mtime:
+            info = AssetInfo(path, name, stat)
+            with self._lock:
+                self._index[name] = info
+        return info
+
+    def respond(self, name: str, request_headers: Mapping) -> Optional[AssetResponse]:
+        """
+        Готовит ответ на запрос файла
+
+        Args:
+            name: Имя файла относительно корня (например, backgrounds/vercel_bg_1.svg)
+            request_headers: Заголовки запроса (Flask request.headers или BaseHTTPRequestHandler.headers)
+
+        Returns:
+            AssetResponse (200, 206, 304 или 416) или None, если файла нет
+        """
+        info = self.lookup(name)
+        if info is None:
+            return None
+
+        headers = {
+            'Content-Type': info.content_type,
+            'ETag': info.etag,
+            'Last-Modified': http_date(info.mtime),
+            'Cache-Control': info.cache_control,
+            'Accept-Ranges': 'bytes',
+        }
+        if is_not_modified(request_headers, headers):
+            return AssetResponse(304, headers)
+
+        # If-Range: диапазон отдаётся, только если у клиента та же версия файла
+        range_header = request_headers.get('Range')
+        if_range = request_headers.get('If-Range')
+        if if_range and if_range not in (info.etag, headers['Last-Modified']):
+            range_header = None
+
+        try:
+            byte_range = parse_range(range_header, info.size)
+        except ValueError:
+            headers['Content-Range'] = f'bytes */{info.size}'
+            headers['Content-Length'] = '0'
+            return AssetResponse(416, headers)
+
+        if byte_range is None:
+            headers['Content-Length'] = str(info.size)
+            return AssetResponse(200, headers, info.path, 0, info.size)
+
+        start, end = byte_range
+        headers['Content-Range'] = f'bytes {start}-{end}/{info.size}'
+        headers['Content-Length'] = str(end - start + 1)
+        return AssetResponse(206, headers, info.path, start, end - start + 1)
+
+    def list_files(self, subdir: str, prefix: str, extensions: Tuple[str, ...]) -> List[str]:
+        """
+        Отсортированные имена файлов каталога с заданным префиксом и расширением
+
+        Список кэшируется для каждого префикса и пересчитывается,
+        только когда меняется mtime каталога (файл добавлен, удалён или переименован).
+
+        Args:
+            subdir: Каталог относительно корня (например, backgrounds)
+            prefix: Префикс имени файла (например, vercel_bg)
+            extensions: Допустимые расширения в нижнем регистре
+        """
+        path = os.path.join(self.root_dir, subdir)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return []
+
+        key = (subdir, prefix, extensions)
+        cached = self._listings.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        names = sorted(
+            name for name in os.listdir(path)
+            if name.startswith(prefix) and name.lower().endswith(extensions)
+        )
+        with self._lock:
+            self._listings[key] = (mtime, names)
+        return names
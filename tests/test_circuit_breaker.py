@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Автомат защиты источников и повторы запросов
+- Переходы closed -> open -> half_open -> closed/open
+- Retry-After и освобождение пробного запроса
+- CurrencyParser._request против локального HTTP-сервера: один отказ на запрос
+    python -m pytest tests/test_circuit_breaker.py
+"""
+
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from requests.exceptions import HTTPError
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError, RetryPolicy, parse_retry_after
+from currency_parser import CurrencyParser
+from history_store import HistoryStore
+
+
+def trip(breaker: CircuitBreaker):
+    """Размыкает автомат серией отказов"""
+    for _ in range(breaker.failure_threshold):
+        breaker.before_request()
+        breaker.record_failure()
+
+
+def test_opens_after_threshold_and_rejects():
+    breaker = CircuitBreaker('test', failure_threshold=3, recovery_timeout=60)
+    for _ in range(2):
+        breaker.before_request()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.before_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    assert breaker.stats()['rejected'] == 1
+
+
+def test_success_resets_consecutive_failures():
+    breaker = CircuitBreaker('test', failure_threshold=3)
+    for _ in range(2):
+        breaker.before_request()
+        breaker.record_failure()
+    breaker.before_request()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.before_request()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_allows_single_probe():
+    breaker = CircuitBreaker('test', failure_threshold=2, recovery_timeout=0)
+    trip(breaker)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    breaker.before_request()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_request()
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker('test', failure_threshold=2, recovery_timeout=0)
+    trip(breaker)
+    breaker.before_request()
+    breaker.recovery_timeout = 60
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_release_frees_probe_without_counting_failure():
+    breaker = CircuitBreaker('test', failure_threshold=2, recovery_timeout=0)
+    trip(breaker)
+    breaker.before_request()
+    breaker.release()
+    assert breaker.stats()['failures'] == 2
+    breaker.before_request()
+
+
+def test_retry_after_alone_does_not_open():
+    breaker = CircuitBreaker('test', failure_threshold=3, recovery_timeout=30)
+    breaker.before_request()
+    breaker.record_failure(retry_after=600)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_retry_after_extends_open_window_when_tripping():
+    breaker = CircuitBreaker('test', failure_threshold=1, recovery_timeout=30)
+    breaker.before_request()
+    breaker.record_failure(retry_after=600)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.stats()['retry_in'] > 500
+
+
+def test_retry_policy_limits():
+    policy = RetryPolicy(max_attempts=3, base_delay=0.1, max_delay=1.0, budget_max=1.0)
+    assert policy.next_delay(3) is None
+    assert policy.next_delay(1, retry_after=5.0) is None
+    assert policy.next_delay(1, retry_after=0.5) == 0.5
+    # Бюджет повторов исчерпан
+    assert policy.next_delay(1) is None
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('120') == 120.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('not a date') is None
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+
+
+class _UnavailableHandler(BaseHTTPRequestHandler):
+    """Источник, который всегда отвечает 503"""
+
+    retry_after = None
+    requests = 0
+
+    def do_GET(self):
+        type(self).requests += 1
+        self.send_response(503)
+        if self.retry_after is not None:
+            self.send_header('Retry-After', self.retry_after)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def unavailable_upstream():
+    """Локальный сервер вместо ЦБ РФ; возвращает (обработчик, URL)"""
+    handler = type('Handler', (_UnavailableHandler,), {'retry_after': None, 'requests': 0})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield handler, f'http://127.0.0.1:{server.server_address[1]}/scripts/XML_daily.asp'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def parser(tmp_path):
+    parser = CurrencyParser(history_store=HistoryStore(str(tmp_path / 'history.sqlite3')))
+    parser.retry_policy = RetryPolicy(max_attempts=3, base_delay=0.0)
+    return parser
+
+
+def test_request_counts_one_failure_after_retries(parser, unavailable_upstream):
+    handler, url = unavailable_upstream
+    for _ in range(2):
+        with pytest.raises(HTTPError):
+            parser._request(url)
+
+    stats = parser.breakers['cbr'].stats()
+    assert handler.requests == 6
+    assert stats['failures'] == 2
+    assert stats['state'] == CircuitBreaker.CLOSED
+
+
+def test_request_long_retry_after_does_not_open(parser, unavailable_upstream):
+    handler, url = unavailable_upstream
+    handler.retry_after = '120'
+    with pytest.raises(HTTPError):
+        parser._request(url)
+
+    assert handler.requests == 1
+    assert parser.breakers['cbr'].state == CircuitBreaker.CLOSED
+
+
+def test_request_releases_probe_on_unexpected_error(parser):
+    breaker = parser.breakers['cbr']
+    breaker.recovery_timeout = 0
+    trip(breaker)
+
+    def broken_get(*args, **kwargs):
+        raise RuntimeError('boom')
+
+    parser.session.get = broken_get
+    with pytest.raises(RuntimeError):
+        parser._request(parser.CBR_API_DAILY)
+    breaker.before_request()
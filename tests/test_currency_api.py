@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Общая логика API и история курсов ЦБ РФ против локального HTTP-сервера
+- Политика кэширования снимков на даты
+- Кросс-курс по истории с номиналом каждой записи
+    python -m pytest tests/test_currency_api.py
+"""
+
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from cross_rates import CrossRateEngine
+from currency_api import snapshots_caching
+from currency_parser import CurrencyParser
+from history_store import HistoryStore
+from http_caching import NO_STORE
+
+# Записи XML_dynamic.asp: {ID валюты: [(дата, номинал, курс за номинал)]}
+# У JPY номинал меняется со 100 на 1, курс за единицу почти не меняется
+DYNAMIC_RECORDS = {
+    'R01820': [('09.01.2024', 100, '60,0000'), ('10.01.2024', 1, '0,6100')],
+    'R01235': [('09.01.2024', 1, '90,0000'), ('10.01.2024', 1, '90,0000')],
+}
+
+
+class _CbrHandler(BaseHTTPRequestHandler):
+    """Минимальный XML_dynamic.asp"""
+
+    def do_GET(self):
+        valute_id = parse_qs(urlparse(self.path).query).get('VAL_NM_RQ', [''])[0]
+        records = ''.join(
+            f'<Record Date="{day}" Id="{valute_id}"><Nominal>{nominal}</Nominal><Value>{value}</Value></Record>'
+            for day, nominal, value in DYNAMIC_RECORDS.get(valute_id, [])
+        )
+        body = f'<?xml version="1.0" encoding="windows-1251"?><ValCurs ID="{valute_id}">{records}</ValCurs>'.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def parser(tmp_path):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _CbrHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    parser = CurrencyParser(history_store=HistoryStore(str(tmp_path / 'history.sqlite3')))
+    parser.CBR_API_HISTORY = f'http://127.0.0.1:{server.server_address[1]}/scripts/XML_dynamic.asp'
+    yield parser
+    server.shutdown()
+    server.server_close()
+
+
+def test_past_snapshots_immutable_only_when_all_loaded(parser):
+    dates = [datetime(2024, 1, 9), datetime(2024, 1, 10)]
+    loaded = {'2024-01-09': {'success': True}, '2024-01-10': {'success': True}}
+    cache_control, last_modified = snapshots_caching(parser, dates, loaded)
+    assert cache_control.endswith('immutable')
+    assert last_modified is not None
+
+    failed = dict(loaded, **{'2024-01-10': {'success': False, 'error': 'upstream'}})
+    assert snapshots_caching(parser, dates, failed) == (NO_STORE, None)
+
+
+def test_today_snapshot_not_immutable(parser):
+    today = datetime.now()
+    cache_control, _ = snapshots_caching(parser, [today - timedelta(days=3), today],
+                                         {'past': {'success': True}, 'today': {'success': True}})
+    assert 'immutable' not in cache_control
+
+
+def test_fiat_history_keeps_record_nominal(parser):
+    history = parser.get_fiat_rates_history('JPY', datetime(2024, 1, 9), datetime(2024, 1, 10))
+    assert history.to_list() == [60.0, 0.61]
+    assert history.to_list('nominal') == [100.0, 1.0]
+
+
+def test_cross_history_divides_by_record_nominal(parser):
+    series = CrossRateEngine(parser).get_history('JPY', 'USD', datetime(2024, 1, 9), datetime(2024, 1, 10))
+    assert series.currency == 'JPY/USD'
+    assert series.to_list() == pytest.approx([0.6 / 90, 0.61 / 90])
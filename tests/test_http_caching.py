@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+HTTP-кэширование ответов API
+- Cache-Control, ETag и Last-Modified
+- Условные запросы (304 Not Modified)
+- Выбор сжатия по Accept-Encoding
+    python -m pytest tests/test_http_caching.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from http_caching import cache_control, caching_headers, http_date, is_not_modified, make_etag, negotiate_encoding
+
+
+def test_cache_control_values():
+    assert cache_control(60) == 'public, max-age=60'
+    assert cache_control(60, 300, stale_while_revalidate=600) == (
+        'public, max-age=60, s-maxage=300, stale-while-revalidate=600'
+    )
+    assert cache_control(86400, 30 * 86400, immutable=True).endswith(', immutable')
+    assert cache_control(-5, -1) == 'public, max-age=0, s-maxage=0'
+
+
+def test_etag_depends_on_body():
+    assert make_etag(b'{"a": 1}') == make_etag(b'{"a": 1}')
+    assert make_etag(b'{"a": 1}') != make_etag(b'{"a": 2}')
+    assert make_etag(b'').startswith('"') and make_etag(b'').endswith('"')
+
+
+def test_last_modified_not_in_future():
+    headers = caching_headers(b'body', 'no-store', last_modified=time.time() + 3600)
+    assert headers['Last-Modified'] == http_date(time.time())
+    assert 'Last-Modified' not in caching_headers(b'body', 'no-store')
+
+
+def test_if_none_match():
+    headers = caching_headers(b'body', 'public, max-age=60')
+    etag = headers['ETag']
+    assert is_not_modified({'If-None-Match': etag}, headers)
+    assert is_not_modified({'If-None-Match': f'"other", W/{etag}'}, headers)
+    assert is_not_modified({'If-None-Match': '*'}, headers)
+    assert not is_not_modified({'If-None-Match': '"other"'}, headers)
+
+
+def test_if_modified_since():
+    published = time.time() - 86400
+    headers = caching_headers(b'body', 'public, max-age=60', last_modified=published)
+    assert is_not_modified({'If-Modified-Since': http_date(published)}, headers)
+    assert is_not_modified({'If-Modified-Since': http_date(published + 60)}, headers)
+    assert not is_not_modified({'If-Modified-Since': http_date(published - 60)}, headers)
+    assert not is_not_modified({'If-Modified-Since': 'garbage'}, headers)
+
+
+def test_if_none_match_takes_precedence():
+    published = time.time() - 86400
+    headers = caching_headers(b'body', 'public, max-age=60', last_modified=published)
+    request_headers = {'If-None-Match': '"other"', 'If-Modified-Since': http_date(published)}
+    assert not is_not_modified(request_headers, headers)
+
+
+def test_negotiate_encoding():
+    assert negotiate_encoding('gzip, deflate, br', ('br', 'gzip')) == 'br'
+    assert negotiate_encoding('gzip;q=1.0, br;q=0.5', ('br', 'gzip')) == 'gzip'
+    assert negotiate_encoding('br;q=0, gzip', ('br', 'gzip')) == 'gzip'
+    assert negotiate_encoding('*', ('br', 'gzip')) == 'br'
+    assert negotiate_encoding('identity', ('br', 'gzip')) is None
+    assert negotiate_encoding(None, ('br', 'gzip')) is None
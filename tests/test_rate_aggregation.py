@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Агрегация и прореживание рядов курсов
+- aggregate_history: курс закрытия и свечи OHLC по интервалам
+- downsample: LTTB для линии, объединение соседних свечей для OHLC
+    python -m pytest tests/test_rate_aggregation.py
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rate_aggregation import aggregate_history, downsample, lttb_indices
+from rate_series import RateSeries
+
+
+def hourly_series(values, start=datetime(2024, 1, 1)):
+    """Почасовой ряд с заданными курсами"""
+    return RateSeries.from_pairs(
+        ((start + timedelta(hours=index), value) for index, value in enumerate(values)), 'BTC'
+    )
+
+
+def test_daily_close_and_ohlc():
+    series = hourly_series([10.0, 12.0, 9.0, 11.0] * 6 + [20.0, 18.0])
+    daily = aggregate_history(series, 'daily', ohlc=True)
+
+    assert len(daily) == 2
+    assert daily.to_list() == [11.0, 18.0]
+    assert daily.to_list('open') == [10.0, 20.0]
+    assert daily.to_list('high') == [12.0, 20.0]
+    assert daily.to_list('low') == [9.0, 18.0]
+    assert daily.date_at(1) == datetime(2024, 1, 2)
+
+
+def test_raw_resolution_keeps_series():
+    series = hourly_series([1.0, 2.0, 3.0])
+    assert aggregate_history(series, 'raw') is series
+
+
+def test_downsample_short_series_unchanged():
+    series = hourly_series([1.0, 2.0, 3.0])
+    assert downsample(series, 10) is series
+
+
+def test_lttb_keeps_endpoints_and_spike():
+    values = [100.0] * 1000
+    values[537] = 500.0
+    series = hourly_series(values)
+
+    points = downsample(series, 50)
+    assert len(points) == 50
+    assert points.timestamps[0] == series.timestamps[0]
+    assert points.timestamps[-1] == series.timestamps[-1]
+    assert 500.0 in points.to_list()
+    assert list(points.timestamps) == sorted(points.timestamps)
+
+
+def test_lttb_indices_are_increasing_and_bounded():
+    timestamps = [float(index) for index in range(101)]
+    values = [float(index % 7) for index in range(101)]
+    indices = lttb_indices(timestamps, values, 10)
+
+    assert len(indices) == 10
+    assert indices[0] == 0 and indices[-1] == 100
+    assert indices == sorted(set(indices))
+
+
+def test_ohlc_downsample_keeps_extremes():
+    values = [100.0 + (index % 5) for index in range(240)]
+    values[100] = 300.0
+    values[200] = 10.0
+    candles = aggregate_history(hourly_series(values), 'hourly', ohlc=True)
+
+    points = downsample(candles, 12)
+    assert len(points) == 12
+    assert points.max('high') == 300.0
+    assert points.min('low') == 10.0
+    assert points.to_list('open')[0] == values[0]
+    assert points.last() == values[-1]
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Кэш с TTL и stale-while-revalidate
+- Устаревшее значение отдаётся сразу, обновление - в фоне
+- Пустой результат не кэшируется, отдаётся последнее известное значение
+- PartialResult кэшируется ненадолго и при обычной, и при фоновой загрузке
+    python -m pytest tests/test_rate_cache.py
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from rate_cache import PartialResult, TTLCache
+
+
+def expire(cache: TTLCache, key):
+    """Сдвигает время записи так, будто её TTL истёк секунду назад (период устаревания сохраняется)"""
+    entry = cache._entries[key]
+    shift = entry.expires_at - time.monotonic() + 1
+    entry.expires_at -= shift
+    entry.stale_until -= shift
+
+
+def wait_refreshed(cache: TTLCache, key, timeout: float = 2.0):
+    """Ждёт завершения фонового обновления записи"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with cache._lock:
+            if key not in cache._refreshing:
+                return
+        time.sleep(0.01)
+    raise AssertionError('фоновое обновление не завершилось')
+
+
+def test_fresh_value_is_cached():
+    cache = TTLCache()
+    calls = []
+    for _ in range(3):
+        value = cache.get_or_load('key', lambda: calls.append(1) or 'value', ttl=60)
+    assert value == 'value'
+    assert len(calls) == 1
+    assert cache.stats()['hits'] == 2
+
+
+def test_stale_value_served_while_refreshing():
+    cache = TTLCache()
+    cache.get_or_load('key', lambda: 'old', ttl=60, stale_ttl=60)
+    expire(cache, 'key')
+
+    release = threading.Event()
+
+    def slow_loader():
+        release.wait(2)
+        return 'new'
+
+    assert cache.get_or_load('key', slow_loader, ttl=60, stale_ttl=60) == 'old'
+    # Повторный запрос во время обновления не запускает второе
+    assert cache.get_or_load('key', slow_loader, ttl=60, stale_ttl=60) == 'old'
+    assert cache.stats()['refreshes'] == 1
+
+    release.set()
+    wait_refreshed(cache, 'key')
+    assert cache.get('key') == 'new'
+
+
+def test_empty_result_falls_back_to_last_known():
+    cache = TTLCache()
+    cache.get_or_load('key', lambda: {'USD': 90.0}, ttl=60)
+    expire(cache, 'key')
+
+    assert cache.get_or_load('key', lambda: {}, ttl=60) == {'USD': 90.0}
+    assert cache.get('key') is None
+    assert cache.stats()['fallbacks'] == 1
+
+
+def test_partial_result_cached_briefly():
+    cache = TTLCache()
+
+    def partial_loader():
+        raise PartialResult('partial', ttl=5)
+
+    assert cache.get_or_load('key', partial_loader, ttl=3600, stale_ttl=3600) == 'partial'
+    entry = cache._entries['key']
+    assert entry.expires_at - time.monotonic() <= 5
+    assert entry.stale_until == entry.expires_at
+
+
+def test_partial_result_from_background_refresh():
+    cache = TTLCache()
+    cache.get_or_load('key', lambda: 'complete', ttl=3600, stale_ttl=3600)
+    expire(cache, 'key')
+
+    def partial_loader():
+        raise PartialResult('partial', ttl=5)
+
+    assert cache.get_or_load('key', partial_loader, ttl=3600, stale_ttl=3600) == 'complete'
+    wait_refreshed(cache, 'key')
+    assert cache.get('key') == 'partial'
+    assert cache._entries['key'].expires_at - time.monotonic() <= 5
+
+
+def test_background_refresh_error_keeps_stale_value():
+    cache = TTLCache()
+    cache.get_or_load('key', lambda: 'old', ttl=60, stale_ttl=60)
+    expire(cache, 'key')
+
+    def failing_loader():
+        raise RuntimeError('upstream down')
+
+    assert cache.get_or_load('key', failing_loader, ttl=60, stale_ttl=60) == 'old'
+    wait_refreshed(cache, 'key')
+    assert cache.get_last_known('key') == 'old'
+
+
+def test_lru_eviction():
+    cache = TTLCache(max_size=2)
+    cache.set('a', 1, ttl=60)
+    cache.set('b', 2, ttl=60)
+    cache.get('a')
+    cache.set('c', 3, ttl=60)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Бюджет холодного старта точек входа (STARTUP_BUDGETS_MS из startup_budget.py)
+- Каждая точка входа импортируется в отдельном процессе, берётся лучший из RUNS запусков
+    python -m pytest tests/test_startup_budget.py
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from startup_budget import STARTUP_BUDGETS_MS, measure_imports
+
+# Число запусков на точку входа: лучший отсекает разовые задержки диска и ОС
+RUNS = 3
+
+
+@pytest.mark.parametrize('module', ['api.index', 'app'])
+def test_import_time_within_budget(module):
+    budget = STARTUP_BUDGETS_MS[module]
+    best = min(measure_imports(module)[0] for _ in range(RUNS))
+    assert best <= budget, (
+        f'Импорт {module} занимает {best:.1f} мс при бюджете {budget} мс '
+        f'(подробности: python startup_budget.py --entry {module})'
+    )